@@ -1,6 +1,6 @@
 {
     'name': 'Custom Appointments',
-    'version': '1.2.0',
+    'version': '1.3.0',
     'category': 'Services',
     'summary': 'Complete appointment booking system with staff, branches, and services',
     'description': '''
@@ -22,7 +22,7 @@
         - Dashboard integration for appointment analytics
     ''',
     'author': 'Custom Development',
-    'depends': ['base', 'hr', 'calendar', 'website', 'mail', 'sms', 'account', 'payment'],
+    'depends': ['base', 'bus', 'hr', 'calendar', 'website', 'mail', 'sms', 'phone_validation', 'account', 'payment'],
     'data': [
         'security/appointment_security.xml',
         'security/ir.model.access.csv',
@@ -4,6 +4,10 @@ from werkzeug.utils import redirect
 from datetime import datetime, timedelta
 import json
 
+# How far ahead the website offers slots, and how many days one page of slots covers
+BOOKING_HORIZON_DAYS = 30
+SLOT_PAGE_DAYS = 7
+
 
 class AppointmentController(http.Controller):
 
@@ -94,42 +98,78 @@ class AppointmentController(http.Controller):
                 return request.redirect('/appointments')
             
             service = request.env['company.service'].sudo().browse(int(service_id))
-            staff = request.env['custom.staff.member'].sudo().browse(int(staff_id))
-            
-            if not service.exists() or not staff.exists():
+            if not service.exists():
                 return request.redirect('/appointments')
-            
-            available_slots = self._get_available_slots(service, staff)
-            
-            import json
+
+            if staff_id == 'any':
+                staff = request.env['custom.staff.member'].sudo()
+                branch = self._get_booking_branch(kwargs.get('branch_id'))
+                if not branch:
+                    return request.redirect('/appointments')
+            else:
+                staff = request.env['custom.staff.member'].sudo().browse(int(staff_id))
+                if not staff.exists():
+                    return request.redirect('/appointments')
+                branch = staff.branch_id
+
+            # Only the first page is embedded; later weeks are fetched from /appointments/slots
+            today = self._get_booking_today()
+            available_slots = self._get_slots_by_date(service, staff, branch, today, SLOT_PAGE_DAYS)
             available_slots_json = json.dumps(available_slots)
             
             return request.render('custom_appointments.booking_form_page', {
                 'service': service,
                 'staff': staff,
+                'branch': branch,
                 'available_slots': available_slots,
                 'available_slots_json': available_slots_json,
+                'slots_date_from': today.strftime('%Y-%m-%d'),
+                'slots_page_days': SLOT_PAGE_DAYS,
+                'slots_horizon_days': BOOKING_HORIZON_DAYS,
             })
         
         elif request.httprequest.method == 'POST':
             return self._process_booking(kwargs)
 
     @http.route('/appointments/slots', type='json', auth='public', website=True)
-    def get_available_slots(self, service_id, staff_id, date=None):
-        """AJAX endpoint to get available time slots for a specific date"""
+    def get_available_slots(self, service_id, staff_id, date=None, branch_id=None, days=None):
+        """AJAX endpoint to get available time slots for a specific date.
+
+        With ``staff_id='any'`` the slots of every bookable staff member of the
+        branch are returned, each with the ``staff_ids`` who can take it.
+
+        With ``days`` a page of ``days`` dates starting at ``date`` is returned
+        instead, as ``{'slots_by_date': {'YYYY-MM-DD': [slot, ...]}}``, capped to
+        the booking horizon.
+        """
         service = request.env['company.service'].sudo().browse(service_id)
-        staff = request.env['custom.staff.member'].sudo().browse(staff_id)
-        
-        if not service.exists() or not staff.exists():
-            return {'error': 'Invalid service or staff'}
         
         if date:
             target_date = datetime.strptime(date, '%Y-%m-%d').date()
         else:
             target_date = datetime.now().date()
-        
-        slots = self._get_slots_for_date(service, staff, target_date)
-        return {'slots': slots}
+
+        if staff_id == 'any':
+            staff = request.env['custom.staff.member'].sudo()
+            branch = self._get_booking_branch(branch_id)
+            if not service.exists() or not branch:
+                return {'error': 'Invalid service or branch'}
+        else:
+            staff = request.env['custom.staff.member'].sudo().browse(staff_id)
+            if not service.exists() or not staff.exists():
+                return {'error': 'Invalid service or staff'}
+            branch = staff.branch_id
+
+        if days:
+            today = self._get_booking_today()
+            date_from = max(target_date, today)
+            days = min(int(days), (today + timedelta(days=BOOKING_HORIZON_DAYS) - date_from).days)
+            if days <= 0:
+                return {'slots_by_date': {}}
+            return {'slots_by_date': self._get_slots_by_date(service, staff, branch, date_from, days)}
+
+        slots_by_date = self._get_slots_by_date(service, staff, branch, target_date, 1)
+        return {'slots': slots_by_date.get(target_date.strftime('%Y-%m-%d'), [])}
 
     @http.route('/appointments/validate-promo', type='json', auth='public', website=True, methods=['POST'], csrf=False)
     def validate_promo_code(self, **kwargs):
@@ -181,68 +221,32 @@ class AppointmentController(http.Controller):
         except Exception as e:
             return {'valid': False, 'message': f'Error validating promo code: {str(e)}'}
 
-    def _get_available_slots(self, service, staff, days_ahead=30):
-        """Get available time slots for the next N days"""
-        slots_by_date = {}
-        today = datetime.now().date()
-        
-        for i in range(days_ahead):
-            date = today + timedelta(days=i)
-            slots = self._get_slots_for_date(service, staff, date)
-            if slots:
-                slots_by_date[date.strftime('%Y-%m-%d')] = slots
-        
-        return slots_by_date
+    def _get_booking_branch(self, branch_id=None):
+        """Return the requested branch, or the main (else first) active branch"""
+        Branch = request.env['custom.branch'].sudo()
+        if branch_id:
+            branch = Branch.browse(int(branch_id)).exists()
+            if branch:
+                return branch
+        return (Branch.search([('is_main_branch', '=', True), ('active', '=', True)], limit=1)
+                or Branch.search([('active', '=', True)], order='name', limit=1))
 
-    def _get_slots_for_date(self, service, staff, date):
-        """Get available time slots for a specific date based on staff availability and service duration"""
-        import pytz
-        
-        weekday = date.weekday()
-        day_fields = [
-            'monday_available', 'tuesday_available', 'wednesday_available',
-            'thursday_available', 'friday_available', 'saturday_available', 'sunday_available'
-        ]
-        
-        if not getattr(staff, day_fields[weekday]):
-            return []
-        
-        start_hour = staff.start_time
-        end_hour = staff.end_time
-        service_duration = service.duration
-        
-        tz_name = request.env['ir.config_parameter'].sudo().get_param('appointment.timezone', 'Africa/Nairobi')
-        try:
-            server_tz = pytz.timezone(tz_name)
-        except:
-            server_tz = pytz.timezone('Africa/Nairobi')
-        
-        now_server = datetime.now(server_tz)
-        is_today = date == now_server.date()
-        
-        slots = []
-        current_time = start_hour
-        
-        while current_time + service_duration <= end_hour:
-            slot_datetime_naive = datetime.combine(date, datetime.min.time()) + timedelta(hours=current_time)
-            
-            if is_today and slot_datetime_naive <= now_server.replace(tzinfo=None):
-                current_time += service_duration
-                continue
-            
-            slot_datetime_local = server_tz.localize(slot_datetime_naive)
-            slot_datetime_utc = slot_datetime_local.astimezone(pytz.utc).replace(tzinfo=None)
-            
-            if not self._has_conflict(staff, slot_datetime_utc, service_duration, service):
-                slots.append({
-                    'time': slot_datetime_naive.strftime('%H:%M'),
-                    'datetime': slot_datetime_naive.isoformat(),
-                    'display_time': slot_datetime_naive.strftime('%I:%M %p'),
-                })
-            
-            current_time += service_duration
-        
-        return slots
+    def _find_free_staff(self, branch, service, local_datetime):
+        """Pick the first staff member of the branch who can take the given local slot"""
+        date_str = local_datetime.strftime('%Y-%m-%d')
+        slots = branch._get_available_slots(service, date_from=local_datetime.date()).get(date_str, [])
+        slot = next((slot for slot in slots if slot['datetime'] == local_datetime.isoformat()), None)
+        return request.env['custom.staff.member'].sudo().browse(slot['staff_ids'][:1] if slot else [])
+
+    def _get_booking_today(self):
+        """Return today's date in the server timezone used for booking slots"""
+        return datetime.now(request.env['custom.appointment']._get_server_timezone()).date()
+
+    def _get_slots_by_date(self, service, staff, branch, date_from, days):
+        """Get ``{'YYYY-MM-DD': [slot, ...]}`` for a staff member, or for any staff of the branch"""
+        if staff:
+            return staff._get_available_slots(service, date_from=date_from, days=days)[staff.id]
+        return branch._get_available_slots(service, date_from=date_from, days=days)
 
     def _has_conflict(self, staff, start_datetime, duration_hours, service=None):
         """Check if a time slot conflicts with existing appointments including buffer time"""
@@ -262,6 +266,7 @@ class AppointmentController(http.Controller):
             ('state', 'in', ['draft', 'confirmed', 'in_progress']),
             ('start', '<', check_end),
             ('stop', '>', check_start),
+            '|', ('hold_expires_at', '=', False), ('hold_expires_at', '>', fields.Datetime.now()),
         ])
         
         return len(existing_appointments) > 0
@@ -272,7 +277,7 @@ class AppointmentController(http.Controller):
             import pytz
             
             service_id = int(data.get('service_id'))
-            staff_id = int(data.get('staff_id'))
+            staff_id = data.get('staff_id')
             appointment_datetime = data.get('appointment_datetime')
             customer_name = data.get('customer_name')
             customer_email = data.get('customer_email')
@@ -294,9 +299,17 @@ class AppointmentController(http.Controller):
                 has_previous_extensions = False
             
             service = request.env['company.service'].sudo().browse(service_id)
-            staff = request.env['custom.staff.member'].sudo().browse(staff_id)
-            
-            if not service.exists() or not staff.exists():
+            if staff_id == 'any':
+                staff = request.env['custom.staff.member'].sudo()
+                branch = self._get_booking_branch(data.get('branch_id'))
+                if not branch:
+                    raise ValueError("Invalid branch")
+            else:
+                staff = request.env['custom.staff.member'].sudo().browse(int(staff_id))
+                if not staff.exists():
+                    raise ValueError("Invalid service or staff")
+            
+            if not service.exists():
                 raise ValueError("Invalid service or staff")
             
             tz_name = request.env['ir.config_parameter'].sudo().get_param('appointment.timezone', 'Africa/Nairobi')
@@ -310,6 +323,11 @@ class AppointmentController(http.Controller):
             start_dt = local_dt.astimezone(pytz.utc).replace(tzinfo=None)
             end_dt = start_dt + timedelta(hours=service.duration)
             
+            if not staff:
+                staff = self._find_free_staff(branch, service, naive_dt)
+                if not staff:
+                    raise ValueError("Time slot is no longer available")
+
             if self._has_conflict(staff, start_dt, service.duration, service):
                 raise ValueError("Time slot is no longer available")
             
@@ -359,7 +377,15 @@ class AppointmentController(http.Controller):
             
             appointment_vals['state'] = 'draft'
             appointment_vals['payment_status'] = 'pending'
-            appointment = request.env['custom.appointment'].sudo().create(appointment_vals)
+            Appointment = request.env['custom.appointment'].sudo()
+            appointment_vals['hold_expires_at'] = Appointment._get_slot_hold_expiry()
+            # Expired holds still sit in the slot until the cron cancels them
+            Appointment._expire_slot_holds([
+                ('staff_member_id', '=', staff.id),
+                ('start', '<', appointment_vals['stop']),
+                ('stop', '>', appointment_vals['start']),
+            ])
+            appointment = Appointment.create(appointment_vals)
             
             # Increment promo code usage if applied
             if promo and discount_amount > 0:
@@ -410,6 +436,9 @@ class AppointmentController(http.Controller):
             
             if not appointment.exists() or not acquirer.exists():
                 raise ValueError("Invalid appointment or payment method")
+
+            if not appointment._extend_slot_hold():
+                raise ValueError("Your reserved time slot has expired. Please book again.")
             
             payment_method = request.env['payment.method'].sudo().search([
                 ('code', '=', acquirer.code if acquirer.code != 'none' else 'card')
@@ -486,6 +515,9 @@ class AppointmentController(http.Controller):
                 phone_number = data.get('mpesa_phone', '').strip()
                 if not phone_number:
                     return request.redirect(f'/appointments/payment?appointment_id={appointment.id}&error=Phone number is required for M-Pesa payment')
+                phone_number = transaction._mpesa_normalize_phone_number(phone_number)
+                if not phone_number:
+                    return request.redirect(f'/appointments/payment?appointment_id={appointment.id}&error=Invalid phone number. Use 254XXXXXXXXX')
                 
                 result = transaction._mpesa_initiate_stk_push(phone_number)
                 if result:
@@ -587,6 +619,7 @@ class AppointmentController(http.Controller):
         
         return request.render('custom_appointments.payment_pending_page', {
             'appointment': appointment,
+            'payment_status_channel': appointment._get_payment_status_channel(),
         })
     
     @http.route('/appointments/payment/success', type='http', auth='public', website=True)
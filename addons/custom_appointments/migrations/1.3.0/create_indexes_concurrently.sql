@@ -0,0 +1,29 @@
+-- Indexes added in custom_appointments 1.3.0.
+--
+-- Run this with psql against the database BEFORE upgrading the module, outside
+-- of any transaction block. CREATE INDEX CONCURRENTLY does not block bookings
+-- while the indexes build; the upgrade then finds them and skips creating them
+-- (with a write lock) itself. The upgrade refuses to build them itself on a
+-- table of 100000 appointments or more: there, running this script is required.
+--
+--   psql -d <database> -f create_indexes_concurrently.sql
+--
+-- If a build fails it leaves an INVALID index behind: drop it and run again.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS custom_appointment_staff_busy_index
+    ON custom_appointment (staff_member_id, start, stop)
+    WHERE state IN ('draft', 'confirmed', 'in_progress');
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS custom_appointment__payment_transaction_id_index
+    ON custom_appointment (payment_transaction_id)
+    WHERE payment_transaction_id IS NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS custom_appointment_customer_email_start_index
+    ON custom_appointment (customer_email, start);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS custom_appointment_state_followup_index
+    ON custom_appointment (state, followup_stopped);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS custom_appointment_confirmed_start_index
+    ON custom_appointment (start)
+    WHERE state = 'confirmed';
@@ -0,0 +1,79 @@
+import logging
+
+from odoo.exceptions import UserError
+from odoo.tools.sql import index_exists
+
+from odoo.addons.custom_appointments.models.appointment import APPOINTMENT_INDEXES, BLOCKING_STATES
+
+_logger = logging.getLogger(__name__)
+
+PAYMENT_TRANSACTION_INDEX = 'custom_appointment__payment_transaction_id_index'
+# Appointment rows from which the indexes must be built concurrently beforehand
+LOCKED_INDEX_MAX_ROWS = 100000
+# Overlapping bookings listed when the upgrade is stopped
+OVERLAPS_REPORTED = 50
+
+
+def migrate(cr, version):
+    _check_staff_overlaps(cr)
+    _check_missing_indexes(cr)
+
+
+def _check_staff_overlaps(cr):
+    """Stop the upgrade if active appointments of a staff member overlap.
+
+    The staff_no_overlap exclusion constraint cannot be added on such data,
+    and the registry would only log it and go on without the constraint.
+    """
+    cr.execute("""
+        SELECT a.staff_member_id, a.id, a.start, a.stop, b.id, b.start, b.stop
+          FROM custom_appointment a
+          JOIN custom_appointment b
+            ON b.staff_member_id = a.staff_member_id AND b.id > a.id
+           AND b.start < a.stop AND a.start < b.stop
+         WHERE a.state IN %(states)s AND a.stop > a.start
+           AND b.state IN %(states)s AND b.stop > b.start
+      ORDER BY a.staff_member_id, a.start, a.id, b.id
+    """, {'states': tuple(BLOCKING_STATES)})
+    overlaps = cr.fetchall()
+    if not overlaps:
+        return
+    lines = [
+        "staff member %s: appointment %s (%s - %s) overlaps appointment %s (%s - %s)" % overlap
+        for overlap in overlaps[:OVERLAPS_REPORTED]
+    ]
+    if len(overlaps) > OVERLAPS_REPORTED:
+        lines.append("... and %s more" % (len(overlaps) - OVERLAPS_REPORTED))
+    raise UserError(
+        "custom_appointments 1.3.0: %s pairs of active appointments overlap, the staff "
+        "double-booking constraint cannot be added. Cancel or reschedule them, then upgrade "
+        "again:\n%s" % (len(overlaps), '\n'.join(lines)))
+
+
+def _check_missing_indexes(cr):
+    """Check the 1.3.0 indexes that the upgrade is about to build with a lock.
+
+    CREATE INDEX CONCURRENTLY cannot run inside the upgrade transaction (it
+    would wait on that very transaction), so the indexes are built by the
+    registry during the upgrade unless create_indexes_concurrently.sql was run
+    beforehand. On a large table that build blocks bookings for too long:
+    the upgrade is stopped until the script has been run.
+    """
+    names = [name for name, _expressions, _where in APPOINTMENT_INDEXES] + [PAYMENT_TRANSACTION_INDEX]
+    missing = [name for name in names if not index_exists(cr, name)]
+    if not missing:
+        _logger.info("custom_appointments 1.3.0: hot-path indexes already present")
+        return
+    cr.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = 'custom_appointment'")
+    row = cr.fetchone()
+    rows = row[0] if row else 0
+    if rows >= LOCKED_INDEX_MAX_ROWS:
+        raise UserError(
+            "custom_appointments 1.3.0: %s missing on ~%s appointments. Building them during the "
+            "upgrade would block bookings: run migrations/1.3.0/create_indexes_concurrently.sql "
+            "with psql, then upgrade again." % (', '.join(missing), rows))
+    _logger.warning(
+        "custom_appointments 1.3.0: building %s on ~%s appointments while holding a write lock. "
+        "Run migrations/1.3.0/create_indexes_concurrently.sql before upgrading to avoid blocking bookings.",
+        ', '.join(missing), rows,
+    )
@@ -10,3 +10,5 @@ from . import account_move
 from . import promo_code
 from . import appointment_feedback
 from . import appointment_source
+from . import availability_cache
+from . import appointment_notification
@@ -1,13 +1,55 @@
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
+from odoo.tools import split_every
+from odoo.tools.misc import hmac as hmac_tool
 from odoo.exceptions import ValidationError
 from datetime import datetime, timedelta
+from contextlib import contextmanager
 import base64
 from icalendar import Calendar, Event as ICalEvent
+import psycopg2
 import pytz
 import logging
+import re
+
+from . import email_templates
 
 _logger = logging.getLogger(__name__)
 
+# Appointment states that keep the staff member busy
+BLOCKING_STATES = ['draft', 'confirmed', 'in_progress']
+# Fields whose change can free or take a slot
+AVAILABILITY_FIELDS = ['staff_member_id', 'start', 'stop', 'state', 'hold_expires_at']
+# Expired slot holds cancelled per cron run
+HOLD_EXPIRY_BATCH_SIZE = 1000
+# Reminder emails / SMS created per create() call
+REMINDER_BATCH_SIZE = 500
+# Due follow-ups sent per prefetch batch
+FOLLOWUP_BATCH_SIZE = 200
+# HMAC scope of the payment status bus channels, also the notification type
+PAYMENT_STATUS_SCOPE = 'custom_appointments.payment_status'
+# Database constraint preventing staff double-booking, and the conflicting
+# appointment as reported in its violation detail
+OVERLAP_CONSTRAINT = 'custom_appointment_staff_no_overlap'
+OVERLAP_DETAIL_RE = re.compile(r'conflicts with existing key \(.*\)=\((\d+), \["?([^",]+)"?,"?([^")]+)"?\)\)')
+# Indexes backing the hot-path domains, as (name, expressions, where); kept in
+# sync with migrations/1.3.0/create_indexes_concurrently.sql
+APPOINTMENT_INDEXES = [
+    # conflict checks and availability: staff + active state + start/stop
+    ('custom_appointment_staff_busy_index', ['staff_member_id', 'start', 'stop'],
+     "state IN (%s)" % ', '.join("'%s'" % state for state in BLOCKING_STATES)),
+    # _check_customer_rebooked
+    ('custom_appointment_customer_email_start_index', ['customer_email', 'start'], ''),
+    # follow-up cron
+    ('custom_appointment_state_followup_index', ['state', 'followup_stopped'], ''),
+    # reminder cron
+    ('custom_appointment_confirmed_start_index', ['start'], "state = 'confirmed'"),
+]
+
+
+def _hold_active_domain(now):
+    """Domain of appointments whose slot hold, if any, has not expired yet"""
+    return ['|', ('hold_expires_at', '=', False), ('hold_expires_at', '>', now)]
+
 
 class Appointment(models.Model):
     _name = 'custom.appointment'
@@ -20,6 +62,10 @@ class Appointment(models.Model):
     customer_name = fields.Char(string='Customer Name', required=True)
     customer_email = fields.Char(string='Customer Email', required=True)
     customer_phone = fields.Char(string='Customer Phone')
+    phone_e164 = fields.Char(
+        string='Customer Phone (E.164)', compute='_compute_phone_e164', store=True,
+        index='btree_not_null',
+        help='Customer phone in international E.164 format, used to send SMS and look customers up by phone')
     partner_id = fields.Many2one('res.partner', string='Customer', ondelete='set null', 
                                  help='Customer partner record for CRM and payment tracking')
     
@@ -36,7 +82,7 @@ class Appointment(models.Model):
     start = fields.Datetime(string='Start Time', required=True)
     stop = fields.Datetime(string='End Time', required=True)
     duration = fields.Float(string='Duration (Hours)', compute='_compute_duration', store=True)
-    completed_date = fields.Datetime(string='Completed On', readonly=True, copy=False)
+    completed_date = fields.Datetime(string='Completed On', readonly=True, copy=False, index='btree_not_null')
     feedback_ids = fields.One2many('custom.appointment.feedback', 'appointment_id', string='Feedback')
     feedback_count = fields.Integer(string='Feedback Count', compute='_compute_feedback_count')
 
@@ -66,11 +112,15 @@ class Appointment(models.Model):
         ('refunded', 'Refunded')
     ], string='Payment Status', default='pending', required=True)
     
-    payment_transaction_id = fields.Many2one('payment.transaction', string='Payment Transaction')
+    payment_transaction_id = fields.Many2one('payment.transaction', string='Payment Transaction',
+                                             index='btree_not_null')
     payment_method = fields.Char(string='Payment Method')
     payment_reference = fields.Char(string='Payment Reference')
     paid_amount = fields.Monetary(string='Paid Amount', currency_field='currency_id')
     payment_date = fields.Datetime(string='Payment Date')
+    hold_expires_at = fields.Datetime(
+        string='Slot Hold Expires', copy=False, index='btree_not_null',
+        help='Unpaid online bookings keep their slot until this time, after which they are cancelled')
     
     invoice_id = fields.Many2one('account.move', string='Invoice', domain="[('move_type', '=', 'out_invoice')]", copy=False)
     invoice_count = fields.Integer(string='Invoice Count', compute='_compute_invoice_count')
@@ -124,7 +174,19 @@ class Appointment(models.Model):
         default=False,
         help='Manually stop sending follow-up messages for this appointment'
     )
-    
+
+    _sql_constraints = [
+        # Enforced by PostgreSQL so concurrent bookings cannot both take the same slot.
+        # Appointments ending before they start are left out, as their range is invalid.
+        # Draft bookings whose hold expired still hold their slot until they are
+        # cancelled, by the hold expiry cron or by a booking of the same slot.
+        ('staff_no_overlap',
+         "EXCLUDE USING gist (staff_member_id WITH =, tsrange(start, stop, '[)') WITH &&) "
+         "WHERE (state IN (%s) AND stop > start)" % ', '.join("'%s'" % state for state in BLOCKING_STATES),
+         'The staff member already has an appointment scheduled at this time. '
+         'Please choose a different time slot or staff member.'),
+    ]
+
     @api.depends('invoice_id')
     def _compute_invoice_count(self):
         for appointment in self:
@@ -174,38 +236,119 @@ class Appointment(models.Model):
         if self.start and self.service_id and self.service_id.duration:
             self.stop = self.start + timedelta(hours=self.service_id.duration)
     
-    @api.constrains('staff_member_id', 'start', 'stop', 'state')
-    def _check_staff_availability(self):
-        """Validate that the staff member doesn't have overlapping appointments"""
-        for appointment in self:
-            # Skip validation for cancelled appointments
-            if appointment.state == 'cancelled':
-                continue
-            
-            if not appointment.start or not appointment.stop or not appointment.staff_member_id:
-                continue
-            
-            # Search for conflicting appointments
-            domain = [
-                ('staff_member_id', '=', appointment.staff_member_id.id),
-                ('id', '!=', appointment.id),  # Exclude current appointment
-                ('state', 'in', ['draft', 'confirmed', 'in_progress']),  # Only active appointments
-                ('start', '<', appointment.stop),
-                ('stop', '>', appointment.start),
-            ]
-            
-            conflicting_appointments = self.search(domain, limit=1)
-            
-            if conflicting_appointments:
-                raise ValidationError(_(
-                    'The staff member "%s" already has an appointment scheduled from %s to %s. '
-                    'Please choose a different time slot or staff member.'
-                ) % (
-                    appointment.staff_member_id.name,
-                    conflicting_appointments.start.strftime('%Y-%m-%d %H:%M'),
-                    conflicting_appointments.stop.strftime('%Y-%m-%d %H:%M')
-                ))
+    def _auto_init(self):
+        # The overlap constraint compares staff_member_id with '=' inside a GiST index
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        except psycopg2.Error:
+            _logger.warning("Could not create the btree_gist extension, staff double-booking "
+                            "will not be prevented by the database")
+        return super()._auto_init()
+
+    def init(self):
+        for name, expressions, where in APPOINTMENT_INDEXES:
+            tools.create_index(self.env.cr, name, self._table, expressions, where=where)
+
+    @contextmanager
+    def _translate_overlap_error(self):
+        """Run the block in a savepoint and turn a staff overlap violation into a ``ValidationError``.
+
+        The savepoint flushes on exit, so pending updates hit the constraint
+        inside the block and the transaction stays usable afterwards.
+        """
+        try:
+            with self.env.cr.savepoint():
+                yield
+        except psycopg2.IntegrityError as e:
+            if e.diag.constraint_name != OVERLAP_CONSTRAINT:
+                raise
+            raise ValidationError(self._get_overlap_message(e.diag.message_detail)) from None
+
+    def _get_overlap_message(self, detail):
+        """Describe the conflicting appointment reported by the overlap constraint"""
+        match = OVERLAP_DETAIL_RE.search(detail or '')
+        if not match:
+            return _('The staff member already has an appointment scheduled at this time. '
+                     'Please choose a different time slot or staff member.')
+        staff = self.env['custom.staff.member'].browse(int(match.group(1)))
+        return _(
+            'The staff member "%s" already has an appointment scheduled from %s to %s. '
+            'Please choose a different time slot or staff member.'
+        ) % (staff.name, match.group(2)[:16], match.group(3)[:16])
     
+    @api.model
+    def _get_busy_intervals(self, staff_ids, start, stop):
+        """Return the blocking intervals of the given staff members in one query.
+
+        :return: ``{staff_id: [(start, stop), ...]}`` sorted by start
+        """
+        appointments = self.search_fetch([
+            ('staff_member_id', 'in', staff_ids),
+            ('state', 'in', BLOCKING_STATES),
+            ('start', '<', stop),
+            ('stop', '>', start),
+        ] + _hold_active_domain(fields.Datetime.now()), ['staff_member_id', 'start', 'stop'], order='start')
+        intervals = {}
+        for appointment in appointments:
+            intervals.setdefault(appointment.staff_member_id.id, []).append(
+                (appointment.start, appointment.stop))
+        return intervals
+
+    @api.model
+    def _get_slot_hold_expiry(self):
+        """Return when a slot hold taken now expires"""
+        settings = self.env['custom.appointment.settings'].sudo().get_settings()
+        return fields.Datetime.now() + timedelta(minutes=settings.slot_hold_minutes or 15)
+
+    def _extend_slot_hold(self):
+        """Restart the hold of these unpaid bookings, e.g. when the customer starts paying.
+
+        :return: whether every hold was still active and has been extended
+        """
+        now = fields.Datetime.now()
+        holds = self.filtered(lambda a: a.state == 'draft' and a.hold_expires_at)
+        if any(hold.hold_expires_at <= now for hold in holds) or any(a.state == 'cancelled' for a in self):
+            return False
+        if holds:
+            holds.write({'hold_expires_at': self._get_slot_hold_expiry()})
+        return True
+
+    @api.model
+    def _expire_slot_holds(self, domain=None, limit=None):
+        """Cancel the unpaid draft bookings whose slot hold has expired, in bulk.
+
+        :param domain: optional extra domain, e.g. to release a single staff slot
+        :return: the cancelled appointments
+        """
+        expired = self.search([
+            ('state', '=', 'draft'),
+            ('payment_status', '!=', 'paid'),
+            ('hold_expires_at', '<=', fields.Datetime.now()),
+        ] + (domain or []), limit=limit)
+        if expired:
+            expired.write({'state': 'cancelled'})
+        return expired
+
+    @api.model
+    def _cron_expire_slot_holds(self):
+        """Scheduled method releasing the slots of abandoned online bookings"""
+        expired = self._expire_slot_holds(limit=HOLD_EXPIRY_BATCH_SIZE)
+        if expired:
+            _logger.info("Cancelled %s unpaid bookings whose slot hold expired", len(expired))
+        if len(expired) == HOLD_EXPIRY_BATCH_SIZE:
+            self.env.ref('custom_appointments.slot_hold_expiry_cron')._trigger()
+
+    @api.depends('customer_phone', 'branch_id.company_id.country_id')
+    def _compute_phone_e164(self):
+        """Normalize the phone with the country of the branch company, else the current company"""
+        for appointment in self:
+            appointment.phone_e164 = appointment._phone_format(
+                number=appointment.customer_phone,
+                country=appointment.branch_id.company_id.country_id or self.env.company.country_id,
+                force_format='E164',
+            ) or False
+
     def _find_or_create_partner(self, name, email, phone=None):
         """Find existing partner by email or create a new one"""
         Partner = self.env['res.partner'].sudo()
@@ -247,8 +390,11 @@ class Appointment(models.Model):
                 )
                 vals['partner_id'] = partner.id
         
-        appointments = super(Appointment, self).create(vals_list)
+        with self._translate_overlap_error():
+            appointments = super(Appointment, self).create(vals_list)
         appointments._create_calendar_event()
+        self.env['custom.appointment.availability.cache']._invalidate(
+            appointments._get_availability_days())
         return appointments
     
     def _create_calendar_event(self):
@@ -268,10 +414,101 @@ class Appointment(models.Model):
     def write(self, vals):
         if vals.get('state') == 'completed' and 'completed_date' not in vals:
             vals = dict(vals, completed_date=fields.Datetime.now())
-        result = super(Appointment, self).write(vals)
+        # A slot hold only lives while the booking is an unpaid draft
+        if (vals.get('state', 'draft') != 'draft' or vals.get('payment_status') == 'paid') \
+                and 'hold_expires_at' not in vals:
+            vals = dict(vals, hold_expires_at=False)
+        blocking_before = None
+        if any(field in vals for field in AVAILABILITY_FIELDS):
+            blocking_before = self._get_blocking_intervals()
+            with self._translate_overlap_error():
+                result = super(Appointment, self).write(vals)
+        else:
+            result = super(Appointment, self).write(vals)
         if any(field in vals for field in ['name', 'start', 'stop', 'description', 'user_id']):
             self._update_calendar_event()
+        if blocking_before is not None:
+            blocking_after = self._get_blocking_intervals()
+            changed = self.filtered(lambda a: blocking_before[a.id] != blocking_after[a.id])
+            days = set()
+            for appointment in changed:
+                days |= self._get_interval_days(blocking_before[appointment.id])
+                days |= self._get_interval_days(blocking_after[appointment.id])
+            self.env['custom.appointment.availability.cache']._invalidate(days)
+        if 'payment_status' in vals or 'state' in vals:
+            self._notify_payment_status()
+        return result
+
+    def _get_payment_status_channel(self):
+        """Bus channel of the payment pending page, unguessable without the database secret"""
+        self.ensure_one()
+        token = hmac_tool(self.env(su=True), PAYMENT_STATUS_SCOPE, self.id)
+        return f'custom_appointments.payment_status_{self.id}_{token}'
+
+    def _notify_payment_status(self):
+        """Push the payment status to the customers waiting on the payment pending page"""
+        for appointment in self:
+            self.env['bus.bus']._sendone(
+                appointment._get_payment_status_channel(), PAYMENT_STATUS_SCOPE, {
+                    'appointment_id': appointment.id,
+                    'payment_status': appointment.payment_status,
+                    'state': appointment.state,
+                })
+
+    def _flag_payment_for_review(self, reason):
+        """Schedule a to-do on paid appointments that could not be confirmed, to refund or rebook them"""
+        admin = self.env.ref('base.user_admin', raise_if_not_found=False)
+        for appointment in self:
+            appointment.activity_schedule(
+                'mail.mail_activity_data_todo',
+                summary=_('Payment to review: refund or rebook'),
+                note=_('Payment %(reference)s was received but the appointment could not be confirmed: %(reason)s',
+                       reference=appointment.payment_reference or '', reason=reason),
+                user_id=appointment.user_id.id or (admin and admin.id) or self.env.uid,
+            )
+        _logger.warning("Paid appointments %s could not be confirmed (%s), flagged for review", self.ids, reason)
+
+    def unlink(self):
+        days = self._get_availability_days()
+        result = super(Appointment, self).unlink()
+        self.env['custom.appointment.availability.cache']._invalidate(days)
         return result
+
+    def _get_blocking_intervals(self):
+        """Return ``{id: (staff_id, start, stop, hold_expires_at)}``, or ``None`` for appointments that block nothing.
+
+        Held slots count as blocking until the hold is cancelled, so that any
+        change of the hold invalidates the cached availability.
+        """
+        return {
+            appointment.id: (
+                (appointment.staff_member_id.id, appointment.start, appointment.stop,
+                 appointment.hold_expires_at)
+                if appointment.state in BLOCKING_STATES and appointment.staff_member_id
+                and appointment.start and appointment.stop else None
+            )
+            for appointment in self
+        }
+
+    def _get_interval_days(self, interval):
+        """Return the ``(staff_id, local date)`` days covered by a blocking interval."""
+        if not interval:
+            return set()
+        staff_id, start, stop = interval[:3]
+        day = self._get_local_datetime(start).date()
+        last = self._get_local_datetime(stop).date()
+        days = set()
+        while day <= last:
+            days.add((staff_id, day))
+            day += timedelta(days=1)
+        return days
+
+    def _get_availability_days(self):
+        """Return the ``(staff_id, local date)`` days these appointments block."""
+        days = set()
+        for interval in self._get_blocking_intervals().values():
+            days |= self._get_interval_days(interval)
+        return days
     
     def _update_calendar_event(self):
         """Update the corresponding calendar event"""
@@ -287,27 +524,19 @@ class Appointment(models.Model):
                 appointment.calendar_event_id.write(event_vals)
     
     def action_confirm(self):
-        _logger.info(f"=== action_confirm called for appointment {self.id} ===")
-        _logger.info(f"Payment status: {self.payment_status}, State: {self.state}")
-        _logger.info(f"Staff member: {self.staff_member_id.name} (ID: {self.staff_member_id.id})")
-        _logger.info(f"Staff email: {self.staff_member_id.email if self.staff_member_id.email else 'NOT SET'}")
+        _logger.info(f"=== action_confirm called for appointments {self.ids} ===")
         
-        if self.payment_status != 'paid':
+        if any(appointment.payment_status != 'paid' for appointment in self):
             from odoo.exceptions import UserError
             raise UserError("Cannot confirm appointment without successful payment.")
-        self.state = 'confirmed'
-        
-        if not self.invoice_id:
-            _logger.info(f"Creating invoice for appointment {self.id}")
-            self._create_and_pay_invoice()
-        
-        _logger.info(f"Calling _send_confirmation_notifications() for appointment {self.id}")
-        self._send_confirmation_notifications()
+        self.write({'state': 'confirmed'})
         
-        _logger.info(f"Calling _send_staff_notification() for appointment {self.id}")
-        self._send_staff_notification()
+        # Invoicing and notifications run from the outbox cron, off the payment callback
+        _logger.info(f"Queueing invoice and notifications for appointments {self.ids}")
+        self.env['custom.appointment.notification'].sudo()._enqueue(
+            self, ['invoice', 'customer_confirmation_email', 'customer_confirmation_sms', 'staff_notification'])
         
-        _logger.info(f"=== action_confirm completed for appointment {self.id} ===")
+        _logger.info(f"=== action_confirm completed for appointments {self.ids} ===")
         return True
     
     def action_start(self):
@@ -633,12 +862,8 @@ class Appointment(models.Model):
         return local_dt.astimezone(pytz.utc).replace(tzinfo=None)
     
     def _load_email_template(self, template_name):
-        """Load HTML email template from file"""
-        import os
-        module_path = os.path.dirname(os.path.dirname(__file__))
-        template_path = os.path.join(module_path, 'templates', 'email', f'{template_name}.html')
-        with open(template_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        """Return the precompiled HTML email template, see ``email_templates``"""
+        return email_templates.get_template(template_name)
     
     def _generate_confirmation_email_html(self):
         """Generate HTML for confirmation email"""
@@ -664,12 +889,19 @@ class Appointment(models.Model):
     
     def _send_confirmation_notifications(self):
         """Send confirmation email to customer and SMS if phone is provided"""
+        to_notify = self.browse()
         for appointment in self:
             if appointment.customer_notification_sent:
                 _logger.info(f"Customer notification already sent for appointment {appointment.id}, skipping")
                 continue
-                
-            if appointment.customer_email:
+            to_notify |= appointment
+        to_notify._send_confirmation_email()
+        to_notify._send_confirmation_sms()
+
+    def _send_confirmation_email(self):
+        """Send the confirmation email, with a calendar invite, to customers not notified yet"""
+        for appointment in self:
+            if appointment.customer_email and not appointment.customer_notification_sent:
                 _logger.info(f"Sending confirmation email to customer {appointment.customer_name} ({appointment.customer_email}) for appointment {appointment.id}")
                 try:
                     ics_attachment = appointment._generate_ics_attachment()
@@ -691,7 +923,10 @@ class Appointment(models.Model):
                     appointment.customer_notification_sent = True
                 except Exception as e:
                     _logger.error(f"Failed to send confirmation email to {appointment.customer_email}: {str(e)}", exc_info=True)
-            
+
+    def _send_confirmation_sms(self):
+        """Send the confirmation SMS to the customers with a phone number"""
+        for appointment in self:
             if appointment.customer_phone:
                 local_start = appointment._get_local_datetime(appointment.start)
                 # Enhanced SMS with branch and appointment details
@@ -707,7 +942,7 @@ class Appointment(models.Model):
                     f"Phone: {appointment.branch_id.phone or self.env.user.company_id.phone}\n"
                     f"Ref: {appointment.name}"
                 )
-                self._send_sms_notification(appointment.customer_phone, sms_message)
+                self._send_sms_notification(appointment.phone_e164 or appointment.customer_phone, sms_message)
     
     def _generate_cancellation_email_html(self):
         """Generate HTML for cancellation email"""
@@ -762,7 +997,7 @@ class Appointment(models.Model):
                     f"Phone: {appointment.branch_id.phone or self.env.user.company_id.phone}\n"
                     f"Email: {appointment.branch_id.email or self.env.user.company_id.email}"
                 )
-                self._send_sms_notification(appointment.customer_phone, sms_message)
+                self._send_sms_notification(appointment.phone_e164 or appointment.customer_phone, sms_message)
     
     def _generate_staff_notification_email_html(self):
         """Generate HTML for staff notification email"""
@@ -834,58 +1069,81 @@ class Appointment(models.Model):
                 _logger.info(f"Sending SMS notification to staff {appointment.staff_member_id.name} at {appointment.staff_member_id.phone}")
                 self._send_sms_notification(appointment.staff_member_id.phone, sms_message)
     
+    def _get_reminder_email_values(self):
+        """Placeholder values of the reminder email template"""
+        self.ensure_one()
+        local_start = self._get_local_datetime(self.start)
+        company = self.env.user.company_id
+        return {
+            'customer_name': self.customer_name,
+            'service_name': self.service_id.name,
+            'staff_name': self.staff_member_id.name,
+            'start_formatted': local_start.strftime('%A, %B %d, %Y - %I:%M %p'),
+            'duration': self.duration,
+            'branch_name': self.branch_id.name,
+            'branch_phone': self.branch_id.phone or company.phone,
+            'branch_email': self.branch_id.email or company.email,
+            'company_name': company.name,
+            'branch_address': f"{self.branch_id.street}, {self.branch_id.city}",
+        }
+
     def _generate_reminder_email_html(self):
         """Generate HTML for reminder email"""
         self.ensure_one()
-        template = self._load_email_template('reminder')
-        
+        return self._load_email_template('reminder').format(**self._get_reminder_email_values())
+
+    def _get_reminder_sms_body(self):
+        """Reminder SMS with full appointment details"""
+        self.ensure_one()
         local_start = self._get_local_datetime(self.start)
-        
-        return template.format(
-            customer_name=self.customer_name,
-            service_name=self.service_id.name,
-            staff_name=self.staff_member_id.name,
-            start_formatted=local_start.strftime('%A, %B %d, %Y - %I:%M %p'),
-            duration=self.duration,
-            branch_name=self.branch_id.name,
-            branch_phone=self.branch_id.phone or self.env.user.company_id.phone,
-            branch_email=self.branch_id.email or self.env.user.company_id.email,
-            company_name=self.env.user.company_id.name,
-            branch_address=f"{self.branch_id.street}, {self.branch_id.city}"
+        return (
+            f"⏰ Reminder: Appointment Tomorrow!\n"
+            f"Service: {self.service_id.name}\n"
+            f"Date: {local_start.strftime('%A, %B %d')}\n"
+            f"Time: {local_start.strftime('%I:%M %p')}\n"
+            f"Duration: {self.duration} hrs\n"
+            f"Staff: {self.staff_member_id.name}\n"
+            f"Location: {self.branch_id.name}\n"
+            f"Address: {self.branch_id.street}, {self.branch_id.city}\n"
+            f"Contact: {self.branch_id.phone or self.env.user.company_id.phone}\n"
+            f"See you tomorrow!"
         )
     
     def _send_reminder_notifications(self):
-        """Send reminder notifications (to be called by scheduled action)"""
-        for appointment in self:
-            if appointment.customer_email:
-                subject = f"Reminder: Your appointment tomorrow - {appointment.name}"
-                body_html = appointment._generate_reminder_email_html()
-                email_from = appointment.branch_id.email or self.env.user.company_id.email or 'noreply@localhost'
-                
-                mail = self.env['mail.mail'].sudo().create({
-                    'subject': subject,
-                    'body_html': body_html,
-                    'email_to': appointment.customer_email,
-                    'email_from': email_from,
-                })
-                mail.send()
-            
-            if appointment.customer_phone:
-                local_start = appointment._get_local_datetime(appointment.start)
-                # Enhanced reminder SMS with full appointment details
-                sms_message = (
-                    f"⏰ Reminder: Appointment Tomorrow!\n"
-                    f"Service: {appointment.service_id.name}\n"
-                    f"Date: {local_start.strftime('%A, %B %d')}\n"
-                    f"Time: {local_start.strftime('%I:%M %p')}\n"
-                    f"Duration: {appointment.duration} hrs\n"
-                    f"Staff: {appointment.staff_member_id.name}\n"
-                    f"Location: {appointment.branch_id.name}\n"
-                    f"Address: {appointment.branch_id.street}, {appointment.branch_id.city}\n"
-                    f"Contact: {appointment.branch_id.phone or self.env.user.company_id.phone}\n"
-                    f"See you tomorrow!"
-                )
-                self._send_sms_notification(appointment.customer_phone, sms_message)
+        """Queue reminder emails and SMS for these appointments in bulk.
+
+        Related records are fetched for the whole set, bodies rendered in one
+        pass, and the ``mail.mail`` / ``sms.sms`` records created in batches;
+        delivery is left to the mail and SMS queues.
+        """
+        self.fetch(['name', 'customer_email', 'customer_phone', 'phone_e164', 'start', 'duration'])
+        self.service_id.fetch(['name'])
+        self.staff_member_id.fetch(['name'])
+        self.branch_id.fetch(['name', 'phone', 'email', 'street', 'city'])
+        default_from = self.env.user.company_id.email or 'noreply@localhost'
+
+        for batch in split_every(REMINDER_BATCH_SIZE, self.filtered('customer_email').ids, self.browse):
+            bodies = email_templates.render_batch(
+                'reminder', [appointment._get_reminder_email_values() for appointment in batch])
+            self.env['mail.mail'].sudo().create([{
+                'subject': f"Reminder: Your appointment tomorrow - {appointment.name}",
+                'body_html': body_html,
+                'email_to': appointment.customer_email,
+                'email_from': appointment.branch_id.email or default_from,
+            } for appointment, body_html in zip(batch, bodies)])
+        mail_queue = self.env.ref('mail.ir_cron_mail_scheduler_action', raise_if_not_found=False)
+        if mail_queue and any(self.mapped('customer_email')):
+            mail_queue._trigger()
+
+        for batch in split_every(REMINDER_BATCH_SIZE, self.filtered('customer_phone').ids, self.browse):
+            try:
+                self.env['sms.sms'].create([{
+                    'number': appointment.phone_e164 or appointment.customer_phone,
+                    'body': appointment._get_reminder_sms_body(),
+                    'state': 'outgoing',
+                } for appointment in batch])
+            except Exception as e:
+                _logger.warning(f"Failed to queue {len(batch)} reminder SMS: {str(e)}")
     
     def _send_sms_notification(self, phone_number, message):
         """Send SMS notification using Odoo's SMS gateway"""
@@ -915,8 +1173,8 @@ class Appointment(models.Model):
             ('start', '<=', end_of_day)
         ])
         
-        for appointment in appointments:
-            appointment._send_reminder_notifications()
+        _logger.info(f"Queueing reminders for {len(appointments)} appointments")
+        appointments._send_reminder_notifications()
     
     # ==================== FOLLOW-UP REMINDER METHODS ====================
     
@@ -1006,7 +1264,7 @@ class Appointment(models.Model):
             if settings.followup_channel in ['sms', 'both'] and self.customer_phone:
                 _logger.info(f"Sending follow-up SMS to {self.customer_phone}")
                 sms_message = self._generate_followup_sms(settings)
-                self._send_sms_notification(self.customer_phone, sms_message)
+                self._send_sms_notification(self.phone_e164 or self.customer_phone, sms_message)
             
             # Update tracking fields
             self.write({
@@ -1017,6 +1275,46 @@ class Appointment(models.Model):
         except Exception as e:
             _logger.error(f"Error sending follow-up for appointment {self.id}: {str(e)}")
     
+    @api.model
+    def _get_followup_due_ids(self, settings, today):
+        """Return the ids of the appointments due for a follow-up on ``today``, in one query.
+
+        An appointment is due when it is completed, follow-ups were not stopped,
+        the customer has not booked again since, the maximum count is not reached
+        (unless following up until rebooked) and the first or repeat delay has
+        elapsed.
+        """
+        self.flush_model(['state', 'followup_stopped', 'followup_count', 'last_followup_date',
+                          'customer_email', 'start', 'stop'])
+        self.env.cr.execute("""
+            SELECT a.id
+              FROM custom_appointment a
+             WHERE a.state = 'completed'
+               AND a.followup_stopped IS NOT TRUE
+               AND a.stop IS NOT NULL
+               AND (%(until_rebooked)s OR COALESCE(a.followup_count, 0) < %(max_count)s)
+               AND CASE WHEN COALESCE(a.followup_count, 0) = 0
+                        THEN a.stop::date + %(start_days)s <= %(today)s
+                        ELSE a.last_followup_date + %(repeat_days)s <= %(today)s
+                   END
+               AND NOT EXISTS (
+                       SELECT 1
+                         FROM custom_appointment b
+                        WHERE b.customer_email = a.customer_email
+                          AND b.start > a.stop
+                          AND b.state IN ('draft', 'confirmed', 'in_progress', 'completed')
+                          AND b.id != a.id
+                   )
+             ORDER BY a.id
+        """, {
+            'until_rebooked': bool(settings.followup_until_rebooked),
+            'max_count': settings.max_followup_count or 0,
+            'start_days': settings.followup_start_days or 0,
+            'repeat_days': settings.followup_repeat_interval or 0,
+            'today': today,
+        })
+        return [row[0] for row in self.env.cr.fetchall()]
+
     @api.model
     def send_followup_reminders(self):
         """Scheduled method to send follow-up reminders to customers after their appointment"""
@@ -1030,51 +1328,14 @@ class Appointment(models.Model):
             return
         
         today = fields.Date.today()
+        due_ids = self._get_followup_due_ids(settings, today)
+        _logger.info(f"Found {len(due_ids)} completed appointments due for a follow-up")
         
-        # Find eligible appointments (completed and not manually stopped)
-        appointments = self.search([
-            ('state', '=', 'completed'),
-            ('followup_stopped', '=', False),
-        ])
-        
-        _logger.info(f"Found {len(appointments)} completed appointments to check for follow-ups")
-        
-        for appt in appointments:
-            try:
-                # Skip if customer already rebooked
-                if appt._check_customer_rebooked():
-                    _logger.info(f"Skipping appointment {appt.id}: customer has rebooked")
-                    continue
-                
-                # Check max count (unless until_rebooked is enabled)
-                if not settings.followup_until_rebooked:
-                    if appt.followup_count >= settings.max_followup_count:
-                        _logger.info(f"Skipping appointment {appt.id}: max follow-ups reached ({appt.followup_count}/{settings.max_followup_count})")
-                        continue
-                
-                # Calculate if it's time to send
-                if not appt.stop:
-                    continue
-                    
-                completion_date = appt.stop.date()
-                
-                if appt.followup_count == 0:
-                    # First follow-up: start_days after completion
-                    send_date = completion_date + timedelta(days=settings.followup_start_days)
-                else:
-                    # Subsequent: repeat_interval after last followup
-                    if not appt.last_followup_date:
-                        continue
-                    send_date = appt.last_followup_date + timedelta(days=settings.followup_repeat_interval)
-                
-                if today >= send_date:
-                    _logger.info(f"Sending follow-up for appointment {appt.id} (due date: {send_date})")
+        for batch in split_every(FOLLOWUP_BATCH_SIZE, due_ids, self.browse):
+            for appt in batch:
+                try:
                     appt._send_followup_notifications(settings)
-                else:
-                    _logger.debug(f"Appointment {appt.id} not yet due for follow-up (due: {send_date})")
-                    
-            except Exception as e:
-                _logger.error(f"Error processing follow-up for appointment {appt.id}: {str(e)}")
-                continue
+                except Exception as e:
+                    _logger.error(f"Error processing follow-up for appointment {appt.id}: {str(e)}")
         
         _logger.info("=== Finished send_followup_reminders cron job ===")
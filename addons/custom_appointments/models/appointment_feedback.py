@@ -5,6 +5,13 @@ import logging
 
 _logger = logging.getLogger(__name__)
 
+# Latest completion date already backfilled, and how far before it each run
+# looks again for completions committed late
+BACKFILL_WATERMARK_PARAM = 'custom_appointments.feedback_backfill_watermark'
+BACKFILL_OVERLAP = timedelta(hours=1)
+# Due feedback requests sent per cron run
+DUE_REQUEST_BATCH_SIZE = 200
+
 
 class AppointmentFeedback(models.Model):
     _name = 'custom.appointment.feedback'
@@ -18,6 +25,9 @@ class AppointmentFeedback(models.Model):
     customer_name = fields.Char(string='Customer Name')
     customer_email = fields.Char(string='Customer Email')
     customer_phone = fields.Char(string='Customer Phone')
+    phone_e164 = fields.Char(
+        string='Customer Phone (E.164)', compute='_compute_phone_e164', store=True,
+        index='btree_not_null')
     staff_member_id = fields.Many2one('custom.staff.member', string='Staff Member')
     service_id = fields.Many2one('company.service', string='Service')
     branch_id = fields.Many2one('custom.branch', string='Branch')
@@ -31,6 +41,10 @@ class AppointmentFeedback(models.Model):
 
     request_count = fields.Integer(string='Requests Sent', default=0)
     last_request_date = fields.Datetime(string='Last Request Sent')
+    next_request_at = fields.Datetime(
+        string='Next Request Due', compute='_compute_next_request_at', store=True,
+        index='btree_not_null',
+        help='When the next feedback request is due; empty once the feedback is no longer pending')
     submitted_date = fields.Datetime(string='Submitted On')
 
     # Curated answer fields (1-5 ratings: 0 = unanswered)
@@ -51,6 +65,35 @@ class AppointmentFeedback(models.Model):
          'Feedback already exists for this appointment.'),
     ]
 
+    @api.depends('customer_phone', 'branch_id.company_id.country_id')
+    def _compute_phone_e164(self):
+        for fb in self:
+            fb.phone_e164 = fb._phone_format(
+                number=fb.customer_phone,
+                country=fb.branch_id.company_id.country_id or self.env.company.country_id,
+                force_format='E164',
+            ) or False
+
+    @api.depends('state', 'request_count', 'last_request_date', 'appointment_id.completed_date')
+    def _compute_next_request_at(self):
+        settings = self.env['custom.appointment.settings'].sudo().get_settings()
+        first_delay = timedelta(minutes=settings.feedback_first_delay_minutes or 0)
+        repeat = timedelta(minutes=settings.feedback_repeat_interval_minutes or 0)
+        for fb in self:
+            if fb.state != 'pending':
+                fb.next_request_at = False
+            elif fb.request_count == 0:
+                anchor = fb.appointment_id.completed_date
+                fb.next_request_at = anchor + first_delay if anchor else False
+            else:
+                fb.next_request_at = fb.last_request_date + repeat if fb.last_request_date else False
+
+    @api.model
+    def _recompute_pending_next_request_at(self):
+        """Reschedule every pending request, e.g. after the delays were changed in settings"""
+        pending = self.search([('state', '=', 'pending')])
+        self.env.add_to_compute(self._fields['next_request_at'], pending)
+
     @api.model_create_multi
     def create(self, vals_list):
         for vals in vals_list:
@@ -59,9 +102,9 @@ class AppointmentFeedback(models.Model):
         return super().create(vals_list)
 
     @api.model
-    def _create_for_appointment(self, appointment):
-        """Create a pending feedback record copying appointment data."""
-        return self.create({
+    def _prepare_values_for_appointment(self, appointment):
+        """Values of a pending feedback record copying appointment data."""
+        return {
             'appointment_id': appointment.id,
             'partner_id': appointment.partner_id.id,
             'customer_name': appointment.customer_name,
@@ -70,23 +113,44 @@ class AppointmentFeedback(models.Model):
             'staff_member_id': appointment.staff_member_id.id,
             'service_id': appointment.service_id.id,
             'branch_id': appointment.branch_id.id,
-        })
+        }
+
+    @api.model
+    def _create_for_appointment(self, appointment):
+        """Create a pending feedback record copying appointment data."""
+        return self.create(self._prepare_values_for_appointment(appointment))
 
     @api.model
     def _backfill_feedback_records(self):
-        """Create pending feedback records for completed appointments missing one."""
-        Appointment = self.env['custom.appointment']
-        completed = Appointment.search([
-            ('state', '=', 'completed'),
-            ('completed_date', '!=', False),
-        ])
-        if not completed:
-            return
-        existing = self.search([('appointment_id', 'in', completed.ids)])
-        existing_appt_ids = set(existing.mapped('appointment_id').ids)
-        for appt in completed:
-            if appt.id not in existing_appt_ids:
-                self._create_for_appointment(appt)
+        """Create pending feedback records for completed appointments missing one.
+
+        Only appointments completed since the last run (minus a safety overlap
+        for transactions that committed late) are considered; an anti-join
+        drops the ones that already have feedback, and all missing records are
+        created with a single ``create()``.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        watermark = fields.Datetime.to_datetime(ICP.get_param(BACKFILL_WATERMARK_PARAM))
+        self.env['custom.appointment'].flush_model(['state', 'completed_date'])
+        self.flush_model(['appointment_id'])
+        self.env.cr.execute("""
+            SELECT a.id, a.completed_date
+              FROM custom_appointment a
+             WHERE a.state = 'completed'
+               AND a.completed_date IS NOT NULL
+               AND (%(since)s IS NULL OR a.completed_date > %(since)s)
+               AND NOT EXISTS (
+                       SELECT 1 FROM custom_appointment_feedback f WHERE f.appointment_id = a.id
+                   )
+             ORDER BY a.id
+        """, {'since': watermark - BACKFILL_OVERLAP if watermark else None})
+        rows = self.env.cr.fetchall()
+        if rows:
+            appointments = self.env['custom.appointment'].browse([row[0] for row in rows])
+            self.create([self._prepare_values_for_appointment(appt) for appt in appointments])
+            latest = max(row[1] for row in rows)
+            if not watermark or latest > watermark:
+                ICP.set_param(BACKFILL_WATERMARK_PARAM, fields.Datetime.to_string(latest))
 
     @api.model
     def cron_send_feedback_requests(self):
@@ -102,29 +166,31 @@ class AppointmentFeedback(models.Model):
         base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url', '')
         return f"{base_url}/appointments/feedback/{self.access_token}"
 
+    @api.model
+    def _expire_over_limit_requests(self, max_requests):
+        """Expire every pending feedback that already got ``max_requests`` requests, in one UPDATE."""
+        self.flush_model(['state', 'request_count'])
+        self.env.cr.execute("""
+            UPDATE custom_appointment_feedback
+               SET state = 'expired', next_request_at = NULL
+             WHERE state = 'pending' AND request_count >= %s
+        """, [max_requests or 0])
+        if self.env.cr.rowcount:
+            self.invalidate_model(['state', 'next_request_at'])
+            _logger.info("Expired %s feedback requests over the maximum", self.env.cr.rowcount)
+
     @api.model
     def _send_due_requests(self, settings):
-        now = fields.Datetime.now()
-        first_delay = timedelta(minutes=settings.feedback_first_delay_minutes or 0)
-        repeat = timedelta(minutes=settings.feedback_repeat_interval_minutes or 0)
-        pending = self.search([('state', '=', 'pending')])
-        for fb in pending:
-            if fb.appointment_id.state == 'cancelled':
-                continue
-            if fb.request_count >= settings.feedback_max_requests:
-                fb.state = 'expired'
-                continue
-            if fb.request_count == 0:
-                anchor = fb.appointment_id.completed_date
-                if not anchor:
-                    continue
-                due = anchor + first_delay
-            else:
-                if not fb.last_request_date:
-                    continue
-                due = fb.last_request_date + repeat
-            if now >= due:
-                fb._send_request(settings)
+        self._expire_over_limit_requests(settings.feedback_max_requests)
+        due = self.search([
+            ('state', '=', 'pending'),
+            ('next_request_at', '<=', fields.Datetime.now()),
+            ('appointment_id.state', '!=', 'cancelled'),
+        ], order='next_request_at', limit=DUE_REQUEST_BATCH_SIZE)
+        for fb in due:
+            fb._send_request(settings)
+        if len(due) == DUE_REQUEST_BATCH_SIZE:
+            self.env.ref('custom_appointments.feedback_request_cron')._trigger()
 
     def _send_request(self, settings):
         self.ensure_one()
@@ -161,7 +227,7 @@ class AppointmentFeedback(models.Model):
                 branch_name=self.branch_id.name or '',
                 feedback_link=link,
             )
-            self.appointment_id._send_sms_notification(self.customer_phone, sms_body)
+            self.appointment_id._send_sms_notification(self.phone_e164 or self.customer_phone, sms_body)
 
         self.write({
             'request_count': self.request_count + 1,
@@ -256,4 +322,4 @@ class AppointmentFeedback(models.Model):
                 valid_to=valid_to,
                 booking_link=booking_link,
             )
-            self.appointment_id._send_sms_notification(self.customer_phone, sms_body)
+            self.appointment_id._send_sms_notification(self.phone_e164 or self.customer_phone, sms_body)
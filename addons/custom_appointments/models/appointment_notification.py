@@ -0,0 +1,130 @@
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from datetime import timedelta
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Jobs drained per cron run, attempts before a job is given up, and the base
+# retry delay (doubled after every failed attempt)
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+RETRY_DELAY_MINUTES = 2
+
+
+class AppointmentNotification(models.Model):
+    """Outbox of the work triggered by an appointment confirmation.
+
+    Confirming an appointment only enqueues jobs; invoicing, emails and SMS
+    run later from a cron, off the payment callback requests.
+    """
+    _name = 'custom.appointment.notification'
+    _description = 'Appointment Notification Job'
+    _order = 'next_attempt_at, id'
+    _log_access = False
+
+    appointment_id = fields.Many2one(
+        'custom.appointment', string='Appointment',
+        required=True, ondelete='cascade', index=True)
+    job_type = fields.Selection([
+        ('invoice', 'Invoice'),
+        ('customer_confirmation_email', 'Customer Confirmation Email'),
+        ('customer_confirmation_sms', 'Customer Confirmation SMS'),
+        ('staff_notification', 'Staff Notification'),
+    ], string='Job', required=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', default='pending', required=True)
+    attempts = fields.Integer(string='Attempts', default=0)
+    next_attempt_at = fields.Datetime(string='Next Attempt', default=fields.Datetime.now, required=True)
+    last_error = fields.Text(string='Last Error')
+
+    _sql_constraints = [
+        ('appointment_job_unique', 'unique(appointment_id, job_type)',
+         'A notification job is queued only once per appointment.'),
+    ]
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS custom_appointment_notification_due_index
+                ON custom_appointment_notification (next_attempt_at)
+             WHERE state = 'pending'
+        """)
+
+    @api.model
+    def _enqueue(self, appointments, job_types):
+        """Queue the given jobs for the appointments, skipping the ones already queued.
+
+        Runs a single INSERT and wakes the outbox cron up, so that callers
+        (typically payment callbacks) return without waiting on SMTP or the
+        SMS gateway.
+        """
+        rows = [(appointment.id, job_type) for appointment in appointments for job_type in job_types]
+        if not rows:
+            return
+        self.env.cr.execute(f"""
+            INSERT INTO custom_appointment_notification
+                   (appointment_id, job_type, state, attempts, next_attempt_at)
+            SELECT appointment_id, job_type, 'pending', 0, now() AT TIME ZONE 'UTC'
+              FROM (VALUES {', '.join(['%s'] * len(rows))}) AS job (appointment_id, job_type)
+            ON CONFLICT (appointment_id, job_type) DO NOTHING
+        """, rows)
+        self.env.ref('custom_appointments.notification_outbox_cron')._trigger()
+
+    @api.model
+    def _cron_process_jobs(self):
+        """Scheduled method draining the outbox"""
+        self._process_jobs(auto_commit=True)
+
+    @api.model
+    def _process_jobs(self, limit=BATCH_SIZE, auto_commit=False):
+        """Run due jobs, retrying failures with an exponential backoff.
+
+        :param auto_commit: commit after every job so that a sent email is
+                            never sent again because a later job failed
+        """
+        jobs = self.search([
+            ('state', '=', 'pending'),
+            ('next_attempt_at', '<=', fields.Datetime.now()),
+        ], limit=limit)
+        for job in jobs:
+            try:
+                with self.env.cr.savepoint():
+                    job._run()
+                job.write({'state': 'done', 'attempts': job.attempts + 1, 'last_error': False})
+            except Exception as e:
+                attempts = job.attempts + 1
+                _logger.warning("Notification job %s (%s) for appointment %s failed (attempt %s): %s",
+                                job.id, job.job_type, job.appointment_id.id, attempts, e)
+                job.write({
+                    'state': 'failed' if attempts >= MAX_ATTEMPTS else 'pending',
+                    'attempts': attempts,
+                    'next_attempt_at': fields.Datetime.now() + timedelta(
+                        minutes=RETRY_DELAY_MINUTES * 2 ** (attempts - 1)),
+                    'last_error': str(e),
+                })
+            if auto_commit:
+                self.env.cr.commit()
+        if len(jobs) == limit:
+            self.env.ref('custom_appointments.notification_outbox_cron')._trigger()
+        return jobs
+
+    def _run(self):
+        self.ensure_one()
+        appointment = self.appointment_id
+        if self.job_type == 'invoice':
+            if not appointment.invoice_id:
+                appointment._create_and_pay_invoice()
+        elif self.job_type == 'customer_confirmation_email':
+            appointment._send_confirmation_email()
+            if appointment.customer_email and not appointment.customer_notification_sent:
+                raise UserError("Confirmation email could not be sent")
+        elif self.job_type == 'customer_confirmation_sms':
+            # Separate job, so that retrying a failed email never sends the SMS again
+            appointment._send_confirmation_sms()
+        elif self.job_type == 'staff_notification':
+            appointment._send_staff_notification()
+            if appointment.staff_member_id.email and not appointment.staff_notification_sent:
+                raise UserError("Staff notification email could not be sent")
@@ -65,6 +65,12 @@ class AppointmentSettings(models.Model):
         help='SMS template with placeholders: {customer_name}, {service_name}, {branch_name}, {booking_link}'
     )
 
+    # ==================== ONLINE BOOKING ====================
+
+    slot_hold_minutes = fields.Integer(
+        string='Hold Unpaid Slots (Minutes)', default=15,
+        help='Minutes an unpaid online booking keeps its slot before it is cancelled and the slot is released')
+
     # ==================== CUSTOMER FEEDBACK ====================
 
     enable_feedback_requests = fields.Boolean(
@@ -148,7 +154,10 @@ class AppointmentSettings(models.Model):
 
     def write(self, vals):
         """Ensure only one settings record exists"""
-        return super(AppointmentSettings, self).write(vals)
+        result = super(AppointmentSettings, self).write(vals)
+        if {'feedback_first_delay_minutes', 'feedback_repeat_interval_minutes'} & set(vals):
+            self.env['custom.appointment.feedback'].sudo()._recompute_pending_next_request_at()
+        return result
 
     @api.model_create_multi
     def create(self, vals_list):
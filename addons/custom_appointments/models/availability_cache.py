@@ -0,0 +1,172 @@
+import json
+import logging
+from datetime import timedelta
+
+import psycopg2
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+
+class AvailabilityCache(models.Model):
+    """Computed slot grids shared by every HTTP worker.
+
+    One row per (staff member, service, local date). Each row carries the
+    versions it was computed at: the one of its (staff member, date) stamp,
+    bumped by bookings, and the ``availability_version`` of the staff member
+    and of the service, bumped by working hours and duration changes. A row
+    is only served while all three match, so a worker still computing from an
+    older snapshot never stores a grid that outlives the change, even on days
+    that had no row yet.
+    """
+    _name = 'custom.appointment.availability.cache'
+    _description = 'Appointment Availability Cache'
+    _log_access = False
+
+    staff_member_id = fields.Many2one('custom.staff.member', string='Staff Member',
+                                      required=True, ondelete='cascade')
+    service_id = fields.Many2one('company.service', string='Service', required=True, ondelete='cascade')
+    date = fields.Date(string='Date', required=True)
+    version = fields.Integer(string='Version', required=True, default=0)
+    staff_version = fields.Integer(string='Staff Version', required=True, default=0)
+    service_version = fields.Integer(string='Service Version', required=True, default=0)
+    slots = fields.Text(string='Slots', help='JSON list of the free slots of the day')
+
+    _sql_constraints = [
+        ('staff_service_date_unique', 'unique(staff_member_id, service_id, date)',
+         'Availability is cached only once per staff member, service and date.'),
+    ]
+
+    @api.model
+    def _lookup(self, service, staff_dates):
+        """Return the valid cached grids of the requested days.
+
+        :param staff_dates: ``{staff_id: [date, ...]}``
+        :return: ``(slots, versions)`` where ``slots`` maps ``(staff_id, date)``
+                 to the cached slot list and ``versions`` maps every requested
+                 ``(staff_id, date)`` to its current ``(stamp, staff, service)``
+                 versions
+        """
+        wanted = {(staff_id, day) for staff_id, days in staff_dates.items() for day in days}
+        if not wanted:
+            return {}, {}
+        staff_ids = tuple({staff_id for staff_id, day in wanted})
+        first, last = min(day for _sid, day in wanted), max(day for _sid, day in wanted)
+        cr = self.env.cr
+        cr.execute("""
+            SELECT staff_member_id, date, version
+              FROM custom_appointment_availability_stamp
+             WHERE staff_member_id IN %s AND date BETWEEN %s AND %s
+        """, [staff_ids, first, last])
+        stamps = {(staff_id, day): version for staff_id, day, version in cr.fetchall()}
+        # read in the same snapshot as the working hours and duration the grids are computed from
+        staff_versions = {
+            staff.id: staff.availability_version
+            for staff in self.env['custom.staff.member'].browse(staff_ids)
+        }
+        versions = {
+            (staff_id, day): (stamps.get((staff_id, day), 0), staff_versions[staff_id], service.availability_version)
+            for staff_id, day in wanted
+        }
+
+        cr.execute("""
+            SELECT staff_member_id, date, version, staff_version, service_version, slots
+              FROM custom_appointment_availability_cache
+             WHERE service_id = %s AND staff_member_id IN %s AND date BETWEEN %s AND %s
+        """, [service.id, staff_ids, first, last])
+        slots = {}
+        for staff_id, day, version, staff_version, service_version, payload in cr.fetchall():
+            if versions.get((staff_id, day)) == (version, staff_version, service_version):
+                slots[(staff_id, day)] = json.loads(payload)
+        return slots, versions
+
+    @api.model
+    def _store(self, service, slots, versions):
+        """Store freshly computed grids, tagged with the versions they were computed at.
+
+        The insert runs in a savepoint so that a visitor racing another one on
+        the same rows never fails the page request; the lost row is simply
+        filled by the next visitor.
+        """
+        rows = [
+            (staff_id, service.id, day, *versions.get((staff_id, day), (0, 0, 0)), json.dumps(day_slots))
+            for (staff_id, day), day_slots in slots.items()
+        ]
+        try:
+            with self.env.cr.savepoint(flush=False):
+                # Versions only grow: a row is replaced by a strictly newer computation
+                self.env.cr.execute(f"""
+                    INSERT INTO custom_appointment_availability_cache AS cache
+                           (staff_member_id, service_id, date, version, staff_version, service_version, slots)
+                    VALUES {', '.join(['%s'] * len(rows))}
+                    ON CONFLICT (staff_member_id, service_id, date) DO UPDATE
+                       SET version = EXCLUDED.version,
+                           staff_version = EXCLUDED.staff_version,
+                           service_version = EXCLUDED.service_version,
+                           slots = EXCLUDED.slots
+                     WHERE cache.version <= EXCLUDED.version
+                       AND cache.staff_version <= EXCLUDED.staff_version
+                       AND cache.service_version <= EXCLUDED.service_version
+                       AND (cache.version, cache.staff_version, cache.service_version)
+                           <> (EXCLUDED.version, EXCLUDED.staff_version, EXCLUDED.service_version)
+                """, rows)
+        except psycopg2.Error as e:
+            _logger.debug('Availability cache: could not store %d row(s): %s', len(rows), e)
+
+    @api.model
+    def _invalidate(self, keys):
+        """Invalidate every cached grid of the given ``(staff_id, date)`` days."""
+        if not keys:
+            return
+        rows = [(staff_id, day, 1) for staff_id, day in sorted(keys)]
+        self.env.cr.execute(f"""
+            INSERT INTO custom_appointment_availability_stamp (staff_member_id, date, version)
+            VALUES {', '.join(['%s'] * len(rows))}
+            ON CONFLICT (staff_member_id, date) DO UPDATE
+               SET version = custom_appointment_availability_stamp.version + 1
+        """, rows)
+
+    @api.model
+    def _invalidate_staff(self, staff_ids):
+        """Invalidate the grids of the given staff members, including the ones being computed."""
+        if not staff_ids:
+            return
+        self.env.cr.execute("""
+            UPDATE custom_staff_member SET availability_version = availability_version + 1 WHERE id IN %s
+        """, [tuple(staff_ids)])
+        self.env['custom.staff.member'].invalidate_model(['availability_version'])
+
+    @api.model
+    def _invalidate_services(self, service_ids):
+        """Invalidate the grids of the given services, including the ones being computed."""
+        if not service_ids:
+            return
+        self.env.cr.execute("""
+            UPDATE company_service SET availability_version = availability_version + 1 WHERE id IN %s
+        """, [tuple(service_ids)])
+        self.env['company.service'].invalidate_model(['availability_version'])
+
+    @api.autovacuum
+    def _gc_past_days(self):
+        """Remove cache rows and stamps of days that can no longer be booked."""
+        limit = fields.Date.today() - timedelta(days=1)
+        self.env.cr.execute("DELETE FROM custom_appointment_availability_cache WHERE date < %s", [limit])
+        self.env.cr.execute("DELETE FROM custom_appointment_availability_stamp WHERE date < %s", [limit])
+
+
+class AvailabilityStamp(models.Model):
+    """Version counter of a staff member's day, bumped whenever it changes."""
+    _name = 'custom.appointment.availability.stamp'
+    _description = 'Appointment Availability Stamp'
+    _log_access = False
+
+    staff_member_id = fields.Many2one('custom.staff.member', string='Staff Member',
+                                      required=True, ondelete='cascade')
+    date = fields.Date(string='Date', required=True)
+    version = fields.Integer(string='Version', required=True, default=0)
+
+    _sql_constraints = [
+        ('staff_date_unique', 'unique(staff_member_id, date)',
+         'A staff member has a single availability stamp per date.'),
+    ]
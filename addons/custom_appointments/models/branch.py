@@ -60,6 +60,41 @@ class Branch(models.Model):
             'context': {'default_branch_id': self.id},
         }
     
+    def _get_bookable_staff(self, service):
+        """Return the staff members of this branch who can be booked for ``service``."""
+        self.ensure_one()
+        domain = [
+            ('branch_id', '=', self.id),
+            ('is_bookable', '=', True),
+            ('active', '=', True),
+        ]
+        if service.requires_specific_staff and service.allowed_staff_ids:
+            domain.append(('id', 'in', service.allowed_staff_ids.ids))
+        return self.env['custom.staff.member'].search(domain, order='name')
+
+    def _get_available_slots(self, service, date_from=None, days=1):
+        """Return the union of the free slots of every bookable staff member of the branch.
+
+        The availability of all staff members is computed in one batch; each
+        slot lists the staff members who can take it, in display order.
+
+        :return: ``{'YYYY-MM-DD': [{..., 'staff_ids': [id, ...]}, ...]}`` sorted by time
+        """
+        self.ensure_one()
+        staff_members = self._get_bookable_staff(service)
+        slots_by_staff = staff_members._get_available_slots(service, date_from=date_from, days=days)
+        merged = {}
+        for staff in staff_members:
+            for date_str, slots in slots_by_staff[staff.id].items():
+                day_slots = merged.setdefault(date_str, {})
+                for slot in slots:
+                    entry = day_slots.setdefault(slot['datetime'], dict(slot, staff_ids=[]))
+                    entry['staff_ids'].append(staff.id)
+        return {
+            date_str: [day_slots[key] for key in sorted(day_slots)]
+            for date_str, day_slots in sorted(merged.items())
+        }
+
     @api.model_create_multi
     def create(self, vals_list):
         for vals in vals_list:
@@ -0,0 +1,98 @@
+"""In-memory registry of the HTML email templates shipped in ``templates/email``.
+
+Every file is read and compiled once per worker, on first use; rendering then
+only joins the precompiled literal chunks with the formatted values. With a
+``--dev`` mode enabled, a template is reloaded whenever its file changes.
+"""
+import logging
+import os
+import threading
+from string import Formatter
+
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates', 'email')
+
+_CONVERSIONS = {None: None, 's': str, 'r': repr, 'a': ascii}
+
+
+class EmailTemplate:
+    """A ``str.format`` template parsed once into literal chunks and fields"""
+
+    __slots__ = ('name', 'text', 'mtime', 'fields', '_parts')
+
+    def __init__(self, name, text, mtime=None):
+        self.name = name
+        self.text = text
+        self.mtime = mtime
+        self._parts = [
+            (literal, field, spec, _CONVERSIONS[conversion])
+            for literal, field, spec, conversion in Formatter().parse(text)
+        ]
+        self.fields = frozenset(field for _literal, field, _spec, _conv in self._parts if field)
+        if any(not field.isidentifier() or '{' in spec
+               for _literal, field, spec, _conv in self._parts if field):
+            raise ValueError(f"Email template {name!r} only supports plain {{name}} placeholders")
+
+    def render(self, values):
+        """Render with a mapping of values; a missing placeholder raises ``KeyError``"""
+        chunks = []
+        for literal, field, spec, conversion in self._parts:
+            chunks.append(literal)
+            if field is not None:
+                value = values[field]
+                if conversion:
+                    value = conversion(value)
+                chunks.append(format(value, spec))
+        return ''.join(chunks)
+
+    def format(self, **values):
+        """Drop-in for ``str.format`` on the raw template text"""
+        return self.render(values)
+
+
+_templates = {}
+_lock = threading.Lock()
+
+
+def _load(name):
+    path = os.path.join(TEMPLATE_DIR, f'{name}.html')
+    with open(path, 'r', encoding='utf-8') as f:
+        return EmailTemplate(name, f.read(), os.path.getmtime(path))
+
+
+def _load_all():
+    for filename in sorted(os.listdir(TEMPLATE_DIR)):
+        name, ext = os.path.splitext(filename)
+        if ext == '.html':
+            _templates[name] = _load(name)
+    _logger.debug("Loaded %d email templates from %s", len(_templates), TEMPLATE_DIR)
+
+
+def get_template(name):
+    """Return the compiled template ``templates/email/<name>.html``"""
+    if not _templates:
+        with _lock:
+            if not _templates:
+                _load_all()
+    template = _templates.get(name)
+    if config['dev_mode']:
+        path = os.path.join(TEMPLATE_DIR, f'{name}.html')
+        if template is None or os.path.getmtime(path) != template.mtime:
+            template = _templates[name] = _load(name)
+    elif template is None:
+        raise FileNotFoundError(f"No email template named {name!r} in {TEMPLATE_DIR}")
+    return template
+
+
+def render(name, **values):
+    """Render a single email body"""
+    return get_template(name).render(values)
+
+
+def render_batch(name, values_list):
+    """Render one email body per mapping of values, resolving the template once"""
+    template = get_template(name)
+    return [template.render(values) for values in values_list]
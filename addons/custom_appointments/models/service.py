@@ -43,9 +43,18 @@ class CompanyService(models.Model):
     
     preparation_time = fields.Float(string='Preparation Time (Hours)', default=0.0)
     cleanup_time = fields.Float(string='Cleanup Time (Hours)', default=0.0)
+    availability_version = fields.Integer(
+        string='Availability Version', default=0, readonly=True, copy=False,
+        help='Bumped whenever the duration or buffers change, to invalidate the cached availability')
     notes = fields.Text(string='Internal Notes')
     customer_notes = fields.Text(string='Customer Instructions')
     
+    def write(self, vals):
+        result = super().write(vals)
+        if any(field in vals for field in ['duration', 'preparation_time', 'cleanup_time']):
+            self.env['custom.appointment.availability.cache']._invalidate_services(self.ids)
+        return result
+
     @api.depends('duration')
     def _compute_duration_minutes(self):
         for record in self:
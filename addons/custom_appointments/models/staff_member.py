@@ -1,5 +1,15 @@
+from datetime import datetime, time, timedelta
+
+import pytz
+
 from odoo import models, fields, api
 
+DAY_AVAILABILITY_FIELDS = [
+    'monday_available', 'tuesday_available', 'wednesday_available',
+    'thursday_available', 'friday_available', 'saturday_available', 'sunday_available',
+]
+WORKING_HOURS_FIELDS = DAY_AVAILABILITY_FIELDS + ['start_time', 'end_time']
+
 
 class StaffMember(models.Model):
     _name = 'custom.staff.member'
@@ -16,6 +26,9 @@ class StaffMember(models.Model):
     branch_id = fields.Many2one('custom.branch', string='Branch', required=True)
     
     is_bookable = fields.Boolean(string='Available for Booking', default=True)
+    availability_version = fields.Integer(
+        string='Availability Version', default=0, readonly=True, copy=False,
+        help='Bumped whenever the working hours change, to invalidate the cached availability')
     specialization = fields.Char(string='Specialization/Role')
     hourly_rate = fields.Float(string='Hourly Rate', help='Rate per hour for services')
     
@@ -109,6 +122,12 @@ class StaffMember(models.Model):
                     record.user_id = user.id
         return records
     
+    def write(self, vals):
+        result = super().write(vals)
+        if any(field in vals for field in WORKING_HOURS_FIELDS):
+            self.env['custom.appointment.availability.cache']._invalidate_staff(self.ids)
+        return result
+
     def _compute_appointment_stats(self):
         """Compute appointment statistics for each staff member"""
         from datetime import datetime, date
@@ -127,6 +146,111 @@ class StaffMember(models.Model):
             )
             staff.this_month_appointments = len(this_month_appts)
     
+    def _get_available_slots(self, service, date_from=None, days=1):
+        """Return free booking slots for these staff members over a date window.
+
+        Days already present in the shared availability cache are served from
+        it; the remaining ones are computed in one batch and stored back.
+        Slots that are already in the past are dropped on the way out.
+
+        :param service: ``company.service`` record being booked
+        :param date_from: first local date of the window (defaults to today)
+        :param days: number of days in the window
+        :return: ``{staff_id: {'YYYY-MM-DD': [slot, ...]}}``; dates without any
+                 free slot are omitted
+        """
+        server_tz = self.env['custom.appointment']._get_server_timezone()
+        now_local = datetime.now(server_tz).replace(tzinfo=None)
+        if not date_from:
+            date_from = now_local.date()
+        result = {staff.id: {} for staff in self}
+        if (service.duration or 0.0) <= 0:
+            return result
+
+        dates = [date_from + timedelta(days=offset) for offset in range(days)]
+        dates = [day for day in dates if day >= now_local.date()]
+        working_dates = {
+            staff.id: [day for day in dates if staff[DAY_AVAILABILITY_FIELDS[day.weekday()]]]
+            for staff in self
+        }
+
+        Cache = self.env['custom.appointment.availability.cache']
+        slots, versions = Cache._lookup(service, working_dates)
+        missing = {
+            staff_id: [day for day in staff_dates if (staff_id, day) not in slots]
+            for staff_id, staff_dates in working_dates.items()
+        }
+        computed = self._compute_available_slots(service, missing, server_tz)
+        if computed:
+            Cache._store(service, computed, versions)
+            slots.update(computed)
+
+        now_iso = now_local.isoformat(timespec='seconds')
+        for staff_id, staff_dates in working_dates.items():
+            for day in staff_dates:
+                free = [slot for slot in slots[(staff_id, day)] if slot['datetime'] > now_iso]
+                if free:
+                    result[staff_id][day.strftime('%Y-%m-%d')] = free
+        return result
+
+    def _compute_available_slots(self, service, staff_dates, server_tz):
+        """Compute the free slots of the given working days, ignoring the clock.
+
+        Busy intervals for the whole window are loaded with a single query and
+        swept against the generated slots in memory, so the number of queries
+        does not depend on the number of days, slots or staff members.
+
+        :param staff_dates: ``{staff_id: [date, ...]}`` in chronological order
+        :return: ``{(staff_id, date): [slot, ...]}``, including empty days
+        """
+        duration = service.duration
+        buffer_before = timedelta(hours=service.preparation_time or 0.0)
+        buffer_after = timedelta(hours=(service.cleanup_time or 0.0) + duration)
+
+        # (date, local start, conflict window start, conflict window end) per
+        # staff, in chronological order
+        candidates = {}
+        for staff in self.browse(list(staff_dates)):
+            staff_candidates = candidates[staff.id] = []
+            for day in staff_dates[staff.id]:
+                current = staff.start_time
+                while current + duration <= staff.end_time:
+                    slot_local = datetime.combine(day, time.min) + timedelta(hours=current)
+                    current += duration
+                    slot_utc = server_tz.localize(slot_local).astimezone(pytz.utc).replace(tzinfo=None)
+                    staff_candidates.append((day, slot_local, slot_utc - buffer_before, slot_utc + buffer_after))
+
+        result = {(staff_id, day): [] for staff_id, days in staff_dates.items() for day in days}
+        all_candidates = [c for staff_candidates in candidates.values() for c in staff_candidates]
+        if not all_candidates:
+            return result
+
+        busy = self.env['custom.appointment']._get_busy_intervals(
+            list(candidates),
+            min(c[2] for c in all_candidates),
+            max(c[3] for c in all_candidates),
+        )
+
+        for staff_id, staff_candidates in candidates.items():
+            intervals = busy.get(staff_id, [])
+            index, max_stop = 0, None
+            for day, slot_local, check_start, check_end in staff_candidates:
+                # Intervals are sorted by start and check_end only grows, so the
+                # running max stop of every interval starting before check_end is
+                # enough to detect an overlap.
+                while index < len(intervals) and intervals[index][0] < check_end:
+                    if max_stop is None or intervals[index][1] > max_stop:
+                        max_stop = intervals[index][1]
+                    index += 1
+                if max_stop is not None and max_stop > check_start:
+                    continue
+                result[(staff_id, day)].append({
+                    'time': slot_local.strftime('%H:%M'),
+                    'datetime': slot_local.isoformat(),
+                    'display_time': slot_local.strftime('%I:%M %p'),
+                })
+        return result
+
     def action_view_appointments(self):
         """Action to view all appointments for this staff member"""
         return {
@@ -1,2 +1,7 @@
 from . import test_feedback
 from . import test_appointment_source
+from . import test_availability
+from . import test_notification_outbox
+from . import test_email_templates
+from . import test_followup
+from . import test_phone
@@ -0,0 +1,229 @@
+from datetime import datetime, time, timedelta
+
+import pytz
+
+from odoo import fields
+from odoo.exceptions import ValidationError
+from odoo.tests.common import TransactionCase
+
+
+class TestAvailability(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.branch = self.env['custom.branch'].create({'name': 'Test Branch'})
+        self.category = self.env['service.category'].create({'name': 'Lashes'})
+        self.service = self.env['company.service'].create({
+            'name': 'Classic Set',
+            'category_id': self.category.id,
+            'price': 100.0,
+            'duration': 2.0,
+        })
+        self.staff = self.env['custom.staff.member'].create({
+            'name': 'Jane',
+            'branch_id': self.branch.id,
+            'email': 'jane@test.com',
+            'phone': '254700000000',
+        })
+        self.server_tz = self.env['custom.appointment']._get_server_timezone()
+        # A Monday at least a week away, so no slot is filtered out as past
+        today = fields.Date.today()
+        self.monday = today + timedelta(days=7 + (7 - today.weekday()) % 7)
+
+    def _utc(self, day, hour):
+        local = self.server_tz.localize(datetime.combine(day, time(hour)))
+        return local.astimezone(pytz.utc).replace(tzinfo=None)
+
+    def _make_appointment(self, day, hour, hours=2, **overrides):
+        vals = {
+            'name': 'Test Appt',
+            'customer_name': 'Alice',
+            'customer_email': 'alice@test.com',
+            'customer_phone': '254711111111',
+            'service_id': self.service.id,
+            'staff_member_id': self.staff.id,
+            'branch_id': self.branch.id,
+            'start': self._utc(day, hour),
+            'stop': self._utc(day, hour + hours),
+            'price': 100.0,
+        }
+        vals.update(overrides)
+        return self.env['custom.appointment'].create(vals)
+
+    def _times(self, slots_by_date, day):
+        return [slot['time'] for slot in slots_by_date.get(day.strftime('%Y-%m-%d'), [])]
+
+    def test_free_day_has_all_slots(self):
+        slots = self.staff._get_available_slots(self.service, self.monday)[self.staff.id]
+        self.assertEqual(self._times(slots, self.monday), ['09:00', '11:00', '13:00', '15:00'])
+
+    def test_unavailable_weekday_is_omitted(self):
+        saturday = self.monday + timedelta(days=5)
+        slots = self.staff._get_available_slots(self.service, saturday)[self.staff.id]
+        self.assertEqual(slots, {})
+
+    def test_booked_slot_is_removed(self):
+        self._make_appointment(self.monday, 11)
+        slots = self.staff._get_available_slots(self.service, self.monday, days=2)[self.staff.id]
+        self.assertEqual(self._times(slots, self.monday), ['09:00', '13:00', '15:00'])
+        self.assertEqual(
+            self._times(slots, self.monday + timedelta(days=1)),
+            ['09:00', '11:00', '13:00', '15:00'])
+
+    def test_cancelled_appointment_does_not_block(self):
+        self._make_appointment(self.monday, 11, state='cancelled')
+        slots = self.staff._get_available_slots(self.service, self.monday)[self.staff.id]
+        self.assertEqual(self._times(slots, self.monday), ['09:00', '11:00', '13:00', '15:00'])
+
+    def test_buffers_extend_the_conflict_window(self):
+        self.service.cleanup_time = 0.5
+        self._make_appointment(self.monday, 13)
+        slots = self.staff._get_available_slots(self.service, self.monday)[self.staff.id]
+        # 11:00-13:00 plus 30 minutes of cleanup now overlaps the 13:00 booking
+        self.assertEqual(self._times(slots, self.monday), ['09:00', '15:00'])
+
+    def test_long_appointment_spanning_several_slots(self):
+        self._make_appointment(self.monday, 9, hours=5)
+        slots = self.staff._get_available_slots(self.service, self.monday)[self.staff.id]
+        self.assertEqual(self._times(slots, self.monday), ['15:00'])
+
+    def _count_queries(self, days):
+        self.env.invalidate_all()
+        before = self.cr.sql_log_count
+        self.staff._get_available_slots(self.service, self.monday, days=days)
+        return self.cr.sql_log_count - before
+
+    def test_query_count_does_not_grow_with_window(self):
+        self._make_appointment(self.monday, 11)
+        self._make_appointment(self.monday + timedelta(days=8), 9)
+        self.assertEqual(self._count_queries(1), self._count_queries(30))
+
+    def test_cached_grid_is_invalidated_by_new_booking(self):
+        self.staff._get_available_slots(self.service, self.monday)
+        Cache = self.env['custom.appointment.availability.cache']
+        self.assertEqual(Cache.search_count([('staff_member_id', '=', self.staff.id)]), 1)
+        self._make_appointment(self.monday, 11)
+        slots = self.staff._get_available_slots(self.service, self.monday)[self.staff.id]
+        self.assertEqual(self._times(slots, self.monday), ['09:00', '13:00', '15:00'])
+
+    def test_cached_grid_is_invalidated_by_cancellation(self):
+        appointment = self._make_appointment(self.monday, 11)
+        self.staff._get_available_slots(self.service, self.monday)
+        appointment.write({'state': 'cancelled'})
+        slots = self.staff._get_available_slots(self.service, self.monday)[self.staff.id]
+        self.assertEqual(self._times(slots, self.monday), ['09:00', '11:00', '13:00', '15:00'])
+
+    def test_cached_grid_is_invalidated_by_working_hours(self):
+        self.staff._get_available_slots(self.service, self.monday)
+        self.staff.write({'end_time': 13.0})
+        slots = self.staff._get_available_slots(self.service, self.monday)[self.staff.id]
+        self.assertEqual(self._times(slots, self.monday), ['09:00', '11:00'])
+
+    def test_cached_grid_is_invalidated_by_service_duration(self):
+        self.staff._get_available_slots(self.service, self.monday)
+        self.service.write({'duration': 4.0})
+        slots = self.staff._get_available_slots(self.service, self.monday)[self.staff.id]
+        self.assertEqual(self._times(slots, self.monday), ['09:00', '13:00'])
+
+    def test_grid_computed_before_a_change_is_not_served(self):
+        # A worker read the versions, then the working hours changed before it stored its grid
+        Cache = self.env['custom.appointment.availability.cache']
+        tuesday = self.monday + timedelta(days=1)
+        _slots, versions = Cache._lookup(self.service, {self.staff.id: [tuesday]})
+        self.staff.write({'end_time': 13.0})
+        Cache._store(self.service, {(self.staff.id, tuesday): [{'time': '15:00', 'datetime': 'x'}]}, versions)
+        slots = self.staff._get_available_slots(self.service, tuesday)[self.staff.id]
+        self.assertEqual(self._times(slots, tuesday), ['09:00', '11:00'])
+
+    def test_cached_grid_is_reused(self):
+        self.staff._get_available_slots(self.service, self.monday, days=7)
+        self.env.invalidate_all()
+        before = self.cr.sql_log_count
+        self.staff._get_available_slots(self.service, self.monday, days=7)
+        queries = self.cr.sql_log_count - before
+        # configuration and record reads plus the two cache lookups, no busy-interval search
+        self.assertLessEqual(queries, 5)
+
+    def test_branch_slots_merge_staff(self):
+        mary = self.env['custom.staff.member'].create({
+            'name': 'Mary',
+            'branch_id': self.branch.id,
+            'email': 'mary@test.com',
+            'phone': '254700000001',
+            'end_time': 13.0,
+        })
+        self._make_appointment(self.monday, 9)
+        slots = self.branch._get_available_slots(self.service, self.monday)
+        day = slots[self.monday.strftime('%Y-%m-%d')]
+        self.assertEqual([slot['time'] for slot in day], ['09:00', '11:00', '13:00', '15:00'])
+        self.assertEqual(
+            [slot['staff_ids'] for slot in day],
+            [[mary.id], [self.staff.id, mary.id], [self.staff.id], [self.staff.id]],
+        )
+
+    def test_branch_slots_respect_required_staff(self):
+        mary = self.env['custom.staff.member'].create({
+            'name': 'Mary',
+            'branch_id': self.branch.id,
+            'email': 'mary@test.com',
+            'phone': '254700000001',
+        })
+        self.service.write({'requires_specific_staff': True, 'allowed_staff_ids': [(6, 0, mary.ids)]})
+        self._make_appointment(self.monday, 9, staff_member_id=mary.id)
+        day = self.branch._get_available_slots(self.service, self.monday)[self.monday.strftime('%Y-%m-%d')]
+        self.assertEqual([slot['time'] for slot in day], ['11:00', '13:00', '15:00'])
+
+    def test_overlapping_booking_is_rejected(self):
+        self._make_appointment(self.monday, 9)
+        with self.assertRaisesRegex(ValidationError, 'Jane'):
+            self._make_appointment(self.monday, 10)
+        # adjacent bookings and other staff are fine, and the transaction is still usable
+        self._make_appointment(self.monday, 11)
+        mary = self.env['custom.staff.member'].create({
+            'name': 'Mary',
+            'branch_id': self.branch.id,
+            'email': 'mary@test.com',
+            'phone': '254700000001',
+        })
+        self._make_appointment(self.monday, 10, staff_member_id=mary.id)
+
+    def test_overlap_ignores_cancelled_appointments(self):
+        appointment = self._make_appointment(self.monday, 9, state='cancelled')
+        other = self._make_appointment(self.monday, 9)
+        with self.assertRaises(ValidationError):
+            appointment.write({'state': 'confirmed'})
+        other.write({'state': 'cancelled'})
+        appointment.write({'state': 'confirmed'})
+
+    def test_expired_hold_does_not_block(self):
+        past = fields.Datetime.now() - timedelta(minutes=1)
+        self._make_appointment(self.monday, 9, hold_expires_at=past)
+        self._make_appointment(self.monday, 13, hold_expires_at=fields.Datetime.now() + timedelta(minutes=10))
+        slots = self.staff._get_available_slots(self.service, self.monday)[self.staff.id]
+        self.assertEqual(self._times(slots, self.monday), ['09:00', '11:00', '15:00'])
+
+    def test_expired_holds_are_cancelled_in_bulk(self):
+        past = fields.Datetime.now() - timedelta(minutes=1)
+        expired = self._make_appointment(self.monday, 9, hold_expires_at=past)
+        expired |= self._make_appointment(self.monday, 11, hold_expires_at=past)
+        active = self._make_appointment(self.monday, 13, hold_expires_at=fields.Datetime.now() + timedelta(minutes=10))
+        paid = self._make_appointment(self.monday, 15, hold_expires_at=past)
+        self.env.cr.execute("UPDATE custom_appointment SET payment_status = 'paid' WHERE id = %s", [paid.id])
+        paid.invalidate_recordset(['payment_status'])
+        self.env['custom.appointment']._cron_expire_slot_holds()
+        self.assertEqual(expired.mapped('state'), ['cancelled', 'cancelled'])
+        self.assertFalse(any(expired.mapped('hold_expires_at')))
+        self.assertEqual(active.state, 'draft')
+        self.assertEqual(paid.state, 'draft')
+        # the released slot can be booked again
+        self._make_appointment(self.monday, 9)
+
+    def test_hold_cleared_on_payment(self):
+        appointment = self._make_appointment(
+            self.monday, 9, hold_expires_at=fields.Datetime.now() + timedelta(minutes=10))
+        self.assertTrue(appointment._extend_slot_hold())
+        appointment.write({'payment_status': 'paid'})
+        self.assertFalse(appointment.hold_expires_at)
+        appointment.write({'hold_expires_at': fields.Datetime.now() - timedelta(minutes=1),
+                           'payment_status': 'pending'})
+        self.assertFalse(appointment._extend_slot_hold())
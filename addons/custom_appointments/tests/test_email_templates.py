@@ -0,0 +1,29 @@
+import os
+
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.custom_appointments.models import email_templates
+
+
+class TestEmailTemplates(TransactionCase):
+
+    def test_all_templates_render_like_str_format(self):
+        for filename in os.listdir(email_templates.TEMPLATE_DIR):
+            name = filename[:-len('.html')]
+            template = email_templates.get_template(name)
+            values = {field: f'<{field}>' for field in template.fields}
+            with open(os.path.join(email_templates.TEMPLATE_DIR, filename), encoding='utf-8') as f:
+                self.assertEqual(template.format(**values), f.read().format(**values), name)
+
+    def test_templates_are_loaded_once(self):
+        self.assertIs(email_templates.get_template('reminder'), email_templates.get_template('reminder'))
+
+    def test_render_batch(self):
+        fields = email_templates.get_template('reminder').fields
+        bodies = email_templates.render_batch('reminder', [
+            {field: 'Alice' for field in fields},
+            {field: 'Bob' for field in fields},
+        ])
+        self.assertIn('Alice', bodies[0])
+        self.assertIn('Bob', bodies[1])
+        self.assertNotIn('Alice', bodies[1])
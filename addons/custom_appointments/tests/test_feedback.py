@@ -115,6 +115,23 @@ class TestAppointmentFeedback(TransactionCase):
         Feedback.cron_send_feedback_requests()
         self.assertEqual(len(Feedback.search([('appointment_id', '=', appt.id)])), 1)
 
+    def test_backfill_only_looks_after_watermark(self):
+        self.settings.write({'enable_feedback_requests': True})
+        Feedback = self.env['custom.appointment.feedback']
+        first = self._make_appointment()
+        first.action_complete()
+        Feedback._backfill_feedback_records()
+        self.assertTrue(Feedback.search([('appointment_id', '=', first.id)]))
+        # completed long before the watermark: outside the overlap window
+        old = self._make_appointment()
+        old.action_complete()
+        old.completed_date = fields.Datetime.now() - timedelta(days=2)
+        recent = self._make_appointment()
+        recent.action_complete()
+        Feedback._backfill_feedback_records()
+        self.assertFalse(Feedback.search([('appointment_id', '=', old.id)]))
+        self.assertTrue(Feedback.search([('appointment_id', '=', recent.id)]))
+
     def _completed_feedback(self, minutes_ago):
         """Helper: completed appointment + pending feedback with completed_date in the past."""
         self.settings.write({'enable_feedback_requests': True})
@@ -133,6 +150,16 @@ class TestAppointmentFeedback(TransactionCase):
         self.assertTrue(sms)
         self.assertIn('feedback', sms[0].body.lower())
 
+    def test_next_request_at_follows_sends_and_settings(self):
+        appt, fb = self._completed_feedback(minutes_ago=10)
+        self.assertEqual(fb.next_request_at, appt.completed_date + timedelta(minutes=5))
+        self.env['custom.appointment.feedback']._send_due_requests(self.settings)
+        self.assertEqual(fb.next_request_at, fb.last_request_date + timedelta(minutes=1440))
+        self.settings.write({'feedback_repeat_interval_minutes': 60})
+        self.assertEqual(fb.next_request_at, fb.last_request_date + timedelta(minutes=60))
+        fb.submit_feedback({'staff_rating': 5})
+        self.assertFalse(fb.next_request_at)
+
     def test_first_request_not_sent_when_too_early(self):
         appt, fb = self._completed_feedback(minutes_ago=2)  # delay default 5
         self.env['custom.appointment.feedback']._send_due_requests(self.settings)
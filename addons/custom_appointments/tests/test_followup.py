@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+from odoo import fields
+from odoo.tests.common import TransactionCase
+
+
+class TestFollowupEligibility(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.settings = self.env['custom.appointment.settings'].get_settings()
+        self.settings.write({
+            'followup_start_days': 14,
+            'followup_repeat_interval': 7,
+            'max_followup_count': 3,
+            'followup_until_rebooked': False,
+        })
+        self.branch = self.env['custom.branch'].create({'name': 'Test Branch'})
+        self.category = self.env['service.category'].create({'name': 'Lashes'})
+        self.service = self.env['company.service'].create({
+            'name': 'Classic Set',
+            'category_id': self.category.id,
+            'price': 100.0,
+            'duration': 2.0,
+        })
+        self.staff = self.env['custom.staff.member'].create({
+            'name': 'Jane',
+            'branch_id': self.branch.id,
+            'email': 'jane@test.com',
+            'phone': '254700000000',
+        })
+        self.today = fields.Date.today()
+
+    def _make_appointment(self, days_ago, email='alice@test.com', state='completed', **overrides):
+        start = datetime.combine(self.today - timedelta(days=days_ago), datetime.min.time()) + timedelta(hours=9)
+        vals = {
+            'name': 'Test Appt',
+            'customer_name': 'Alice',
+            'customer_email': email,
+            'service_id': self.service.id,
+            'staff_member_id': self.staff.id,
+            'branch_id': self.branch.id,
+            'start': start,
+            'stop': start + timedelta(hours=2),
+            'price': 100.0,
+            'state': state,
+        }
+        vals.update(overrides)
+        return self.env['custom.appointment'].create(vals)
+
+    def _due(self):
+        return self.env['custom.appointment']._get_followup_due_ids(self.settings, self.today)
+
+    def test_first_followup_due_after_start_days(self):
+        due = self._make_appointment(20, email='due@test.com')
+        self._make_appointment(10, email='early@test.com')
+        self.assertEqual(self._due(), due.ids)
+
+    def test_rebooked_customer_is_skipped(self):
+        self._make_appointment(30)
+        self._make_appointment(-3, state='confirmed')
+        self.assertEqual(self._due(), [])
+
+    def test_repeat_interval_and_max_count(self):
+        repeat_due = self._make_appointment(60, email='a@test.com', followup_count=1,
+                                            last_followup_date=self.today - timedelta(days=7))
+        self._make_appointment(60, email='b@test.com', followup_count=1,
+                               last_followup_date=self.today - timedelta(days=3))
+        maxed = self._make_appointment(90, email='c@test.com', followup_count=3,
+                                       last_followup_date=self.today - timedelta(days=30))
+        self._make_appointment(40, email='d@test.com', followup_stopped=True)
+        self.assertEqual(self._due(), repeat_due.ids)
+        self.settings.followup_until_rebooked = True
+        self.assertEqual(sorted(self._due()), sorted((repeat_due | maxed).ids))
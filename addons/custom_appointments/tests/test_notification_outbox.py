@@ -0,0 +1,124 @@
+from datetime import datetime
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.custom_appointments.models.appointment import Appointment
+from odoo.addons.custom_appointments.models.appointment_notification import MAX_ATTEMPTS
+
+
+class TestNotificationOutbox(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.branch = self.env['custom.branch'].create({'name': 'Test Branch'})
+        self.category = self.env['service.category'].create({'name': 'Lashes'})
+        self.service = self.env['company.service'].create({
+            'name': 'Classic Set',
+            'category_id': self.category.id,
+            'price': 100.0,
+            'duration': 2.0,
+        })
+        self.staff = self.env['custom.staff.member'].create({
+            'name': 'Jane',
+            'branch_id': self.branch.id,
+            'email': 'jane@test.com',
+            'phone': '254700000000',
+        })
+        self.appointment = self.env['custom.appointment'].create({
+            'name': 'Test Appt',
+            'customer_name': 'Alice',
+            'customer_email': 'alice@test.com',
+            'customer_phone': '254711111111',
+            'service_id': self.service.id,
+            'staff_member_id': self.staff.id,
+            'branch_id': self.branch.id,
+            'start': datetime(2026, 1, 1, 9, 0),
+            'stop': datetime(2026, 1, 1, 11, 0),
+            'price': 100.0,
+            'payment_status': 'paid',
+        })
+        self.Outbox = self.env['custom.appointment.notification']
+
+    def _jobs(self):
+        return self.Outbox.search([('appointment_id', '=', self.appointment.id)])
+
+    def test_confirm_only_enqueues(self):
+        with patch.object(Appointment, '_send_confirmation_notifications') as send, \
+                patch.object(Appointment, '_create_and_pay_invoice') as invoice:
+            self.appointment.action_confirm()
+        self.assertEqual(self.appointment.state, 'confirmed')
+        send.assert_not_called()
+        invoice.assert_not_called()
+        self.assertEqual(sorted(self._jobs().mapped('job_type')), [
+            'customer_confirmation_email', 'customer_confirmation_sms', 'invoice', 'staff_notification'])
+
+    def test_confirm_pushes_payment_status(self):
+        channel = self.appointment._get_payment_status_channel()
+        self.assertIn(f'_{self.appointment.id}_', channel)
+        with patch.object(type(self.env['bus.bus']), '_sendone') as sendone:
+            self.appointment.action_confirm()
+        sendone.assert_called_once_with(channel, 'custom_appointments.payment_status', {
+            'appointment_id': self.appointment.id,
+            'payment_status': 'paid',
+            'state': 'confirmed',
+        })
+
+    def test_enqueue_is_idempotent(self):
+        self.Outbox._enqueue(self.appointment, ['customer_confirmation_email'])
+        self.Outbox._enqueue(self.appointment, ['customer_confirmation_email', 'invoice'])
+        self.assertEqual(sorted(self._jobs().mapped('job_type')), ['customer_confirmation_email', 'invoice'])
+
+    def test_jobs_run_and_retry(self):
+        self.Outbox._enqueue(self.appointment, ['invoice', 'staff_notification'])
+        with patch.object(Appointment, '_create_and_pay_invoice', side_effect=Exception('SMTP down')), \
+                patch.object(Appointment, '_send_staff_notification', autospec=True,
+                             side_effect=lambda appt: appt.write({'staff_notification_sent': True})) as notify:
+            self.Outbox._process_jobs()
+        notify.assert_called_once()
+        jobs = {job.job_type: job for job in self._jobs()}
+        self.assertEqual(jobs['staff_notification'].state, 'done')
+        invoice = jobs['invoice']
+        self.assertEqual((invoice.state, invoice.attempts), ('pending', 1))
+        self.assertGreater(invoice.next_attempt_at, fields.Datetime.now())
+        self.assertIn('SMTP down', invoice.last_error)
+
+    def test_email_retry_does_not_resend_sms(self):
+        self.Outbox._enqueue(self.appointment, ['customer_confirmation_email', 'customer_confirmation_sms'])
+        with patch.object(Appointment, '_send_confirmation_email') as email, \
+                patch.object(Appointment, '_send_confirmation_sms') as sms:
+            self.Outbox._process_jobs()
+            self._jobs().write({'next_attempt_at': fields.Datetime.now()})
+            self.Outbox._process_jobs()
+        self.assertEqual(email.call_count, 2)
+        sms.assert_called_once()
+        jobs = {job.job_type: job for job in self._jobs()}
+        self.assertEqual(jobs['customer_confirmation_email'].state, 'pending')
+        self.assertEqual(jobs['customer_confirmation_sms'].state, 'done')
+
+    def test_job_given_up_after_max_attempts(self):
+        self.Outbox._enqueue(self.appointment, ['invoice'])
+        job = self._jobs()
+        job.write({'attempts': MAX_ATTEMPTS - 1})
+        with patch.object(Appointment, '_create_and_pay_invoice', side_effect=Exception('boom')):
+            self.Outbox._process_jobs()
+        self.assertEqual(job.state, 'failed')
+
+    def test_reminders_are_queued_in_bulk(self):
+        other = self.appointment.copy({
+            'customer_email': 'bob@test.com',
+            'customer_phone': '254722222222',
+            'start': datetime(2026, 1, 1, 11, 0),
+            'stop': datetime(2026, 1, 1, 13, 0),
+        })
+        appointments = self.appointment | other
+        mails_before = self.env['mail.mail'].search([])
+        sms_before = self.env['sms.sms'].search([])
+        appointments._send_reminder_notifications()
+        mails = self.env['mail.mail'].search([]) - mails_before
+        self.assertEqual(sorted(mails.mapped('email_to')), ['alice@test.com', 'bob@test.com'])
+        self.assertEqual(set(mails.mapped('state')), {'outgoing'})
+        self.assertTrue(all('Alice' in mail.body_html for mail in mails if mail.email_to == 'alice@test.com'))
+        sms = self.env['sms.sms'].search([]) - sms_before
+        self.assertEqual(sorted(sms.mapped('number')), ['254711111111', '254722222222'])
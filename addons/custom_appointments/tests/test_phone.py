@@ -0,0 +1,54 @@
+from datetime import datetime
+
+from odoo.tests.common import TransactionCase
+
+
+class TestPhoneNormalization(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.env.company.country_id = self.env.ref('base.ke')
+        self.branch = self.env['custom.branch'].create({'name': 'Test Branch'})
+        self.category = self.env['service.category'].create({'name': 'Lashes'})
+        self.service = self.env['company.service'].create({
+            'name': 'Classic Set',
+            'category_id': self.category.id,
+            'price': 100.0,
+            'duration': 2.0,
+        })
+        self.staff = self.env['custom.staff.member'].create({
+            'name': 'Jane',
+            'branch_id': self.branch.id,
+            'email': 'jane@test.com',
+        })
+
+    def _make_appointment(self, phone):
+        # One day per appointment, so that they never overlap
+        day = len(self.env['custom.appointment'].search([('staff_member_id', '=', self.staff.id)])) + 1
+        return self.env['custom.appointment'].create({
+            'name': 'Test Appt',
+            'customer_name': 'Alice',
+            'customer_email': 'alice.phone@test.com',
+            'customer_phone': phone,
+            'service_id': self.service.id,
+            'staff_member_id': self.staff.id,
+            'branch_id': self.branch.id,
+            'start': datetime(2026, 1, day, 9, 0),
+            'stop': datetime(2026, 1, day, 11, 0),
+            'price': 100.0,
+        })
+
+    def test_local_and_international_formats_normalize_alike(self):
+        for phone in ('0712 345 678', '+254 712-345-678', '254712345678'):
+            self.assertEqual(self._make_appointment(phone).phone_e164, '+254712345678', phone)
+
+    def test_invalid_phone_is_not_normalized(self):
+        self.assertFalse(self._make_appointment('12').phone_e164)
+        self.assertFalse(self._make_appointment(False).phone_e164)
+
+    def test_partner_and_feedback_are_normalized(self):
+        appointment = self._make_appointment('0712 345 678')
+        # Partners rely on the phone_sanitized field of mail.thread.phone
+        self.assertEqual(appointment.partner_id.phone_sanitized, '+254712345678')
+        feedback = self.env['custom.appointment.feedback']._create_for_appointment(appointment)
+        self.assertEqual(feedback.phone_e164, '+254712345678')
@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+
+from .client import CircuitOpenError, IntegrationClient, get_client
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+{
+    'name': 'Integration HTTP Client',
+    'version': '1.0',
+    'category': 'Hidden/Tools',
+    'summary': 'Shared outbound HTTP client for the payment and SMS gateway integrations',
+    'description': """
+Integration HTTP Client
+=======================
+Outbound HTTP client shared by the gateway integrations (Emalify, PesaPal, M-Pesa).
+
+Features:
+- One pooled session per gateway and worker process (keep-alive, TLS reuse)
+- Per-gateway connect and read timeouts
+- Bounded retries with jittered exponential backoff, limited to requests
+  that are safe to repeat
+- Circuit breaker failing fast while a gateway is down
+- Per-call latency logging and per-gateway metrics
+    """,
+    'depends': ['base'],
+    'data': [],
+    'installable': True,
+    'application': False,
+    'auto_install': False,
+    'license': 'LGPL-3',
+}
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""Outbound HTTP client shared by the gateway integrations.
+
+Every gateway gets one :class:`IntegrationClient` per worker process (see
+:func:`get_client`). It holds a pooled ``requests.Session``, the gateway
+timeouts, a retry policy and a circuit breaker. Once a gateway fails
+repeatedly, calls to it fail immediately for a while, so that workers do not
+all end up waiting on it.
+
+Only requests that are safe to repeat are retried: idempotent methods, calls
+made with ``retry=True``, and requests whose connection could not be
+established (connect timeout, refused connection, DNS failure). Any other
+failure of a POST, like a read timeout or a connection reset after the body
+was sent, is never retried, as the gateway may already have processed it.
+"""
+
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+_logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+# Statuses worth retrying: the gateway or a proxy in front of it is overloaded
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """The gateway failed repeatedly; calls are rejected without being sent"""
+
+
+def is_connect_failure(error):
+    """Whether the request failed before a connection was established, thus never reached the server"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError) or not error.args:
+        return False
+    # requests wraps the urllib3 error, usually in a MaxRetryError
+    reason = getattr(error.args[0], 'reason', error.args[0])
+    return isinstance(reason, NewConnectionError)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures.
+
+    While open, calls are rejected. After ``reset_timeout`` seconds a single
+    trial call is let through: its success closes the circuit again, its
+    failure keeps it open for another ``reset_timeout``.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._trial and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                _logger.info("%s: circuit closed, the gateway answers again", self.name)
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or (self._opened_at is None and self._failures >= self.failure_threshold):
+                if not self._trial:
+                    _logger.warning("%s: circuit opened after %s consecutive failures",
+                                    self.name, self._failures)
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+
+class ClientMetrics:
+    """Call counters and cumulated latency of a client, per outcome"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self.retries = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.statuses = {}
+
+    def record(self, status, elapsed):
+        with self._lock:
+            self.calls += 1
+            self.total_time += elapsed
+            self.max_time = max(self.max_time, elapsed)
+            if status is None:
+                self.errors += 1
+            else:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def record_rejected(self):
+        with self._lock:
+            self.rejected += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'errors': self.errors,
+                'rejected': self.rejected,
+                'retries': self.retries,
+                'avg_time': self.total_time / self.calls if self.calls else 0.0,
+                'max_time': self.max_time,
+                'statuses': dict(self.statuses),
+            }
+
+
+class IntegrationClient:
+    """HTTP client of one gateway.
+
+    :param name: gateway name, used in logs
+    :param timeout: default ``(connect, read)`` timeouts in seconds
+    :param retries: maximum number of retries of a retryable call
+    :param backoff: base delay of the retries in seconds; the delay before
+                    retry ``n`` is random between 0 and ``backoff * 2 ** n``
+    :param failure_threshold: consecutive failures opening the circuit
+    :param reset_timeout: seconds before an open circuit lets a call through
+    :param pool_maxsize: connections kept open to the gateway
+    :param slow_threshold: calls slower than this many seconds are logged at INFO
+    """
+
+    def __init__(self, name, timeout=(5, 30), retries=2, backoff=0.5,
+                 failure_threshold=5, reset_timeout=30, pool_maxsize=16, slow_threshold=5):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.slow_threshold = slow_threshold
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.metrics = ClientMetrics()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, retry=None, **kwargs):
+        """Send a request; same parameters as ``requests.request``.
+
+        :param retry: whether the request may be sent again after a read
+                      timeout or a retryable status; by default, only for
+                      idempotent methods
+        :return: the ``requests.Response``, whatever its status
+        :raises CircuitOpenError: if the circuit is open
+        :raises requests.exceptions.RequestException: if the last attempt failed
+        """
+        method = method.upper()
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        kwargs.setdefault('timeout', self.timeout)
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self.metrics.record_rejected()
+                raise CircuitOpenError(f"{self.name}: gateway unavailable, request not sent")
+            start = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                self._record(method, url, None, time.monotonic() - start)
+                self.breaker.record_failure()
+                if not (retry or is_connect_failure(e)) or attempt >= self.retries:
+                    raise
+                _logger.info("%s: %s %s failed (%s), retrying", self.name, method, url, e)
+            else:
+                self._record(method, url, response.status_code, time.monotonic() - start)
+                if response.status_code >= 500 or response.status_code == 429:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if not (retry and response.status_code in RETRY_STATUSES and attempt < self.retries):
+                    return response
+                _logger.info("%s: %s %s answered %s, retrying", self.name, method, url, response.status_code)
+            self.metrics.record_retry()
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def _record(self, method, url, status, elapsed):
+        self.metrics.record(status, elapsed)
+        level = logging.INFO if elapsed >= self.slow_threshold else logging.DEBUG
+        _logger.log(level, "%s: %s %s -> %s in %.0f ms",
+                    self.name, method, url.split('?', 1)[0], status or 'error', elapsed * 1000)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name, **options):
+    """Return the process-wide client of the gateway ``name``.
+
+    The options (see :class:`IntegrationClient`) are only used when the
+    client is created, on the first call.
+    """
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = IntegrationClient(name, **options)
+    return client
@@ -0,0 +1,79 @@
+from unittest.mock import Mock, patch
+
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from odoo.tests.common import BaseCase
+
+from odoo.addons.integration_http_client.client import CircuitOpenError, IntegrationClient, get_client
+
+
+def _response(status):
+    response = Mock(spec=requests.Response)
+    response.status_code = status
+    return response
+
+
+class TestIntegrationClient(BaseCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = IntegrationClient('test', retries=2, backoff=0, failure_threshold=3, reset_timeout=60)
+        self.addCleanup(self.client.session.close)
+        patcher = patch.object(self.client.session, 'request')
+        self.send = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_client_is_shared(self):
+        self.assertIs(get_client('test_shared'), get_client('test_shared', timeout=1))
+
+    def test_idempotent_request_is_retried(self):
+        self.send.side_effect = [_response(503), requests.exceptions.ReadTimeout(), _response(200)]
+        self.assertEqual(self.client.get('https://gateway.test/status').status_code, 200)
+        self.assertEqual(self.send.call_count, 3)
+        self.assertEqual(self.client.metrics.snapshot()['retries'], 2)
+
+    def test_post_is_not_resent_after_read_timeout(self):
+        self.send.side_effect = requests.exceptions.ReadTimeout()
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            self.client.post('https://gateway.test/pay')
+        self.assertEqual(self.send.call_count, 1)
+
+    def test_post_is_resent_after_connect_failure(self):
+        refused = MaxRetryError(None, '/pay', NewConnectionError(None, 'Connection refused'))
+        self.send.side_effect = [requests.exceptions.ConnectionError(refused), _response(200)]
+        self.assertEqual(self.client.post('https://gateway.test/pay').status_code, 200)
+
+    def test_post_is_not_resent_after_connection_reset(self):
+        aborted = ProtocolError('Connection aborted.', ConnectionResetError())
+        self.send.side_effect = requests.exceptions.ConnectionError(aborted)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.client.post('https://gateway.test/pay')
+        self.assertEqual(self.send.call_count, 1)
+
+    def test_client_errors_are_returned(self):
+        self.send.return_value = _response(401)
+        for _i in range(5):
+            self.assertEqual(self.client.get('https://gateway.test/status').status_code, 401)
+        self.assertFalse(self.client.breaker.is_open)
+
+    def test_circuit_opens_and_fails_fast(self):
+        self.send.side_effect = requests.exceptions.ConnectTimeout()
+        with self.assertRaises(requests.exceptions.ConnectTimeout):
+            self.client.get('https://gateway.test/status')
+        self.assertTrue(self.client.breaker.is_open)
+        self.send.reset_mock()
+        with self.assertRaises(CircuitOpenError):
+            self.client.get('https://gateway.test/status')
+        self.send.assert_not_called()
+        self.assertEqual(self.client.metrics.snapshot()['rejected'], 1)
+
+    def test_circuit_closes_after_successful_trial(self):
+        self.send.side_effect = requests.exceptions.ConnectTimeout()
+        with self.assertRaises(requests.exceptions.ConnectTimeout):
+            self.client.get('https://gateway.test/status')
+        self.client.breaker._opened_at -= 60
+        self.send.side_effect = None
+        self.send.return_value = _response(200)
+        self.client.get('https://gateway.test/status')
+        self.assertFalse(self.client.breaker.is_open)
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+{
+    'name': 'Log Retention',
+    'version': '1.0',
+    'category': 'Hidden/Tools',
+    'summary': 'Batched compaction and purge of integration logs',
+    'description': """
+Log Retention
+=============
+Mixin shared by the integration log models (Emalify deliveries, PesaPal IPN
+logs) to compact and delete their old rows in bounded batches, from their
+autovacuum job.
+    """,
+    'depends': ['base'],
+    'data': [],
+    'installable': True,
+    'application': False,
+    'auto_install': False,
+    'license': 'LGPL-3',
+}
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from datetime import timedelta
+
+from odoo import fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Rows compacted or deleted per statement, and statements per autovacuum run
+RETENTION_BATCH_SIZE = 1000
+RETENTION_MAX_BATCHES = 50
+
+
+class LogRetentionMixin(models.AbstractModel):
+    """Bounded compaction and purge of old log rows, by ``create_date``.
+
+    Inheriting models call these helpers from their ``@api.autovacuum``
+    method, with delays read from their own configuration parameters.
+    """
+    _name = 'log.retention.mixin'
+    _description = 'Log Retention Mixin'
+
+    def _get_retention_days(self, key, default):
+        """Return the delay in days of the ``key`` parameter, 0 when disabled"""
+        return int(self.env['ir.config_parameter'].sudo().get_param(key, default) or 0)
+
+    def _purge_logs(self, days):
+        """Delete the rows older than ``days`` days
+
+        :return: number of deleted rows
+        """
+        deleted = self._run_in_batches(f"""
+            DELETE FROM {self._table}
+             WHERE id IN (SELECT id FROM {self._table}
+                           WHERE create_date < %(cutoff)s
+                           LIMIT %(limit)s)
+        """, {'cutoff': fields.Datetime.now() - timedelta(days=days)})
+        _logger.info('Purged %s %s records older than %s days', deleted, self._name, days)
+        return deleted
+
+    def _run_in_batches(self, query, params):
+        """Execute a ``LIMIT %(limit)s`` statement until it affects less than a batch
+
+        :return: number of affected rows
+        """
+        total = 0
+        for _batch in range(RETENTION_MAX_BATCHES):
+            self.env.cr.execute(query, dict(params, limit=RETENTION_BATCH_SIZE))
+            total += self.env.cr.rowcount
+            if self.env.cr.rowcount < RETENTION_BATCH_SIZE:
+                break
+        return total
@@ -0,0 +1 @@
+from . import test_log_retention
@@ -0,0 +1,88 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests.common import TransactionCase, tagged
+
+from odoo.addons.log_retention.models import log_retention_mixin
+
+
+@tagged('post_install', '-at_install')
+class TestLogRetention(TransactionCase):
+    """Run against the log models inheriting the mixin, when their module is installed"""
+
+    def _log_models(self):
+        models = [name for name in ('sms.emalify.delivery', 'pesapal.ipn.log') if name in self.env]
+        if not models:
+            self.skipTest("No log model inherits log.retention.mixin")
+        return models
+
+    def _create_logs(self, model, count, age_days=0):
+        if model == 'sms.emalify.delivery':
+            vals = {
+                'phone_number': '254700000001',
+                'message_content': 'x' * 500,
+                'api_response': '{"success": true}',
+                'callback_data': '{"status": "delivered"}',
+            }
+        else:
+            vals = {'tracking_id': 'TRACK', 'raw_data': '{"status_code": 1}'}
+        logs = self.env[model].create([vals] * count)
+        if age_days:
+            logs.flush_recordset()
+            self.env.cr.execute(
+                f"UPDATE {logs._table} SET create_date = %s WHERE id = ANY(%s)",
+                [fields.Datetime.now() - timedelta(days=age_days), logs.ids])
+            logs.invalidate_recordset(['create_date'])
+        return logs
+
+    def test_purge_keeps_recent_rows(self):
+        for model in self._log_models():
+            with self.subTest(model=model):
+                old = self._create_logs(model, 3, age_days=400)
+                recent = self._create_logs(model, 2, age_days=100)
+                self.assertEqual(self.env[model]._purge_logs(365), 3)
+                self.assertFalse(old.exists())
+                self.assertEqual(recent.exists(), recent)
+
+    def test_purge_is_capped_per_run(self):
+        for model in self._log_models():
+            with self.subTest(model=model):
+                logs = self._create_logs(model, 10, age_days=400)
+                with patch.object(log_retention_mixin, 'RETENTION_BATCH_SIZE', 2), \
+                        patch.object(log_retention_mixin, 'RETENTION_MAX_BATCHES', 3):
+                    self.assertEqual(self.env[model]._purge_logs(365), 6)
+                    self.assertEqual(len(logs.exists()), 4)
+                    # the next run carries on, and stops on a partial batch
+                    self.assertEqual(self.env[model]._purge_logs(365), 4)
+                self.assertFalse(logs.exists())
+
+    def test_zero_disables_purge_and_compaction(self):
+        params = {
+            'sms.emalify.delivery': ('sms_emalify.log_compact_days', 'sms_emalify.log_retention_days',
+                                     '_gc_delivery_logs'),
+            'pesapal.ipn.log': ('payment_pesapal.ipn_log_compact_days', 'payment_pesapal.ipn_log_retention_days',
+                                '_gc_ipn_logs'),
+        }
+        for model in self._log_models():
+            compact_key, retention_key, gc_method = params[model]
+            with self.subTest(model=model):
+                logs = self._create_logs(model, 2, age_days=400)
+                snapshot = logs.read()
+                self.env['ir.config_parameter'].sudo().set_param(compact_key, '0')
+                self.env['ir.config_parameter'].sudo().set_param(retention_key, '0')
+                getattr(self.env[model], gc_method)()
+                self.assertEqual(logs.exists(), logs)
+                self.assertEqual(logs.read(), snapshot)
+
+                # compaction alone, the rows are kept
+                self.env['ir.config_parameter'].sudo().set_param(compact_key, '30')
+                getattr(self.env[model], gc_method)()
+                self.assertEqual(logs.exists(), logs)
+                self.assertNotEqual(logs.read(), snapshot)
+
+                # retention alone
+                self.env['ir.config_parameter'].sudo().set_param(compact_key, '0')
+                self.env['ir.config_parameter'].sudo().set_param(retention_key, '365')
+                getattr(self.env[model], gc_method)()
+                self.assertFalse(logs.exists())
@@ -13,15 +13,17 @@ Supports M-Pesa STK Push (Lipa Na M-Pesa Online) for seamless mobile payments.
 Features:
 - STK Push for instant mobile payment requests
 - Payment status checking
+- Reconciliation of pending payments whose callback was lost
 - Transaction verification
 - Support for Kenyan mobile numbers
     """,
-    'depends': ['payment'],
+    'depends': ['payment', 'phone_validation', 'integration_http_client'],
     'data': [
         'views/payment_mpesa_templates.xml',
         'views/payment_provider_views.xml',
         'data/payment_method_data.xml',
         'data/payment_provider_data.xml',
+        'data/ir_cron_data.xml',
     ],
     'assets': {
         'web.assets_frontend': [
@@ -49,30 +49,7 @@ class MpesaController(http.Controller):
             
             transaction._process_notification_data(notification_data)
             
-            appointment = request.env['custom.appointment'].sudo().search([
-                ('payment_transaction_id', '=', transaction.id)
-            ], limit=1)
-            
-            if appointment:
-                if result_code == 0:  # Success
-                    appointment.write({
-                        'payment_status': 'paid',
-                        'paid_amount': transaction.amount,
-                        'payment_date': request.env['ir.fields'].Datetime.now(),
-                        'payment_method': transaction.provider_id.name,
-                        'payment_reference': transaction.reference,
-                        'state': 'confirmed'
-                    })
-                    try:
-                        appointment._send_confirmation_notifications()
-                    except Exception as e:
-                        _logger.warning('M-Pesa: Failed to send confirmation notifications: %s', str(e))
-                else:  # Failed
-                    appointment.write({
-                        'payment_status': 'failed',
-                        'description': f'{appointment.description or ""}\n\nPayment failed: {result_desc}'.strip()
-                    })
-                    _logger.info('M-Pesa: Payment failed for appointment %s. Reason: %s', appointment.id, result_desc)
+            transaction._mpesa_update_appointments()
             
             return {'ResultCode': 0, 'ResultDesc': 'Success'}
             
@@ -91,19 +68,12 @@ class MpesaController(http.Controller):
             if not phone_number:
                 return {'error': 'Phone number is required'}
             
-            if not phone_number.startswith('254'):
-                if phone_number.startswith('0'):
-                    phone_number = '254' + phone_number[1:]
-                elif phone_number.startswith('+254'):
-                    phone_number = phone_number[1:]
-                elif phone_number.startswith('7') or phone_number.startswith('1'):
-                    phone_number = '254' + phone_number
+            transaction = request.env['payment.transaction'].sudo().browse(tx_id)
             
-            if len(phone_number) != 12:
+            phone_number = transaction._mpesa_normalize_phone_number(phone_number)
+            if not phone_number:
                 return {'error': 'Invalid phone number format. Use 254XXXXXXXXX'}
             
-            transaction = request.env['payment.transaction'].sudo().browse(tx_id)
-            
             if not transaction.exists():
                 return {'error': 'Transaction not found'}
             
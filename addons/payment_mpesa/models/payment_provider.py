@@ -1,4 +1,27 @@
+import base64
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import repeat
+
+import requests
+
 from odoo import _, api, fields, models
+from odoo.exceptions import ValidationError
+
+from odoo.addons.integration_http_client import get_client
+
+_logger = logging.getLogger(__name__)
+
+# (connect, read) timeouts of the Daraja API requests, in seconds
+TIMEOUT = (5, 30)
+
+# A cached token is renewed this long before it expires (Daraja tokens are
+# valid for an hour, as reported by ``expires_in``)
+TOKEN_EXPIRY_MARGIN = timedelta(minutes=2)
+
+# Changing any of these invalidates the cached token
+MPESA_CREDENTIAL_FIELDS = ('state', 'mpesa_consumer_key', 'mpesa_consumer_secret')
 
 
 class PaymentProvider(models.Model):
@@ -38,6 +61,17 @@ class PaymentProvider(models.Model):
         help='URL where M-Pesa will send payment notifications. Auto-computed but can be overridden manually.',
     )
 
+    mpesa_access_token = fields.Char(
+        string='Access Token',
+        copy=False,
+        groups='base.group_system',
+    )
+    mpesa_token_expiry = fields.Datetime(
+        string='Access Token Expiry',
+        copy=False,
+        groups='base.group_system',
+    )
+
     @api.depends('code')
     def _compute_mpesa_callback_url(self):
         for provider in self:
@@ -61,3 +95,160 @@ class PaymentProvider(models.Model):
             base_url = self.get_base_url()
             self.mpesa_callback_url = f'{base_url}/payment/mpesa/callback'
         return True
+
+    def write(self, vals):
+        res = super().write(vals)
+        if any(fname in vals for fname in MPESA_CREDENTIAL_FIELDS):
+            self.filtered(lambda p: p.code == 'mpesa').sudo().write({
+                'mpesa_access_token': False,
+                'mpesa_token_expiry': False,
+            })
+        return res
+
+    def _mpesa_get_access_token(self, stale_token=None):
+        """Return a valid OAuth token, requesting a new one only when the cached one expires.
+
+        The token is cached on the provider and shared by all workers. Its
+        renewal is serialized by a transaction-level advisory lock, so that
+        concurrent checkouts wait for a single renewal instead of each
+        requesting a token. The cached token is read and written in fresh
+        cursors once the lock is held: a repeatable read snapshot taken
+        before would not see the token committed by the previous holder.
+
+        :param stale_token: a token the API just rejected, renewed even if
+                            it has not expired yet
+        """
+        self.ensure_one()
+        provider = self.sudo()
+        now = fields.Datetime.now()
+        if (provider.mpesa_access_token and provider.mpesa_access_token != stale_token
+                and provider.mpesa_token_expiry and provider.mpesa_token_expiry > now):
+            return provider.mpesa_access_token
+
+        with self.env.registry.cursor() as lock_cr:
+            lock_cr.execute("SELECT pg_advisory_xact_lock(hashtext(%s), %s)", ['payment_mpesa.token', self.id])
+            with self.env.registry.cursor() as cr:
+                cr.execute("""
+                    SELECT mpesa_access_token, mpesa_token_expiry
+                      FROM payment_provider
+                     WHERE id = %s
+                """, [self.id])
+                token, expiry = cr.fetchone()
+            if token and token != stale_token and expiry and expiry > now:
+                # Renewed by another worker in the meantime
+                return token
+
+            try:
+                response = self._mpesa_get_client().get(
+                    f'{self._mpesa_get_api_url()}/oauth/v1/generate',
+                    params={'grant_type': 'client_credentials'},
+                    auth=(provider.mpesa_consumer_key, provider.mpesa_consumer_secret),
+                    timeout=(5, 10),
+                )
+                response.raise_for_status()
+                data = response.json()
+                token = data['access_token']
+                expires_in = int(data.get('expires_in') or 3599)
+            except Exception as e:
+                _logger.error("M-Pesa: Failed to get access token: %s", str(e))
+                raise ValidationError(_("Failed to authenticate with M-Pesa. Please check your credentials."))
+            with self.env.registry.cursor() as cr:
+                cr.execute("""
+                    UPDATE payment_provider
+                       SET mpesa_access_token = %s, mpesa_token_expiry = %s
+                     WHERE id = %s
+                """, [token, fields.Datetime.now() + timedelta(seconds=expires_in) - TOKEN_EXPIRY_MARGIN, self.id])
+        return token
+
+    def _mpesa_make_request(self, endpoint, payload):
+        """POST to the Daraja API with the cached token, renewing it once if rejected
+
+        :return: the decoded JSON response
+        :raises requests.exceptions.RequestException: if the request fails
+        """
+        self.ensure_one()
+        token = self._mpesa_get_access_token()
+        response = self._mpesa_send_request(endpoint, payload, token)
+        if response.status_code == 401:
+            _logger.info("M-Pesa: access token rejected, renewing it")
+            response = self._mpesa_send_request(
+                endpoint, payload, self._mpesa_get_access_token(stale_token=token))
+        response.raise_for_status()
+        return response.json()
+
+    def _mpesa_get_client(self):
+        """Return the shared HTTP client of the Daraja API"""
+        return get_client('mpesa', timeout=TIMEOUT)
+
+    def _mpesa_send_request(self, endpoint, payload, token, retry=False):
+        """POST to the Daraja API; the request is only sent again on failure with ``retry``"""
+        return self._mpesa_get_client().post(
+            f'{self._mpesa_get_api_url()}{endpoint}',
+            json=payload,
+            headers={
+                'Authorization': f'Bearer {token}',
+                'Content-Type': 'application/json',
+            },
+            retry=retry,
+        )
+
+    def _mpesa_get_password(self, timestamp):
+        """Password of the Lipa Na M-Pesa Online requests sent at ``timestamp``"""
+        self.ensure_one()
+        provider = self.sudo()
+        password_string = f"{provider.mpesa_shortcode}{provider.mpesa_passkey}{timestamp}"
+        return base64.b64encode(password_string.encode('utf-8')).decode('utf-8')
+
+    def _mpesa_query_stk_status(self, checkout_request_ids, max_workers=8):
+        """Query the status of STK pushes concurrently through the STK Query API.
+
+        The requests go through the shared client and use one token; only HTTP
+        runs in the worker threads. Queries are read-only, hence retried on
+        failure. Requests rejected with a 401 are retried once
+        with a renewed token.
+
+        :return: dict ``{checkout_request_id: response}``; requests that could
+                 not be sent or decoded are left out
+        """
+        self.ensure_one()
+        if not checkout_request_ids:
+            return {}
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        base_payload = {
+            'BusinessShortCode': self.mpesa_shortcode,
+            'Password': self._mpesa_get_password(timestamp),
+            'Timestamp': timestamp,
+        }
+        client = self._mpesa_get_client()
+        url = f'{self._mpesa_get_api_url()}/mpesa/stkpushquery/v1/query'
+
+        def query(checkout_request_id, headers):
+            try:
+                response = client.post(
+                    url, json=dict(base_payload, CheckoutRequestID=checkout_request_id),
+                    headers=headers, retry=True)
+                return checkout_request_id, response.status_code, response.json()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                _logger.warning("M-Pesa: STK Query for %s failed: %s", checkout_request_id, e)
+                return checkout_request_id, None, None
+
+        results = {}
+        pending = list(checkout_request_ids)
+        token = self._mpesa_get_access_token()
+        for _attempt in range(2):
+            headers = {
+                'Authorization': f'Bearer {token}',
+                'Content-Type': 'application/json',
+            }
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as executor:
+                responses = list(executor.map(query, pending, repeat(headers)))
+            results.update({
+                checkout_request_id: data
+                for checkout_request_id, status, data in responses
+                if data is not None and status != 401
+            })
+            pending = [checkout_request_id for checkout_request_id, status, _data in responses if status == 401]
+            if not pending:
+                break
+            token = self._mpesa_get_access_token(stale_token=token)
+        return results
@@ -1,13 +1,17 @@
 import logging
-import requests
-import base64
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from odoo import _, api, fields, models
-from odoo.exceptions import ValidationError
 
 _logger = logging.getLogger(__name__)
 
+# Pending STK pushes queried per reconciliation run. Only pushes older than
+# ``payment_mpesa.reconcile_min_age_seconds`` (their callback is late) and
+# younger than RECONCILE_MAX_AGE (Daraja still knows them) are queried.
+RECONCILE_BATCH_SIZE = 100
+RECONCILE_MIN_AGE_SECONDS = 120
+RECONCILE_MAX_AGE = timedelta(days=1)
+
 
 class PaymentTransaction(models.Model):
     _inherit = 'payment.transaction'
@@ -20,6 +24,12 @@ class PaymentTransaction(models.Model):
         string='M-Pesa Phone Number',
         help='Phone number used for M-Pesa payment',
     )
+    mpesa_last_query_date = fields.Datetime(
+        string='M-Pesa Last Status Query',
+        readonly=True,
+        copy=False,
+        help='Last time the status of the STK push was queried by the reconciliation job',
+    )
 
     def _get_specific_rendering_values(self, processing_values):
         res = super()._get_specific_rendering_values(processing_values)
@@ -32,41 +42,24 @@ class PaymentTransaction(models.Model):
         }
         return rendering_values
 
+    @api.model
+    def _mpesa_normalize_phone_number(self, phone_number):
+        """Return the number in the 254XXXXXXXXX format expected by M-Pesa, or None if invalid"""
+        e164 = self._phone_format(
+            number=phone_number, country=self.env.ref('base.ke'), force_format='E164')
+        if not e164 or not e164.startswith('+254'):
+            return None
+        return e164[1:]
+
     def _mpesa_get_access_token(self):
         self.ensure_one()
-        provider = self.provider_id
-        api_url = provider._mpesa_get_api_url()
-        
-        auth_string = f"{provider.mpesa_consumer_key}:{provider.mpesa_consumer_secret}"
-        auth_bytes = base64.b64encode(auth_string.encode('utf-8'))
-        
-        headers = {
-            'Authorization': f'Basic {auth_bytes.decode("utf-8")}',
-            'Content-Type': 'application/json',
-        }
-        
-        try:
-            response = requests.get(
-                f'{api_url}/oauth/v1/generate?grant_type=client_credentials',
-                headers=headers,
-                timeout=10
-            )
-            response.raise_for_status()
-            return response.json().get('access_token')
-        except Exception as e:
-            _logger.error("M-Pesa: Failed to get access token: %s", str(e))
-            raise ValidationError(_("Failed to authenticate with M-Pesa. Please check your credentials."))
+        return self.provider_id._mpesa_get_access_token()
 
     def _mpesa_initiate_stk_push(self, phone_number):
         self.ensure_one()
         provider = self.provider_id
-        api_url = provider._mpesa_get_api_url()
-        
-        access_token = self._mpesa_get_access_token()
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        
-        password_string = f"{provider.mpesa_shortcode}{provider.mpesa_passkey}{timestamp}"
-        password = base64.b64encode(password_string.encode('utf-8')).decode('utf-8')
+        password = provider._mpesa_get_password(timestamp)
         
         callback_url = provider.mpesa_callback_url
         
@@ -84,20 +77,8 @@ class PaymentTransaction(models.Model):
             'TransactionDesc': f'Payment for {self.reference}',
         }
         
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json',
-        }
-        
         try:
-            response = requests.post(
-                f'{api_url}/mpesa/stkpush/v1/processrequest',
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
-            response.raise_for_status()
-            result = response.json()
+            result = provider._mpesa_make_request('/mpesa/stkpush/v1/processrequest', payload)
             
             if result.get('ResponseCode') == '0':
                 self.mpesa_checkout_request_id = result.get('CheckoutRequestID')
@@ -123,3 +104,95 @@ class PaymentTransaction(models.Model):
             self._set_canceled(
                 state_message=notification_data.get('ResultDesc', 'Payment canceled or failed')
             )
+
+    def _mpesa_update_appointments(self):
+        """Reflect the final state of the transactions on their appointments, if any.
+
+        Paid draft appointments are confirmed together, in a single outbox
+        insert. If that fails, each one is confirmed in its own savepoint, so
+        that an appointment which cannot be confirmed (its slot was rebooked
+        after the hold expired) does not roll back the others. Those, and the
+        appointments paid after being cancelled, are flagged for review; failed
+        payments are flagged on the appointment.
+        """
+        if 'custom.appointment' not in self.env:
+            return
+        appointments = self.env['custom.appointment'].sudo().search([
+            ('payment_transaction_id', 'in', self.ids),
+        ])
+        to_confirm = appointments.browse()
+        to_review = appointments.browse()
+        for appointment in appointments:
+            transaction = appointment.payment_transaction_id
+            if (transaction.state == 'done' and appointment.payment_status != 'paid'
+                    and appointment.state in ('draft', 'cancelled')):
+                appointment.write({
+                    'payment_status': 'paid',
+                    'paid_amount': transaction.amount,
+                    'payment_date': fields.Datetime.now(),
+                    'payment_method': transaction.provider_id.name,
+                    'payment_reference': transaction.reference,
+                })
+                if appointment.state == 'draft':
+                    to_confirm |= appointment
+                else:
+                    to_review |= appointment
+            elif transaction.state in ('cancel', 'error') and appointment.payment_status != 'failed':
+                appointment.write({
+                    'payment_status': 'failed',
+                    'description': f'{appointment.description or ""}\n\nPayment failed: {transaction.state_message or ""}'.strip()
+                })
+                _logger.info('M-Pesa: Payment failed for appointment %s. Reason: %s',
+                             appointment.id, transaction.state_message)
+
+        if to_review:
+            to_review._flag_payment_for_review(_('the appointment was already cancelled'))
+        if to_confirm:
+            try:
+                with self.env.cr.savepoint():
+                    to_confirm.action_confirm()
+            except Exception:
+                for appointment in to_confirm:
+                    try:
+                        with self.env.cr.savepoint():
+                            appointment.action_confirm()
+                    except Exception as e:
+                        _logger.warning('M-Pesa: Failed to confirm appointment %s: %s', appointment.id, str(e))
+                        appointment._flag_payment_for_review(str(e))
+
+    @api.model
+    def _cron_mpesa_reconcile_pending(self):
+        """Scheduled method querying Daraja for the pending STK pushes whose callback was lost"""
+        now = fields.Datetime.now()
+        min_age = int(self.env['ir.config_parameter'].sudo().get_param(
+            'payment_mpesa.reconcile_min_age_seconds', RECONCILE_MIN_AGE_SECONDS))
+        transactions = self.search([
+            ('provider_code', '=', 'mpesa'),
+            ('state', 'in', ('draft', 'pending')),
+            ('mpesa_checkout_request_id', '!=', False),
+            ('create_date', '<', now - timedelta(seconds=min_age)),
+            ('create_date', '>', now - RECONCILE_MAX_AGE),
+        ], order='mpesa_last_query_date ASC NULLS FIRST, id', limit=RECONCILE_BATCH_SIZE)
+        if not transactions:
+            return
+        transactions.write({'mpesa_last_query_date': now})
+
+        processed = self.browse()
+        for provider in transactions.provider_id:
+            provider_transactions = transactions.filtered(lambda tx: tx.provider_id == provider)
+            results = provider._mpesa_query_stk_status(provider_transactions.mapped('mpesa_checkout_request_id'))
+            for transaction in provider_transactions:
+                result = results.get(transaction.mpesa_checkout_request_id) or {}
+                try:
+                    result_code = int(result['ResultCode'])
+                except (KeyError, TypeError, ValueError):
+                    # Still being processed, or the query failed
+                    continue
+                transaction._process_notification_data({
+                    'ResultCode': result_code,
+                    'ResultDesc': result.get('ResultDesc'),
+                    'reference': transaction.reference,
+                })
+                processed |= transaction
+        processed._mpesa_update_appointments()
+        _logger.info('M-Pesa: reconciled %s of %s pending transactions', len(processed), len(transactions))
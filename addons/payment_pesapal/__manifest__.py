@@ -15,15 +15,17 @@ Features:
 - Multiple payment methods (Cards, Mobile Money, etc.)
 - IPN (Instant Payment Notification) support
 - Transaction verification
+- Reconciliation of pending payments whose IPN was missed
 - Support for multiple African countries
     """,
-    'depends': ['payment'],
+    'depends': ['payment', 'integration_http_client', 'log_retention'],
     'data': [
         'security/ir.model.access.csv',
         'views/payment_pesapal_templates.xml',
         'views/payment_provider_views.xml',
         'data/payment_method_data.xml',
         'data/payment_provider_data.xml',
+        'data/ir_cron_data.xml',
     ],
     'assets': {
         'web.assets_frontend': [
@@ -1,5 +1,4 @@
 import logging
-import requests
 from odoo import http, fields
 from odoo.http import request
 
@@ -185,36 +184,11 @@ class PesaPalController(http.Controller):
 
     def _get_transaction_status(self, provider, tracking_id):
         """Get transaction status from PesaPal API"""
-        api_url = provider._pesapal_get_api_url()
-        auth_url = f'{api_url}/api/Auth/RequestToken'
-        
-        payload = {
-            'consumer_key': provider.pesapal_consumer_key,
-            'consumer_secret': provider.pesapal_consumer_secret
-        }
-        
         try:
-            response = requests.post(auth_url, json=payload, headers={'Content-Type': 'application/json'})
-            response.raise_for_status()
-            token = response.json().get('token')
-            
-            if not token:
-                _logger.error('PesaPal: Failed to get auth token')
-                return None
-            
-            status_url = f'{api_url}/api/Transactions/GetTransactionStatus?orderTrackingId={tracking_id}'
-            headers = {
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.get(status_url, headers=headers)
-            response.raise_for_status()
-            status_data = response.json()
-            
+            status_data = provider._pesapal_make_request(
+                'GET', '/api/Transactions/GetTransactionStatus', params={'orderTrackingId': tracking_id})
             _logger.info('PesaPal: Transaction status for %s: %s', tracking_id, status_data)
             return status_data
-            
         except Exception as e:
             _logger.error('PesaPal: Failed to get transaction status: %s', str(e))
             return None
@@ -1,4 +1,27 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import repeat
+
+import requests
+
 from odoo import _, api, fields, models
+from odoo.exceptions import ValidationError
+
+from odoo.addons.integration_http_client import get_client
+
+_logger = logging.getLogger(__name__)
+
+# (connect, read) timeouts of the PesaPal API requests, in seconds
+TIMEOUT = (5, 15)
+
+# PesaPal tokens are valid for 5 minutes; a cached token is renewed this
+# long before it expires
+TOKEN_LIFETIME = timedelta(minutes=5)
+TOKEN_EXPIRY_MARGIN = timedelta(seconds=30)
+
+# Changing any of these invalidates the cached token and IPN registration
+PESAPAL_CREDENTIAL_FIELDS = ('state', 'pesapal_consumer_key', 'pesapal_consumer_secret', 'pesapal_ipn_url')
 
 
 class PaymentProvider(models.Model):
@@ -31,6 +54,22 @@ class PaymentProvider(models.Model):
         compute='_compute_pesapal_api_url',
         help='PesaPal API endpoint (Production or Sandbox)',
     )
+    pesapal_access_token = fields.Char(
+        string='Access Token',
+        copy=False,
+        groups='base.group_system',
+    )
+    pesapal_token_expiry = fields.Datetime(
+        string='Access Token Expiry',
+        copy=False,
+        groups='base.group_system',
+    )
+    pesapal_ipn_id = fields.Char(
+        string='IPN ID',
+        copy=False,
+        readonly=True,
+        help='Identifier of the IPN URL registered with PesaPal, reused for every order',
+    )
 
     @api.depends('code')
     def _compute_pesapal_ipn_url(self):
@@ -67,3 +106,175 @@ class PaymentProvider(models.Model):
             return 'https://pay.pesapal.com/v3'
         else:
             return 'https://cybqa.pesapal.com/pesapalv3'
+
+    def write(self, vals):
+        res = super().write(vals)
+        if any(fname in vals for fname in PESAPAL_CREDENTIAL_FIELDS):
+            self.filtered(lambda p: p.code == 'pesapal').sudo().write({
+                'pesapal_access_token': False,
+                'pesapal_token_expiry': False,
+                'pesapal_ipn_id': False,
+            })
+        return res
+
+    def _pesapal_get_access_token(self, stale_token=None):
+        """Return a valid bearer token, requesting a new one only when the cached one expires.
+
+        The token is cached on the provider and shared by all workers. Its
+        renewal is serialized by a transaction-level advisory lock, so that
+        concurrent requests wait for a single renewal instead of each
+        requesting a token. The cached token is read and written in fresh
+        cursors once the lock is held: a repeatable read snapshot taken
+        before would not see the token committed by the previous holder.
+
+        :param stale_token: a token the API just rejected, renewed even if
+                            it has not expired yet
+        """
+        self.ensure_one()
+        provider = self.sudo()
+        now = fields.Datetime.now()
+        if (provider.pesapal_access_token and provider.pesapal_access_token != stale_token
+                and provider.pesapal_token_expiry and provider.pesapal_token_expiry > now):
+            return provider.pesapal_access_token
+
+        with self.env.registry.cursor() as lock_cr:
+            lock_cr.execute("SELECT pg_advisory_xact_lock(hashtext(%s), %s)", ['payment_pesapal.token', self.id])
+            with self.env.registry.cursor() as cr:
+                cr.execute("""
+                    SELECT pesapal_access_token, pesapal_token_expiry
+                      FROM payment_provider
+                     WHERE id = %s
+                """, [self.id])
+                token, expiry = cr.fetchone()
+            if token and token != stale_token and expiry and expiry > now:
+                # Renewed by another worker in the meantime
+                return token
+
+            try:
+                response = self._pesapal_send_request('POST', '/api/Auth/RequestToken', retry=True, json={
+                    'consumer_key': provider.pesapal_consumer_key,
+                    'consumer_secret': provider.pesapal_consumer_secret,
+                })
+            except requests.exceptions.HTTPError as e:
+                response = {'error': str(e)}
+            token = response.get('token')
+            if not token:
+                _logger.error('PesaPal authentication failed: %s', response.get('error') or response)
+                raise ValidationError(_('Failed to authenticate with PesaPal. Please check your credentials.'))
+            with self.env.registry.cursor() as cr:
+                cr.execute("""
+                    UPDATE payment_provider
+                       SET pesapal_access_token = %s, pesapal_token_expiry = %s
+                     WHERE id = %s
+                """, [token, fields.Datetime.now() + TOKEN_LIFETIME - TOKEN_EXPIRY_MARGIN, self.id])
+        return token
+
+    def _pesapal_get_ipn_id(self):
+        """Return the ID of the registered IPN URL, registering it on first use"""
+        self.ensure_one()
+        if self.pesapal_ipn_id:
+            return self.pesapal_ipn_id
+        try:
+            ipn_id = self._pesapal_make_request('POST', '/api/URLSetup/RegisterIPN', json={
+                'url': self.pesapal_ipn_url,
+                'ipn_notification_type': 'GET',
+            }).get('ipn_id')
+        except ValidationError as e:
+            _logger.warning('PesaPal IPN registration failed: %s', e)
+            return None
+        if ipn_id:
+            # Stored outside of the current transaction, like the token, so
+            # that concurrent checkouts do not conflict on the provider row
+            with self.env.registry.cursor() as cr:
+                cr.execute("UPDATE payment_provider SET pesapal_ipn_id = %s WHERE id = %s", [ipn_id, self.id])
+        return ipn_id
+
+    def _pesapal_make_request(self, method, endpoint, **kwargs):
+        """Call the PesaPal API with the cached token, renewing it once if rejected
+
+        :return: the decoded JSON response
+        :raises ValidationError: if the request fails
+        """
+        self.ensure_one()
+        token = self._pesapal_get_access_token()
+        try:
+            return self._pesapal_send_request(method, endpoint, token=token, **kwargs)
+        except requests.exceptions.HTTPError as e:
+            if e.response is None or e.response.status_code != 401:
+                raise ValidationError(_('PesaPal: Could not reach the API: %s', e)) from e
+        _logger.info('PesaPal: access token rejected, renewing it')
+        token = self._pesapal_get_access_token(stale_token=token)
+        try:
+            return self._pesapal_send_request(method, endpoint, token=token, **kwargs)
+        except requests.exceptions.HTTPError as e:
+            raise ValidationError(_('PesaPal: Could not reach the API: %s', e)) from e
+
+    def _pesapal_get_client(self):
+        """Return the shared HTTP client of the PesaPal API"""
+        return get_client('pesapal', timeout=TIMEOUT)
+
+    def _pesapal_send_request(self, method, endpoint, token=None, **kwargs):
+        """Send a single request to the PesaPal API
+
+        Only idempotent requests are retried on failure, unless ``retry=True``
+        is passed.
+
+        :raises requests.exceptions.HTTPError: on an HTTP error status
+        :raises ValidationError: on connection errors and invalid responses
+        """
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        try:
+            response = self._pesapal_get_client().request(
+                method, f'{self._pesapal_get_api_url()}{endpoint}', headers=headers, **kwargs)
+        except requests.exceptions.RequestException as e:
+            _logger.error('PesaPal: request to %s failed: %s', endpoint, e)
+            raise ValidationError(_('PesaPal: Could not establish the connection to the API.')) from e
+        response.raise_for_status()
+        try:
+            return response.json()
+        except ValueError as e:
+            raise ValidationError(_('PesaPal: Invalid response from the API.')) from e
+
+    def _pesapal_get_transaction_statuses(self, tracking_ids, max_workers=8):
+        """Fetch the status of several orders concurrently.
+
+        The requests go through the shared client and use the cached token;
+        only HTTP runs in the worker threads. Requests rejected with a 401 are retried
+        once with a renewed token.
+
+        :return: dict ``{tracking_id: status}``; requests that failed are left out
+        """
+        self.ensure_one()
+        if not tracking_ids:
+            return {}
+        client = self._pesapal_get_client()
+        url = f'{self._pesapal_get_api_url()}/api/Transactions/GetTransactionStatus'
+
+        def query(tracking_id, headers):
+            try:
+                response = client.get(url, params={'orderTrackingId': tracking_id}, headers=headers)
+                if response.status_code == 401:
+                    return tracking_id, 401, None
+                response.raise_for_status()
+                return tracking_id, response.status_code, response.json()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                _logger.warning('PesaPal: Failed to get transaction status of %s: %s', tracking_id, e)
+                return tracking_id, None, None
+
+        results = {}
+        pending = list(tracking_ids)
+        token = self._pesapal_get_access_token()
+        for _attempt in range(2):
+            headers = {'Accept': 'application/json', 'Authorization': f'Bearer {token}'}
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as executor:
+                responses = list(executor.map(query, pending, repeat(headers)))
+            results.update({
+                tracking_id: data for tracking_id, _status, data in responses if data is not None
+            })
+            pending = [tracking_id for tracking_id, status, _data in responses if status == 401]
+            if not pending:
+                break
+            token = self._pesapal_get_access_token(stale_token=token)
+        return results
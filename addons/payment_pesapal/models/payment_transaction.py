@@ -1,13 +1,22 @@
 import logging
-import requests
-import base64
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from odoo import _, api, fields, models
 from odoo.exceptions import ValidationError
 
 _logger = logging.getLogger(__name__)
 
+# Pending orders reconciled per run. Only orders older than
+# ``payment_pesapal.reconcile_min_age_minutes`` (their IPN is late) and younger
+# than RECONCILE_MAX_AGE are queried.
+RECONCILE_BATCH_SIZE = 100
+RECONCILE_MIN_AGE_MINUTES = 10
+RECONCILE_MAX_AGE = timedelta(days=3)
+
+# PesaPal status codes after which an order no longer changes:
+# 1 completed, 2 failed, 3 reversed
+FINAL_STATUS_CODES = (1, 2, 3)
+
 
 class PaymentTransaction(models.Model):
     _inherit = 'payment.transaction'
@@ -20,6 +29,12 @@ class PaymentTransaction(models.Model):
         string='PesaPal Merchant Reference',
         help='Merchant reference for the transaction'
     )
+    pesapal_last_query_date = fields.Datetime(
+        string='PesaPal Last Status Query',
+        readonly=True,
+        copy=False,
+        help='Last time the status of the order was queried by the reconciliation job'
+    )
 
     def _get_specific_rendering_values(self, processing_values):
         """Override to add PesaPal-specific rendering values"""
@@ -27,13 +42,9 @@ class PaymentTransaction(models.Model):
         if self.provider_code != 'pesapal':
             return res
 
-        token = self._pesapal_get_auth_token()
-        if not token:
-            raise ValidationError(_('Failed to authenticate with PesaPal. Please check your credentials.'))
-
-        ipn_id = self._pesapal_register_ipn(token)
+        ipn_id = self.provider_id._pesapal_get_ipn_id()
         
-        order_data = self._pesapal_submit_order(token, ipn_id, processing_values)
+        order_data = self._pesapal_submit_order(ipn_id, processing_values)
         
         if order_data and order_data.get('redirect_url'):
             self.pesapal_order_tracking_id = order_data.get('order_tracking_id')
@@ -47,53 +58,9 @@ class PaymentTransaction(models.Model):
 
         return res
 
-    def _pesapal_get_auth_token(self):
-        """Get authentication token from PesaPal"""
-        api_url = self.provider_id._pesapal_get_api_url()
-        auth_url = f'{api_url}/api/Auth/RequestToken'
-        
-        payload = {
-            'consumer_key': self.provider_id.pesapal_consumer_key,
-            'consumer_secret': self.provider_id.pesapal_consumer_secret
-        }
-        
-        try:
-            response = requests.post(auth_url, json=payload, headers={'Content-Type': 'application/json'})
-            response.raise_for_status()
-            data = response.json()
-            return data.get('token')
-        except Exception as e:
-            _logger.error('PesaPal authentication failed: %s', str(e))
-            return None
-
-    def _pesapal_register_ipn(self, token):
-        """Register IPN URL with PesaPal"""
-        api_url = self.provider_id._pesapal_get_api_url()
-        ipn_url = f'{api_url}/api/URLSetup/RegisterIPN'
-        
-        payload = {
-            'url': self.provider_id.pesapal_ipn_url,
-            'ipn_notification_type': 'GET'
-        }
-        
-        headers = {
-            'Authorization': f'Bearer {token}',
-            'Content-Type': 'application/json'
-        }
-        
-        try:
-            response = requests.post(ipn_url, json=payload, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            return data.get('ipn_id')
-        except Exception as e:
-            _logger.warning('PesaPal IPN registration failed: %s', str(e))
-            return None
-
-    def _pesapal_submit_order(self, token, ipn_id, processing_values):
+    def _pesapal_submit_order(self, ipn_id, processing_values):
         """Submit order to PesaPal for payment"""
         api_url = self.provider_id._pesapal_get_api_url()
-        submit_url = f'{api_url}/api/Transactions/SubmitOrderRequest'
         
         merchant_ref = f'ODOO-{self.id}-{int(datetime.now().timestamp())}'
         
@@ -120,15 +87,9 @@ class PaymentTransaction(models.Model):
             }
         }
         
-        headers = {
-            'Authorization': f'Bearer {token}',
-            'Content-Type': 'application/json'
-        }
-        
         try:
-            response = requests.post(submit_url, json=payload, headers=headers)
-            response.raise_for_status()
-            data = response.json()
+            data = self.provider_id._pesapal_make_request(
+                'POST', '/api/Transactions/SubmitOrderRequest', json=payload)
             
             _logger.info('PesaPal order submitted: %s', data)
             
@@ -181,3 +142,106 @@ class PaymentTransaction(models.Model):
             self._set_canceled()
         else:  # Pending or unknown
             self._set_pending()
+
+    def _pesapal_update_appointments(self):
+        """Reflect the final state of the transactions on their appointments, if any.
+
+        Paid draft appointments are confirmed together, in a single outbox
+        insert. If that fails, each one is confirmed in its own savepoint, so
+        that an appointment which cannot be confirmed (its slot was rebooked
+        after the hold expired) does not roll back the others. Those, and the
+        appointments paid after being cancelled, are flagged for review.
+
+        :return: dict ``{transaction_id: appointment}``
+        """
+        if 'custom.appointment' not in self.env:
+            return {}
+        appointments = self.env['custom.appointment'].sudo().search([
+            ('payment_transaction_id', 'in', self.ids),
+        ])
+        to_confirm = appointments.browse()
+        to_review = appointments.browse()
+        for appointment in appointments:
+            tx = appointment.payment_transaction_id
+            if tx.state == 'done' and appointment.state in ('draft', 'cancelled') and appointment.payment_status != 'paid':
+                appointment.write({
+                    'payment_status': 'paid',
+                    'paid_amount': tx.amount,
+                    'payment_date': fields.Datetime.now(),
+                    'payment_method': tx.provider_id.name,
+                    'payment_reference': tx.reference,
+                })
+                if appointment.state == 'draft':
+                    to_confirm |= appointment
+                else:
+                    to_review |= appointment
+            elif tx.state in ('cancel', 'error') and appointment.payment_status != 'paid':
+                appointment.write({'payment_status': 'failed'})
+
+        if to_review:
+            to_review._flag_payment_for_review(_('the appointment was already cancelled'))
+        if to_confirm:
+            try:
+                with self.env.cr.savepoint():
+                    to_confirm.action_confirm()
+            except Exception:
+                for appointment in to_confirm:
+                    try:
+                        with self.env.cr.savepoint():
+                            appointment.action_confirm()
+                    except Exception as e:
+                        _logger.warning('PesaPal: Failed to confirm appointment %s: %s', appointment.id, str(e))
+                        appointment._flag_payment_for_review(str(e))
+        return {appointment.payment_transaction_id.id: appointment for appointment in appointments}
+
+    @api.model
+    def _cron_pesapal_reconcile_pending(self):
+        """Scheduled method fetching the status of the pending PesaPal orders whose IPN was missed"""
+        now = fields.Datetime.now()
+        min_age = int(self.env['ir.config_parameter'].sudo().get_param(
+            'payment_pesapal.reconcile_min_age_minutes', RECONCILE_MIN_AGE_MINUTES))
+        transactions = self.search([
+            ('provider_code', '=', 'pesapal'),
+            ('state', 'in', ('draft', 'pending')),
+            ('pesapal_order_tracking_id', '!=', False),
+            ('create_date', '<', now - timedelta(minutes=min_age)),
+            ('create_date', '>', now - RECONCILE_MAX_AGE),
+        ], order='pesapal_last_query_date ASC NULLS FIRST, id', limit=RECONCILE_BATCH_SIZE)
+        if not transactions:
+            return
+        transactions.write({'pesapal_last_query_date': now})
+
+        processed = self.browse()
+        statuses = {}
+        for provider in transactions.provider_id:
+            provider_transactions = transactions.filtered(lambda tx: tx.provider_id == provider)
+            results = provider._pesapal_get_transaction_statuses(
+                provider_transactions.mapped('pesapal_order_tracking_id'))
+            for tx in provider_transactions:
+                status = results.get(tx.pesapal_order_tracking_id)
+                if not status or status.get('status_code') not in FINAL_STATUS_CODES:
+                    continue
+                tx._process_notification_data({
+                    'OrderTrackingId': tx.pesapal_order_tracking_id,
+                    'OrderMerchantReference': status.get('merchant_reference'),
+                    'status_code': status['status_code'],
+                    'status_description': status.get('payment_status_description'),
+                })
+                processed |= tx
+                statuses[tx.id] = status
+        if not processed:
+            return
+
+        appointments = processed._pesapal_update_appointments()
+        self.env['pesapal.ipn.log'].sudo().create([{
+            'tracking_id': tx.pesapal_order_tracking_id,
+            'merchant_reference': statuses[tx.id].get('merchant_reference'),
+            'status_code': statuses[tx.id]['status_code'],
+            'status_description': statuses[tx.id].get('payment_status_description'),
+            'transaction_id': tx.id,
+            'appointment_id': appointments[tx.id].id if tx.id in appointments else False,
+            'processed': True,
+            'processed_date': now,
+            'raw_data': str(statuses[tx.id]),
+        } for tx in processed])
+        _logger.info('PesaPal: reconciled %s of %s pending transactions', len(processed), len(transactions))
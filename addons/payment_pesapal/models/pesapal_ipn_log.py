@@ -1,11 +1,19 @@
 import logging
-from odoo import api, fields, models
+from datetime import timedelta
+
+from odoo import api, fields, models, tools
 
 _logger = logging.getLogger(__name__)
 
+# Defaults of the ``payment_pesapal.ipn_log_compact_days`` and
+# ``payment_pesapal.ipn_log_retention_days`` parameters (0 disables the step)
+DEFAULT_COMPACT_DAYS = 30
+DEFAULT_RETENTION_DAYS = 365
+
 
 class PesaPalIPNLog(models.Model):
     _name = 'pesapal.ipn.log'
+    _inherit = ['log.retention.mixin']
     _description = 'PesaPal IPN Notification Log'
     _order = 'create_date desc'
     _rec_name = 'tracking_id'
@@ -64,6 +72,9 @@ class PesaPalIPNLog(models.Model):
          'An IPN log with this tracking ID and timestamp already exists!')
     ]
 
+    def init(self):
+        tools.create_index(self._cr, 'pesapal_ipn_log_create_date_index', self._table, ['create_date'])
+
     @api.model
     def log_ipn(self, tracking_id, merchant_ref, status_code, status_description, raw_data=None):
         """Log an IPN notification"""
@@ -89,3 +100,31 @@ class PesaPalIPNLog(models.Model):
         if error:
             vals['error_message'] = error
         self.write(vals)
+
+    @api.autovacuum
+    def _gc_ipn_logs(self):
+        """Compact and purge old IPN logs, in bounded batches.
+
+        The raw payload is dropped after ``payment_pesapal.ipn_log_compact_days``
+        (the parsed status stays on the log), and the logs are deleted after
+        ``payment_pesapal.ipn_log_retention_days``.
+        """
+        compact_days = self._get_retention_days('payment_pesapal.ipn_log_compact_days', DEFAULT_COMPACT_DAYS)
+        retention_days = self._get_retention_days('payment_pesapal.ipn_log_retention_days', DEFAULT_RETENTION_DAYS)
+        self.flush_model()
+
+        if retention_days > 0:
+            self._purge_logs(retention_days)
+
+        if compact_days > 0:
+            compacted = self._run_in_batches("""
+                UPDATE pesapal_ipn_log
+                   SET raw_data = NULL
+                 WHERE id IN (SELECT id FROM pesapal_ipn_log
+                               WHERE create_date < %(cutoff)s
+                                 AND raw_data IS NOT NULL
+                               LIMIT %(limit)s)
+            """, {'cutoff': fields.Datetime.now() - timedelta(days=compact_days)})
+            _logger.info('Compacted %s PesaPal IPN logs older than %s days', compacted, compact_days)
+
+        self.invalidate_model()
@@ -13,6 +13,7 @@ This module integrates Emalify SMS API with Odoo's SMS infrastructure.
 Features:
 - Custom SMS provider using Emalify API
 - System-wide integration (Sales, POS, Marketing, Appointments)
+- Queued or immediate sending, with concurrent API requests
 - Delivery status tracking via callbacks
 - Configuration interface in Settings
 - Test SMS wizard for verification
@@ -21,10 +22,11 @@ Features:
 Configuration:
 Go to Settings → General Settings → Emalify SMS to configure your API credentials.
     """,
-    'depends': ['sms', 'iap', 'base'],
+    'depends': ['sms', 'iap', 'base', 'integration_http_client', 'log_retention'],
     'data': [
         'security/ir.model.access.csv',
         'data/sms_provider_data.xml',
+        'data/ir_cron_data.xml',
         'views/res_config_settings_views.xml',
         'views/sms_emalify_delivery_views.xml',
         'wizard/sms_test_wizard_views.xml',
@@ -7,126 +7,56 @@ from odoo.http import request
 
 _logger = logging.getLogger(__name__)
 
+# Receipts accepted per callback request; larger batches are rejected whole
+MAX_RECEIPTS_PER_REQUEST = 1000
+
 
 class EmalifyController(http.Controller):
     
-    @http.route('/sms/emalify/callback', type='json', auth='public', methods=['POST'], csrf=False)
+    @http.route('/sms/emalify/callback', type='http', auth='public', methods=['POST'], csrf=False)
     def emalify_callback(self, **kwargs):
         """
-        Webhook endpoint to receive delivery status updates from Emalify.
+        Webhook endpoint receiving delivery status updates from Emalify.
         
-        Expected callback format (adjust based on actual Emalify callback structure):
-        {
-            "message_id": "...",
-            "status": "delivered|failed|rejected",
-            "mobile": "254...",
-            "delivered_at": "2024-01-01 12:00:00",
-            "error": "..." (optional)
-        }
-        """
-        try:
-            # Get callback data
-            callback_data = request.httprequest.get_json() or kwargs
-            
-            _logger.info(f'Received Emalify callback: {callback_data}')
-            
-            # Extract relevant information
-            # Adjust these field names based on actual Emalify callback format
-            message_id = callback_data.get('message_id') or callback_data.get('messageId')
-            status = callback_data.get('status', '').lower()
-            mobile = callback_data.get('mobile') or callback_data.get('phone_number')
-            delivered_at = callback_data.get('delivered_at') or callback_data.get('deliveredAt')
-            error = callback_data.get('error') or callback_data.get('error_message')
-            
-            if not message_id:
-                _logger.warning('Emalify callback missing message_id')
-                return {'success': False, 'error': 'Missing message_id'}
-            
-            # Map Emalify status to our status
-            status_mapping = {
-                'delivered': 'delivered',
-                'sent': 'sent',
-                'failed': 'failed',
-                'rejected': 'rejected',
-                'pending': 'pending',
-            }
-            
-            mapped_status = status_mapping.get(status, 'pending')
-            
-            # Update delivery record
-            delivery_model = request.env['sms.emalify.delivery'].sudo()
-            delivery = delivery_model.update_delivery_status(
-                emalify_message_id=message_id,
-                status=mapped_status,
-                callback_data=callback_data,
-                delivered_date=delivered_at,
-            )
-            
-            if delivery:
-                _logger.info(f'Successfully updated delivery status for message {message_id}')
-                return {'success': True, 'message': 'Status updated'}
-            else:
-                _logger.warning(f'No delivery record found for message {message_id}')
-                return {'success': False, 'error': 'Delivery record not found'}
-                
-        except Exception as e:
-            _logger.error(f'Error processing Emalify callback: {str(e)}', exc_info=True)
-            return {'success': False, 'error': str(e)}
-    
-    @http.route('/sms/emalify/callback', type='http', auth='public', methods=['POST'], csrf=False)
-    def emalify_callback_http(self, **kwargs):
-        """
-        Alternative HTTP endpoint for Emalify callbacks (in case they use form data instead of JSON).
+        Accepts a single receipt or a batch of at most
+        ``MAX_RECEIPTS_PER_REQUEST`` receipts, as a JSON body (an object, a
+        list of objects, or an object with a ``receipts`` list) or as form
+        data. Receipts are only stored in a staging table here; the
+        ``Emalify: Apply Delivery Receipts`` cron applies them to the delivery
+        records. See ``sms.emalify.receipt._parse_receipt`` for the fields read.
         """
         try:
-            # Try to parse as JSON first
             try:
-                callback_data = json.loads(request.httprequest.data.decode('utf-8'))
-            except:
+                callback_data = json.loads(request.httprequest.get_data() or b'null')
+            except ValueError:
+                callback_data = None
+            if callback_data is None:
                 # If not JSON, use POST parameters
                 callback_data = kwargs
+            elif isinstance(callback_data, dict):
+                # JSON-RPC envelope of clients of the former type='json' route
+                callback_data = callback_data.get('params', callback_data)
             
-            _logger.info(f'Received Emalify HTTP callback: {callback_data}')
-            
-            # Extract relevant information
-            message_id = callback_data.get('message_id') or callback_data.get('messageId')
-            status = callback_data.get('status', '').lower()
-            mobile = callback_data.get('mobile') or callback_data.get('phone_number')
-            delivered_at = callback_data.get('delivered_at') or callback_data.get('deliveredAt')
-            error = callback_data.get('error') or callback_data.get('error_message')
-            
-            if not message_id:
-                _logger.warning('Emalify callback missing message_id')
-                return 'Missing message_id'
-            
-            # Map Emalify status to our status
-            status_mapping = {
-                'delivered': 'delivered',
-                'sent': 'sent',
-                'failed': 'failed',
-                'rejected': 'rejected',
-                'pending': 'pending',
-            }
-            
-            mapped_status = status_mapping.get(status, 'pending')
-            
-            # Update delivery record
-            delivery_model = request.env['sms.emalify.delivery'].sudo()
-            delivery = delivery_model.update_delivery_status(
-                emalify_message_id=message_id,
-                status=mapped_status,
-                callback_data=callback_data,
-                delivered_date=delivered_at,
-            )
-            
-            if delivery:
-                _logger.info(f'Successfully updated delivery status for message {message_id}')
-                return 'OK'
+            if isinstance(callback_data, dict):
+                receipts = callback_data.get('receipts') or [callback_data]
             else:
-                _logger.warning(f'No delivery record found for message {message_id}')
-                return 'Delivery record not found'
+                receipts = callback_data if isinstance(callback_data, list) else []
+            
+            if len(receipts) > MAX_RECEIPTS_PER_REQUEST:
+                _logger.warning('Rejected a batch of %s Emalify delivery receipts (limit %s)',
+                                len(receipts), MAX_RECEIPTS_PER_REQUEST)
+                return request.make_json_response({
+                    'success': False,
+                    'error': f'Too many receipts, send at most {MAX_RECEIPTS_PER_REQUEST} per request',
+                }, status=413)
+            
+            received = request.env['sms.emalify.receipt'].sudo()._ingest(receipts)
+            _logger.debug('Stored %s of %s Emalify delivery receipts', received, len(receipts))
+            
+            if not received:
+                return request.make_json_response({'success': False, 'error': 'Missing message_id'}, status=400)
+            return request.make_json_response({'success': True, 'received': received})
                 
         except Exception as e:
-            _logger.error(f'Error processing Emalify HTTP callback: {str(e)}', exc_info=True)
-            return f'Error: {str(e)}'
-
+            _logger.error('Error processing Emalify callback: %s', e, exc_info=True)
+            return request.make_json_response({'success': False, 'error': str(e)}, status=500)
@@ -3,4 +3,5 @@
 from . import sms_api
 from . import res_config_settings
 from . import sms_emalify_delivery
+from . import sms_emalify_receipt
 
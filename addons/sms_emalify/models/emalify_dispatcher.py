@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Concurrent dispatch of Emalify API calls.
+
+Requests go through the shared ``emalify`` integration client: consecutive
+messages reuse its pooled keep-alive connections, and its circuit breaker
+fails a batch fast while the gateway is down. A batch is sent from a bounded thread pool,
+throttled to the provider rate limit. The threads only do HTTP: callers
+collect the results and write them back to the database in bulk.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from odoo.addons.integration_http_client import get_client
+
+_logger = logging.getLogger(__name__)
+
+SEND_URL = 'https://api.v2.emalify.com/api/services/sendsms/'
+
+# (connect, read) timeouts in seconds
+TIMEOUT = (5, 30)
+
+# Defaults of the ``sms_emalify.max_workers`` and ``sms_emalify.rate_limit``
+# (requests per second, 0 for unlimited) parameters, and the hard cap on the
+# pool size, which is also the number of pooled connections
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_RATE_LIMIT = 20
+MAX_WORKERS = 32
+
+
+class EmalifyError(Exception):
+    """The Emalify API could not be reached or rejected the request"""
+
+
+def get_emalify_client():
+    """Return the process-wide HTTP client of the Emalify API"""
+    return get_client('emalify', timeout=TIMEOUT, pool_maxsize=MAX_WORKERS)
+
+
+class RateLimiter:
+    """Spaces calls at least ``1 / rate`` seconds apart, across threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            slot = max(self._next, time.monotonic())
+            self._next = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def post(payload, url=SEND_URL):
+    """Send one request to the Emalify API and return the decoded response.
+
+    :raises EmalifyError: on network and HTTP errors, on a non-JSON response,
+                          and when the API reports ``success: false``
+    """
+    try:
+        response = get_emalify_client().post(url, json=payload)
+        response.raise_for_status()
+        response_data = response.json() if response.content else {}
+    except requests.exceptions.RequestException as e:
+        _logger.error('Emalify API request failed: %s', e)
+        raise EmalifyError(f'Failed to connect to Emalify API: {e}') from e
+    except ValueError as e:
+        _logger.error('Invalid JSON response from Emalify: %s', e)
+        raise EmalifyError(f'Invalid response from Emalify API: {e}') from e
+
+    if isinstance(response_data, dict) and response_data.get('success') is False:
+        raise EmalifyError(response_data.get('message', 'Unknown error from Emalify API'))
+    return response_data
+
+
+def dispatch(payloads, max_workers=DEFAULT_MAX_WORKERS, rate_limit=DEFAULT_RATE_LIMIT, url=SEND_URL):
+    """Send the payloads concurrently.
+
+    :return: one ``(response, error)`` pair per payload, in the same order;
+             ``error`` is the raised exception, or ``None`` on success
+    """
+    limiter = RateLimiter(rate_limit)
+
+    def call(payload):
+        limiter.wait()
+        try:
+            return post(payload, url=url), None
+        except Exception as e:
+            return None, e
+
+    workers = max(1, min(max_workers or 1, MAX_WORKERS, len(payloads)))
+    if workers == 1:
+        return [call(payload) for payload in payloads]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='emalify') as executor:
+        return list(executor.map(call, payloads))
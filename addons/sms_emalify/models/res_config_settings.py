@@ -6,6 +6,11 @@ from odoo.exceptions import UserError
 
 _logger = logging.getLogger(__name__)
 
+# Integer settings for which 0 is a meaningful value (it disables the feature).
+# The standard settings delete a parameter saved as 0, which would bring back
+# its default; they are stored explicitly instead.
+ZERO_VALUED_SETTINGS = ['sms_emalify_rate_limit', 'sms_emalify_log_compact_days', 'sms_emalify_log_retention_days']
+
 
 class ResConfigSettings(models.TransientModel):
     _inherit = 'res.config.settings'
@@ -56,6 +61,57 @@ class ResConfigSettings(models.TransientModel):
         help='Default country code to prepend to phone numbers (e.g., 254 for Kenya)'
     )
 
+    sms_emalify_send_mode = fields.Selection(
+        [('queued', 'Queued'), ('immediate', 'Immediate')],
+        string='Sending Mode',
+        default='queued',
+        config_parameter='sms_emalify.send_mode',
+        help='Queued: SMS are sent within a minute by a scheduled action, without delaying the operation '
+             'that created them. Immediate: SMS are sent as soon as they are created.'
+    )
+    
+    sms_emalify_max_workers = fields.Integer(
+        string='Parallel Requests',
+        default=8,
+        config_parameter='sms_emalify.max_workers',
+        help='Maximum number of concurrent requests to the Emalify API when sending a batch of SMS'
+    )
+    
+    sms_emalify_rate_limit = fields.Integer(
+        string='Rate Limit',
+        default=20,
+        config_parameter='sms_emalify.rate_limit',
+        help='Maximum number of requests per second sent to the Emalify API (0 for no limit)'
+    )
+
+    sms_emalify_bulk_chunk_size = fields.Integer(
+        string='Recipients per Request',
+        default=50,
+        config_parameter='sms_emalify.bulk_chunk_size',
+        help='Maximum number of recipients of a same message sent to the Emalify API in a single request'
+    )
+
+    sms_emalify_log_compact_days = fields.Integer(
+        string='Compact Delivery Logs After (days)',
+        default=30,
+        config_parameter='sms_emalify.log_compact_days',
+        help='Drop the raw API responses and callback data of delivery logs older than this (0 to keep them)'
+    )
+
+    sms_emalify_log_retention_days = fields.Integer(
+        string='Delete Delivery Logs After (days)',
+        default=365,
+        config_parameter='sms_emalify.log_retention_days',
+        help='Delete delivery logs older than this (0 to keep them forever)'
+    )
+
+    def set_values(self):
+        super().set_values()
+        IrConfigParam = self.env['ir.config_parameter'].sudo()
+        for fname in ZERO_VALUED_SETTINGS:
+            if not self[fname]:
+                IrConfigParam.set_param(self._fields[fname].config_parameter, '0')
+
     def _compute_sms_emalify_callback_url(self):
         """Compute the callback URL for Emalify delivery status updates"""
         for record in self:
@@ -1,20 +1,33 @@
 # -*- coding: utf-8 -*-
 
 import logging
-import requests
 import re
 from odoo import api, models, _
 from odoo.exceptions import UserError
 
+from . import emalify_dispatcher
+
 _logger = logging.getLogger(__name__)
 
+# SMS sent per run of the queue cron (``sms_emalify.queue_batch_size``)
+QUEUE_BATCH_SIZE = 200
+
+# Recipients of a same message sent in one request (``sms_emalify.bulk_chunk_size``)
+BULK_CHUNK_SIZE = 50
+
 
 class SmsSms(models.Model):
     _inherit = 'sms.sms'
 
     @api.model_create_multi
     def create(self, vals_list):
-        """Override create to automatically send SMS via Emalify when enabled"""
+        """Override create to send SMS via Emalify when enabled.
+
+        In ``queued`` mode (``sms_emalify.send_mode``) the records are only
+        left outgoing and the queue cron is woken up, so the caller's
+        transaction never waits on the gateway. In ``immediate`` mode they are
+        sent right away.
+        """
         records = super().create(vals_list)
         
         # Check if Emalify is enabled
@@ -22,25 +35,70 @@ class SmsSms(models.Model):
         emalify_enabled = IrConfigParam.get_param('sms_emalify.enabled', 'False') == 'True'
         
         if emalify_enabled:
-            _logger.info(f'Emalify is enabled, processing {len(records)} SMS records')
             # Only auto-send for non-marketing SMS (SMS without mailing_id)
             # Marketing SMS will be sent via _send() method by the marketing cron
-            # Check if mailing_id field exists (from mass_mailing_sms module)
-            has_mailing = 'mailing_id' in records._fields
-            if has_mailing:
-                outgoing_sms = records.filtered(lambda s: s.state == 'outgoing' and not s.mailing_id)
-            else:
-                # If no mailing_id field, all SMS are non-marketing
-                outgoing_sms = records.filtered(lambda s: s.state == 'outgoing')
+            outgoing_sms = records.filtered(lambda s: s.state == 'outgoing')._emalify_filter_transactional()
             
-            if outgoing_sms:
+            if not outgoing_sms:
+                _logger.info(f'Skipping auto-send for {len(records)} SMS (marketing or not outgoing)')
+            elif self._emalify_get_send_mode() == 'queued':
+                _logger.info(f'Queued {len(outgoing_sms)} non-marketing SMS for Emalify')
+                self.env.ref('sms_emalify.ir_cron_emalify_send_queue')._trigger()
+            else:
                 _logger.info(f'Auto-sending {len(outgoing_sms)} non-marketing SMS')
                 outgoing_sms._send_emalify()
-            else:
-                _logger.info(f'Skipping auto-send for {len(records)} SMS (marketing or not outgoing)')
         
         return records
 
+    def _emalify_filter_transactional(self):
+        """Drop marketing SMS, which have a ``mailing_id`` when mass_mailing_sms is installed"""
+        if 'mailing_id' in self._fields:
+            return self.filtered(lambda s: not s.mailing_id)
+        return self
+
+    @api.model
+    def _emalify_get_send_mode(self):
+        return self.env['ir.config_parameter'].sudo().get_param('sms_emalify.send_mode', 'queued')
+
+    @api.model
+    def _cron_send_emalify_queue(self):
+        """Scheduled method draining the outgoing non-marketing SMS through Emalify.
+
+        Sends one batch per run and re-triggers itself while the queue is not
+        empty, committing in between.
+        """
+        IrConfigParam = self.env['ir.config_parameter'].sudo()
+        if IrConfigParam.get_param('sms_emalify.enabled', 'False') != 'True':
+            return
+        batch_size = int(IrConfigParam.get_param('sms_emalify.queue_batch_size', QUEUE_BATCH_SIZE))
+        domain = [('state', '=', 'outgoing')]
+        if 'mailing_id' in self._fields:
+            domain.append(('mailing_id', '=', False))
+        outgoing_sms = self.search(domain, order='id', limit=batch_size)
+        if not outgoing_sms:
+            return
+        outgoing_sms._send_emalify()
+        if len(outgoing_sms) == batch_size:
+            self.env.ref('sms_emalify.ir_cron_emalify_send_queue')._trigger()
+
+    def _emalify_lock_outgoing(self):
+        """Lock the outgoing SMS among ``self`` until the end of the transaction.
+
+        The queue cron, the standard SMS queue cron and manual sends may pick
+        the same SMS; the ones already locked by another transaction are being
+        sent by it, and are skipped.
+        """
+        if not self.ids:
+            return self.browse()
+        self.flush_recordset(['state'])
+        self.env.cr.execute("""
+            SELECT id FROM sms_sms
+             WHERE id = ANY(%s) AND state = 'outgoing'
+               FOR UPDATE SKIP LOCKED
+        """, [self.ids])
+        locked_ids = {row[0] for row in self.env.cr.fetchall()}
+        return self.filtered(lambda sms: sms.id in locked_ids)
+
     def _send(self, unlink_failed=False, unlink_sent=True, raise_exception=False):
         """
         Override the core SMS sending method to use Emalify API instead of IAP.
@@ -58,7 +116,12 @@ class SmsSms(models.Model):
 
     def _send_emalify(self, unlink_failed=False, unlink_sent=True, raise_exception=False):
         """
-        Send SMS via Emalify API
+        Send SMS via Emalify API.
+
+        SMS sharing a body are sent to up to ``sms_emalify.bulk_chunk_size``
+        recipients per request. The HTTP calls run concurrently (see
+        ``emalify_dispatcher``); SMS states and delivery records are written
+        back in bulk once all calls returned.
         """
         _logger.info(f'=== _send_emalify called for {len(self)} SMS records ===')
         
@@ -69,19 +132,12 @@ class SmsSms(models.Model):
         shortcode = IrConfigParam.get_param('sms_emalify.shortcode', '')
         pass_type = IrConfigParam.get_param('sms_emalify.pass_type', 'plain')
         
-        # Get Emalify configuration
-        api_key = IrConfigParam.get_param('sms_emalify.api_key', '')
-        partner_id = IrConfigParam.get_param('sms_emalify.partner_id', '')
-        shortcode = IrConfigParam.get_param('sms_emalify.shortcode', '')
-        pass_type = IrConfigParam.get_param('sms_emalify.pass_type', 'plain')
-        
         if not all([api_key, partner_id, shortcode]):
             _logger.error('Emalify SMS credentials are not configured properly. '
                          f'api_key: {"set" if api_key else "missing"}, '
                          f'partner_id: {"set" if partner_id else "missing"}, '
                          f'shortcode: {"set" if shortcode else "missing"}')
-            for sms in self:
-                sms.write({'state': 'error', 'failure_type': 'sms_credit'})
+            self.write({'state': 'error', 'failure_type': 'sms_credit'})
             if raise_exception:
                 raise UserError(_(
                     'Emalify SMS is not configured. '
@@ -89,86 +145,85 @@ class SmsSms(models.Model):
                 ))
             return False
         
-        _logger.info(f'Emalify credentials configured, processing {len(self)} SMS')
-        
-        # Process each SMS record
-        outgoing_sms = self.filtered(lambda s: s.state == 'outgoing')
+        outgoing_sms = self._emalify_lock_outgoing()
         _logger.info(f'Found {len(outgoing_sms)} outgoing SMS to process')
         
+        # Format phone numbers; invalid ones fail without an API call
+        to_send = []
+        invalid_sms = self.browse()
         for sms in outgoing_sms:
-            number = sms.number
-            content = sms.body
-            
-            _logger.info(f'Processing SMS {sms.id}: to {number}, body length: {len(content) if content else 0}')
-            
-            # Format phone number
-            formatted_number = self._emalify_format_phone_number(number)
-            
-            if not formatted_number:
-                _logger.warning(f'Invalid phone number format: {number}')
-                sms.write({'state': 'error', 'failure_type': 'sms_number_format'})
-                continue
-            
-            _logger.info(f'Formatted number: {number} -> {formatted_number}')
-            
-            # Send SMS via Emalify API
-            try:
-                _logger.info(f'Calling Emalify API for {formatted_number}')
-                response = self._emalify_send_sms(
-                    api_key=api_key,
-                    partner_id=partner_id,
-                    shortcode=shortcode,
-                    mobile=formatted_number,
-                    message=content,
-                    pass_type=pass_type,
-                )
-                
-                _logger.info(f'Emalify API response: {response}')
-                
-                # Extract message ID from response
-                message_id = ''
-                if isinstance(response, dict):
-                    if 'responses' in response and len(response['responses']) > 0:
-                        message_id = str(response['responses'][0].get('messageid', ''))
-                    else:
-                        message_id = response.get('message_id', '')
-                
-                # Create delivery tracking record
-                self.env['sms.emalify.delivery'].sudo().create({
-                    'phone_number': formatted_number,
-                    'message_content': content,
-                    'status': 'sent',
-                    'emalify_message_id': message_id,
-                    'api_response': str(response),
-                    'res_model': '',
-                    'res_id': 0,
-                })
-                
-                # Mark SMS as sent
-                sms.write({'state': 'sent', 'failure_type': False})
-                
-                _logger.info(f'✓ SMS {sms.id} sent successfully to {formatted_number} via Emalify')
-                
-            except Exception as e:
-                _logger.error(f'✗ Failed to send SMS {sms.id} to {formatted_number} via Emalify: {str(e)}', exc_info=True)
-                
-                # Create delivery tracking record for failed message
-                self.env['sms.emalify.delivery'].sudo().create({
-                    'phone_number': formatted_number,
-                    'message_content': content,
-                    'status': 'failed',
-                    'error_message': str(e),
+            formatted_number = self._emalify_format_phone_number(sms.number)
+            if formatted_number:
+                to_send.append((sms, formatted_number))
+            else:
+                _logger.warning(f'Invalid phone number format: {sms.number}')
+                invalid_sms |= sms
+        if invalid_sms:
+            invalid_sms.write({'state': 'error', 'failure_type': 'sms_number_format'})
+        
+        # Send SMS via Emalify API, one request per chunk of recipients of a same body
+        chunk_size = int(IrConfigParam.get_param('sms_emalify.bulk_chunk_size', BULK_CHUNK_SIZE))
+        chunks = self._emalify_chunk_recipients(to_send, chunk_size)
+        payloads = [
+            self._emalify_prepare_payload(
+                api_key, partner_id, shortcode, ','.join(mobile for _sms, mobile in chunk), chunk[0][0].body, pass_type)
+            for chunk in chunks
+        ]
+        results = emalify_dispatcher.dispatch(
+            payloads,
+            max_workers=int(IrConfigParam.get_param(
+                'sms_emalify.max_workers', emalify_dispatcher.DEFAULT_MAX_WORKERS)),
+            rate_limit=float(IrConfigParam.get_param(
+                'sms_emalify.rate_limit', emalify_dispatcher.DEFAULT_RATE_LIMIT)),
+        )
+        _logger.info(f'Sent {len(to_send)} SMS to Emalify in {len(payloads)} requests')
+        
+        # Write the results back
+        sent_ids, failed_ids, delivery_vals_list = [], [], []
+        first_error = None
+        for chunk, (response, error) in zip(chunks, results):
+            recipient_results = {} if error else self._emalify_get_recipient_results(response, chunk)
+            for sms, mobile in chunk:
+                delivery_vals = {
+                    'phone_number': mobile,
+                    'message_content': sms.body,
                     'res_model': '',
                     'res_id': 0,
-                })
-                
-                # Mark SMS as failed
-                sms.write({'state': 'error', 'failure_type': 'sms_server'})
-                
-                if raise_exception:
-                    raise
+                }
+                if error:
+                    message_id, sms_error, recipient_response = None, error, None
+                else:
+                    message_id, sms_error, recipient_response = recipient_results.get(mobile, (
+                        None, emalify_dispatcher.EmalifyError('No response from Emalify for this recipient'), None))
+                if sms_error is None:
+                    sent_ids.append(sms.id)
+                    delivery_vals.update({
+                        'status': 'sent',
+                        'emalify_message_id': message_id,
+                        'api_response': str(recipient_response),
+                    })
+                else:
+                    _logger.error(f'✗ Failed to send SMS {sms.id} to {mobile} via Emalify: {sms_error}')
+                    failed_ids.append(sms.id)
+                    first_error = first_error or sms_error
+                    delivery_vals.update({
+                        'status': 'failed',
+                        'error_message': str(sms_error),
+                        'api_response': str(recipient_response) if recipient_response else False,
+                    })
+                delivery_vals_list.append(delivery_vals)
+        
+        if sent_ids:
+            self.browse(sent_ids).write({'state': 'sent', 'failure_type': False})
+        if failed_ids:
+            self.browse(failed_ids).write({'state': 'error', 'failure_type': 'sms_server'})
+        self.env['sms.emalify.delivery'].sudo().create(delivery_vals_list)
         
-        _logger.info(f'=== Completed processing {len(self)} SMS records ===')
+        _logger.info(f'=== Emalify: {len(sent_ids)} SMS sent, {len(failed_ids)} failed, '
+                     f'{len(invalid_sms)} invalid numbers ===')
+        
+        if first_error and raise_exception:
+            raise first_error
         
         # Handle unlink based on parameters (only for non-marketing SMS)
         # Marketing SMS should be kept for tracking
@@ -209,6 +264,11 @@ class SmsSms(models.Model):
         if not number:
             return None
         
+        # Numbers normalized upstream (E.164, e.g. ``phone_e164`` fields) only lose the +
+        number = str(number)
+        if number.startswith('+') and number[1:].isdigit() and len(number) > 9:
+            return number[1:]
+        
         # Remove all non-digit characters except +
         cleaned = re.sub(r'[^\d+]', '', str(number))
         
@@ -231,6 +291,74 @@ class SmsSms(models.Model):
         
         return cleaned
     
+    def _emalify_prepare_payload(self, api_key, partner_id, shortcode, mobile, message, pass_type='plain'):
+        """Build the body of a ``sendsms`` request"""
+        return {
+            'apikey': api_key,
+            'partnerID': partner_id,
+            'mobile': mobile,
+            'message': message,
+            'shortcode': shortcode,
+            'pass_type': pass_type,
+        }
+    
+    def _emalify_get_message_id(self, response):
+        """Extract the message ID from a ``sendsms`` response"""
+        if not isinstance(response, dict):
+            return ''
+        if response.get('responses'):
+            return str(response['responses'][0].get('messageid', ''))
+        return response.get('message_id', '')
+    
+    def _emalify_chunk_recipients(self, to_send, chunk_size):
+        """Group ``(sms, mobile)`` pairs by body into chunks of distinct recipients.
+
+        A number appears at most once per chunk, so that every recipient
+        result of a request maps back to a single SMS.
+        """
+        by_body = {}
+        for sms, mobile in to_send:
+            by_body.setdefault(sms.body, []).append((sms, mobile))
+        chunks = []
+        for pending in by_body.values():
+            while pending:
+                chunk, mobiles, rest = [], set(), []
+                for sms, mobile in pending:
+                    if len(chunk) < max(chunk_size, 1) and mobile not in mobiles:
+                        chunk.append((sms, mobile))
+                        mobiles.add(mobile)
+                    else:
+                        rest.append((sms, mobile))
+                chunks.append(chunk)
+                pending = rest
+        return chunks
+    
+    def _emalify_get_recipient_results(self, response, chunk):
+        """Map a ``sendsms`` response to its recipients.
+
+        :return: dict ``{mobile: (message_id, error, recipient_response)}``;
+                 ``error`` is ``None`` when the message was accepted
+        """
+        entries = response.get('responses') if isinstance(response, dict) else None
+        if not entries:
+            # Single recipient answered without a per-recipient list
+            if len(chunk) == 1:
+                return {chunk[0][1]: (self._emalify_get_message_id(response), None, response)}
+            return {}
+        results = {}
+        for entry in entries:
+            mobile = str(entry.get('mobile', '')).lstrip('+')
+            # The API spells the key both ways depending on the endpoint version
+            code = entry.get('response-code', entry.get('respose-code', 200))
+            error = None
+            if str(code) != '200':
+                error = emalify_dispatcher.EmalifyError(
+                    entry.get('response-description') or f'Emalify rejected the message (code {code})')
+            results[mobile] = (str(entry.get('messageid', '')), error, entry)
+        if len(chunk) == 1 and len(entries) == 1 and chunk[0][1] not in results:
+            results[chunk[0][1]] = results.popitem()[1]
+        return results
+    
     def _emalify_send_sms(self, api_key, partner_id, shortcode, mobile, message, pass_type='plain'):
         """
         Send SMS via Emalify API.
@@ -238,46 +366,11 @@ class SmsSms(models.Model):
         :param api_key: Emalify API key
         :param partner_id: Emalify partner ID
         :param shortcode: Emalify shortcode
-        :param mobile: Recipient phone number (formatted)
+        :param mobile: Recipient phone number (formatted), or several comma-separated numbers
         :param message: SMS message content
         :param pass_type: Password type (plain or encrypted)
         :return: API response dict
-        :raises: Exception if API call fails
+        :raises: EmalifyError if API call fails
         """
-        url = 'https://api.v2.emalify.com/api/services/sendsms/'
-        
-        headers = {
-            'Content-Type': 'application/json',
-        }
-        
-        payload = {
-            'apikey': api_key,
-            'partnerID': partner_id,
-            'mobile': mobile,
-            'message': message,
-            'shortcode': shortcode,
-            'pass_type': pass_type,
-        }
-        
-        try:
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
-            response.raise_for_status()
-            
-            # Parse response
-            response_data = response.json() if response.content else {}
-            
-            # Check if Emalify returned an error in the response body
-            # Adjust this based on Emalify's actual error response format
-            if isinstance(response_data, dict) and response_data.get('success') is False:
-                error_msg = response_data.get('message', 'Unknown error from Emalify API')
-                raise Exception(error_msg)
-            
-            return response_data
-            
-        except requests.exceptions.RequestException as e:
-            _logger.error(f'Emalify API request failed: {str(e)}')
-            raise Exception(f'Failed to connect to Emalify API: {str(e)}')
-        except ValueError as e:
-            _logger.error(f'Invalid JSON response from Emalify: {str(e)}')
-            raise Exception(f'Invalid response from Emalify API: {str(e)}')
-
+        return emalify_dispatcher.post(
+            self._emalify_prepare_payload(api_key, partner_id, shortcode, mobile, message, pass_type))
@@ -1,13 +1,24 @@
 # -*- coding: utf-8 -*-
 
 import logging
-from odoo import api, fields, models, _
+from datetime import timedelta
+
+from odoo import api, fields, models, tools, _
 
 _logger = logging.getLogger(__name__)
 
+# Defaults of the ``sms_emalify.log_compact_days`` and
+# ``sms_emalify.log_retention_days`` parameters (0 disables the step)
+DEFAULT_COMPACT_DAYS = 30
+DEFAULT_RETENTION_DAYS = 365
+
+# Compacted rows keep the beginning of the message as a summary
+SUMMARY_LENGTH = 160
+
 
 class SmsEmalifyDelivery(models.Model):
     _name = 'sms.emalify.delivery'
+    _inherit = ['log.retention.mixin']
     _description = 'Emalify SMS Delivery Tracking'
     _order = 'create_date desc'
     _rec_name = 'phone_number'
@@ -92,6 +103,9 @@ class SmsEmalifyDelivery(models.Model):
         help='User who triggered the SMS'
     )
 
+    def init(self):
+        tools.create_index(self._cr, 'sms_emalify_delivery_create_date_index', self._table, ['create_date'])
+
     def name_get(self):
         """Custom display name"""
         result = []
@@ -131,6 +145,39 @@ class SmsEmalifyDelivery(models.Model):
         
         return delivery
     
+    @api.autovacuum
+    def _gc_delivery_logs(self):
+        """Compact and purge old delivery records.
+
+        After ``sms_emalify.log_compact_days`` the raw API response and
+        callback data are dropped and the message is cut down to a summary;
+        after ``sms_emalify.log_retention_days`` the records are deleted.
+        Both steps run in bounded batches.
+        """
+        compact_days = self._get_retention_days('sms_emalify.log_compact_days', DEFAULT_COMPACT_DAYS)
+        retention_days = self._get_retention_days('sms_emalify.log_retention_days', DEFAULT_RETENTION_DAYS)
+        self.flush_model()
+
+        if retention_days > 0:
+            self._purge_logs(retention_days)
+
+        if compact_days > 0:
+            compacted = self._run_in_batches("""
+                UPDATE sms_emalify_delivery
+                   SET api_response = NULL,
+                       callback_data = NULL,
+                       message_content = left(message_content, %(length)s)
+                 WHERE id IN (SELECT id FROM sms_emalify_delivery
+                               WHERE create_date < %(cutoff)s
+                                 AND (api_response IS NOT NULL
+                                      OR callback_data IS NOT NULL
+                                      OR length(message_content) > %(length)s)
+                               LIMIT %(limit)s)
+            """, {'cutoff': fields.Datetime.now() - timedelta(days=compact_days), 'length': SUMMARY_LENGTH})
+            _logger.info('Compacted %s Emalify delivery records older than %s days', compacted, compact_days)
+
+        self.invalidate_model()
+
     def action_view_related_record(self):
         """Open the related record"""
         self.ensure_one()
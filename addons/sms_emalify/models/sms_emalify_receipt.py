@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Receipts applied per cron run
+APPLY_BATCH_SIZE = 5000
+
+# A receipt may arrive before the delivery row of its message is committed;
+# unmatched receipts are retried until they are this old
+UNMATCHED_RETENTION = timedelta(minutes=30)
+
+# Map Emalify status to our status
+STATUS_MAPPING = {
+    'delivered': 'delivered',
+    'sent': 'sent',
+    'failed': 'failed',
+    'rejected': 'rejected',
+    'pending': 'pending',
+}
+
+
+class SmsEmalifyReceipt(models.Model):
+    """Staging table of the delivery receipts posted by Emalify.
+
+    The callback endpoint only appends rows here; a cron applies them to
+    ``sms.emalify.delivery`` in set-based updates.
+    """
+    _name = 'sms.emalify.receipt'
+    _description = 'Emalify Delivery Receipt'
+    _order = 'id'
+    _log_access = False
+
+    message_id = fields.Char(string='Emalify Message ID', required=True)
+    status = fields.Selection([
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('delivered', 'Delivered'),
+        ('failed', 'Failed'),
+        ('rejected', 'Rejected'),
+    ], string='Status', required=True)
+    delivered_at = fields.Datetime(string='Delivered At')
+    error = fields.Text(string='Error')
+    payload = fields.Text(string='Callback Data')
+    received_at = fields.Datetime(string='Received At', default=fields.Datetime.now, required=True)
+
+    @api.model
+    def _parse_receipt(self, data):
+        """Normalize one callback payload, or return ``None`` if it has no message ID
+
+        Expected callback format (adjust based on actual Emalify callback structure):
+        {
+            "message_id": "...",
+            "status": "delivered|failed|rejected",
+            "mobile": "254...",
+            "delivered_at": "2024-01-01 12:00:00",
+            "error": "..." (optional)
+        }
+        """
+        if not isinstance(data, dict):
+            return None
+        message_id = data.get('message_id') or data.get('messageId')
+        if not message_id:
+            return None
+        delivered_at = data.get('delivered_at') or data.get('deliveredAt')
+        try:
+            delivered_at = fields.Datetime.to_datetime(delivered_at) if delivered_at else None
+        except ValueError:
+            delivered_at = None
+        return (
+            str(message_id),
+            STATUS_MAPPING.get(str(data.get('status') or '').lower(), 'pending'),
+            delivered_at,
+            data.get('error') or data.get('error_message') or None,
+            json.dumps(data, default=str),
+        )
+
+    @api.model
+    def _ingest(self, receipts):
+        """Append callback payloads to the staging table in a single INSERT.
+
+        :return: number of receipts stored; payloads without message ID are dropped
+        """
+        rows = [row for row in map(self._parse_receipt, receipts) if row]
+        if not rows:
+            return 0
+        self.env.cr.execute(f"""
+            INSERT INTO sms_emalify_receipt (message_id, status, delivered_at, error, payload, received_at)
+            SELECT message_id, status, delivered_at::timestamp, error, payload, now() AT TIME ZONE 'UTC'
+              FROM (VALUES {', '.join(['%s'] * len(rows))}) AS receipt (message_id, status, delivered_at, error, payload)
+        """, rows)
+        return len(rows)
+
+    @api.model
+    def _cron_apply_receipts(self):
+        """Scheduled method applying the staged receipts to the delivery rows"""
+        self._apply_receipts()
+
+    @api.model
+    def _apply_receipts(self, limit=APPLY_BATCH_SIZE):
+        """Apply a batch of staged receipts, the latest one per message winning.
+
+        Applied receipts are deleted, as well as the unmatched ones older than
+        ``UNMATCHED_RETENTION``.
+
+        :return: number of delivery rows updated
+        """
+        self.flush_model()
+        Delivery = self.env['sms.emalify.delivery']
+        Delivery.flush_model()
+        cr = self.env.cr
+        cr.execute("SELECT id FROM sms_emalify_receipt ORDER BY id LIMIT %s", [limit])
+        batch_ids = [row[0] for row in cr.fetchall()]
+        if not batch_ids:
+            return 0
+
+        cr.execute("""
+            WITH latest AS (
+                SELECT DISTINCT ON (message_id) message_id, status, delivered_at, error, payload
+                  FROM sms_emalify_receipt
+                 WHERE id = ANY(%(ids)s)
+              ORDER BY message_id, id DESC
+            )
+            UPDATE sms_emalify_delivery delivery
+               SET status = latest.status,
+                   delivered_date = COALESCE(latest.delivered_at, delivery.delivered_date),
+                   error_message = COALESCE(latest.error, delivery.error_message),
+                   callback_data = latest.payload,
+                   write_date = now() AT TIME ZONE 'UTC',
+                   write_uid = %(uid)s
+              FROM latest
+             WHERE delivery.emalify_message_id = latest.message_id
+         RETURNING delivery.id, delivery.emalify_message_id
+        """, {'ids': batch_ids, 'uid': self.env.uid})
+        updated = cr.fetchall()
+        Delivery.invalidate_model(['status', 'delivered_date', 'error_message', 'callback_data',
+                                   'write_date', 'write_uid'])
+
+        cr.execute("""
+            DELETE FROM sms_emalify_receipt
+             WHERE id = ANY(%(ids)s)
+               AND (message_id = ANY(%(matched)s::varchar[]) OR received_at < %(stale)s)
+        """, {
+            'ids': batch_ids,
+            'matched': list({message_id for _id, message_id in updated}),
+            'stale': fields.Datetime.now() - UNMATCHED_RETENTION,
+        })
+        deleted = cr.rowcount
+        self.invalidate_model()
+        _logger.info("Applied %s Emalify delivery receipts to %s delivery records",
+                     deleted, len(updated))
+        # Keep going while full batches get consumed (a batch of recent
+        # unmatched receipts only is left for the next scheduled run)
+        if len(batch_ids) == limit and deleted:
+            self.env.ref('sms_emalify.ir_cron_emalify_apply_receipts')._trigger()
+        return len(updated)
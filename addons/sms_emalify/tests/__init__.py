@@ -0,0 +1,4 @@
+from . import test_dispatcher
+from . import test_sms_send
+from . import test_receipts
+from . import test_callback
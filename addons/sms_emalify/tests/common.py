@@ -0,0 +1,12 @@
+from unittest.mock import Mock
+
+import requests
+
+
+def mock_response(data, status=200):
+    """Return a mocked ``requests.Response`` whose JSON body is ``data``"""
+    response = Mock(spec=requests.Response)
+    response.status_code = status
+    response.content = b'{}'
+    response.json.return_value = data
+    return response
@@ -0,0 +1,45 @@
+import json
+
+from odoo.tests import HttpCase, tagged
+
+from odoo.addons.sms_emalify.controllers.main import MAX_RECEIPTS_PER_REQUEST
+
+
+@tagged('post_install', '-at_install')
+class TestEmalifyCallback(HttpCase):
+
+    def _post(self, data):
+        return self.url_open('/sms/emalify/callback', data=json.dumps(data),
+                             headers={'Content-Type': 'application/json'})
+
+    def _staged(self, message_ids):
+        return self.env['sms.emalify.receipt'].search([('message_id', 'in', message_ids)])
+
+    def test_jsonrpc_params_are_unwrapped(self):
+        response = self._post({
+            'jsonrpc': '2.0',
+            'method': 'call',
+            'params': {'message_id': 'CB1', 'status': 'delivered'},
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'success': True, 'received': 1})
+        self.assertEqual(self._staged(['CB1']).status, 'delivered')
+
+    def test_batch_of_receipts(self):
+        response = self._post({'receipts': [
+            {'message_id': 'CB2', 'status': 'delivered'},
+            {'message_id': 'CB3', 'status': 'failed'},
+        ]})
+        self.assertEqual(response.json(), {'success': True, 'received': 2})
+        self.assertEqual(len(self._staged(['CB2', 'CB3'])), 2)
+
+    def test_receipt_without_message_id(self):
+        response = self._post({'status': 'delivered'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_oversized_batch_is_rejected(self):
+        response = self._post([
+            {'message_id': f'CB-{i}', 'status': 'delivered'} for i in range(MAX_RECEIPTS_PER_REQUEST + 1)
+        ])
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(self._staged(['CB-0']))
@@ -0,0 +1,60 @@
+from unittest.mock import Mock, patch
+
+import requests
+
+from odoo.tests.common import BaseCase
+
+from odoo.addons.sms_emalify.models import emalify_dispatcher
+from odoo.addons.sms_emalify.models.emalify_dispatcher import EmalifyError, RateLimiter, dispatch
+from odoo.addons.sms_emalify.tests.common import mock_response
+
+
+class TestEmalifyDispatcher(BaseCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = Mock()
+        patcher = patch.object(emalify_dispatcher, 'get_client', return_value=self.client)
+        self.get_client = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rate_limiter_unlimited(self):
+        with patch.object(emalify_dispatcher, 'time') as clock:
+            clock.monotonic.return_value = 100.0
+            for rate in (0, None):
+                limiter = RateLimiter(rate)
+                for _i in range(5):
+                    limiter.wait()
+        clock.sleep.assert_not_called()
+
+    def test_rate_limiter_spaces_calls(self):
+        with patch.object(emalify_dispatcher, 'time') as clock:
+            clock.monotonic.return_value = 100.0
+            limiter = RateLimiter(10)
+            for _i in range(3):
+                limiter.wait()
+        delays = [call.args[0] for call in clock.sleep.call_args_list]
+        self.assertEqual(len(delays), 2)
+        self.assertAlmostEqual(delays[0], 0.1)
+        self.assertAlmostEqual(delays[1], 0.2)
+
+    def test_dispatch_keeps_order_and_errors(self):
+        def post(url, json):
+            if json['mobile'] == '254700000002':
+                return mock_response({'success': False, 'message': 'Invalid shortcode'})
+            if json['mobile'] == '254700000003':
+                raise requests.exceptions.ConnectionError('Connection refused')
+            return mock_response({'responses': [{'mobile': json['mobile'], 'messageid': 'M1'}]})
+
+        self.client.post.side_effect = post
+        payloads = [{'mobile': f'25470000000{i}'} for i in range(1, 4)]
+        results = dispatch(payloads, max_workers=3, rate_limit=0)
+
+        self.get_client.assert_called_with('emalify', timeout=emalify_dispatcher.TIMEOUT,
+                                           pool_maxsize=emalify_dispatcher.MAX_WORKERS)
+        self.assertEqual(results[0], ({'responses': [{'mobile': '254700000001', 'messageid': 'M1'}]}, None))
+        self.assertIsNone(results[1][0])
+        self.assertIsInstance(results[1][1], EmalifyError)
+        self.assertIn('Invalid shortcode', str(results[1][1]))
+        self.assertIsNone(results[2][0])
+        self.assertIsInstance(results[2][1], EmalifyError)
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+from odoo import fields
+from odoo.tests.common import TransactionCase
+
+
+class TestEmalifyReceipts(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.Receipt = self.env['sms.emalify.receipt']
+        self.Delivery = self.env['sms.emalify.delivery']
+        self.first = self._delivery('M1')
+        self.second = self._delivery('M2')
+
+    def _delivery(self, message_id):
+        return self.Delivery.create({
+            'phone_number': '254700000001',
+            'message_content': 'Your appointment is confirmed',
+            'status': 'sent',
+            'emalify_message_id': message_id,
+        })
+
+    def _staged(self, message_ids):
+        return self.Receipt.search([('message_id', 'in', message_ids)]).mapped('message_id')
+
+    def test_latest_receipt_wins(self):
+        stored = self.Receipt._ingest([
+            {'message_id': 'M1', 'status': 'sent'},
+            {'messageId': 'M1', 'status': 'DELIVERED', 'delivered_at': '2026-01-02 10:00:00'},
+            {'message_id': 'M2', 'status': 'failed', 'error': 'Absent subscriber'},
+            {'message_id': 'M3', 'status': 'delivered'},
+            {'status': 'delivered'},
+        ])
+        self.assertEqual(stored, 4)
+        self.assertEqual(self.Receipt._apply_receipts(), 2)
+        self.assertEqual(self.first.status, 'delivered')
+        self.assertEqual(self.first.delivered_date, datetime(2026, 1, 2, 10, 0))
+        self.assertIn('DELIVERED', self.first.callback_data)
+        self.assertEqual(self.second.status, 'failed')
+        self.assertEqual(self.second.error_message, 'Absent subscriber')
+        # applied receipts are deleted, the unmatched one is kept for a later run
+        self.assertEqual(self._staged(['M1', 'M2', 'M3']), ['M3'])
+
+    def test_unmatched_receipt_applied_later(self):
+        self.Receipt._ingest([{'message_id': 'M3', 'status': 'delivered'}])
+        self.assertEqual(self.Receipt._apply_receipts(), 0)
+        self.assertEqual(self._staged(['M3']), ['M3'])
+        # the delivery row gets committed after its receipt arrived
+        third = self._delivery('M3')
+        self.assertEqual(self.Receipt._apply_receipts(), 1)
+        self.assertEqual(third.status, 'delivered')
+        self.assertFalse(self._staged(['M3']))
+
+    def test_unmatched_receipt_aged_out(self):
+        self.Receipt._ingest([{'message_id': 'M4', 'status': 'delivered'}])
+        self.env.cr.execute(
+            "UPDATE sms_emalify_receipt SET received_at = %s WHERE message_id = 'M4'",
+            [fields.Datetime.now() - timedelta(hours=1)])
+        self.assertEqual(self.Receipt._apply_receipts(), 0)
+        self.assertFalse(self._staged(['M4']))
@@ -0,0 +1,97 @@
+from unittest.mock import Mock, patch
+
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.sms_emalify.models import emalify_dispatcher
+from odoo.addons.sms_emalify.tests.common import mock_response
+
+
+class TestEmalifySend(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        for key, value in {
+            'sms_emalify.enabled': 'True',
+            'sms_emalify.api_key': 'key',
+            'sms_emalify.partner_id': '123',
+            'sms_emalify.shortcode': 'SHOP',
+            'sms_emalify.send_mode': 'queued',
+            'sms_emalify.rate_limit': '0',
+        }.items():
+            self.env['ir.config_parameter'].sudo().set_param(key, value)
+        # Recipients the mocked gateway leaves out of its answer
+        self.missing = set()
+        self.client = Mock()
+        self.client.post.side_effect = self._answer
+        patcher = patch.object(emalify_dispatcher, 'get_client', return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _answer(self, url, json):
+        return mock_response({'responses': [{
+            'response-code': 200,
+            'response-description': 'Success',
+            'mobile': mobile,
+            'messageid': f'MSG-{mobile}',
+        } for mobile in json['mobile'].split(',') if mobile not in self.missing]})
+
+    def _create_sms(self, numbers, body='Your appointment is confirmed'):
+        return self.env['sms.sms'].create([{'number': number, 'body': body} for number in numbers])
+
+    def _deliveries(self, numbers):
+        deliveries = self.env['sms.emalify.delivery'].search([('phone_number', 'in', numbers)])
+        return {delivery.phone_number: delivery for delivery in deliveries}
+
+    def _payloads(self):
+        return [call.kwargs['json'] for call in self.client.post.call_args_list]
+
+    def test_queued_sms_are_sent_by_cron(self):
+        sms = self._create_sms(['+254700000001'])
+        self.client.post.assert_not_called()
+        self.assertEqual(sms.state, 'outgoing')
+        self.env['sms.sms']._cron_send_emalify_queue()
+        self.assertEqual([payload['mobile'] for payload in self._payloads()], ['254700000001'])
+        # sent SMS are unlinked, their delivery record stays
+        self.assertFalse(sms.exists())
+        self.assertEqual(self._deliveries(['254700000001'])['254700000001'].status, 'sent')
+
+    def test_only_outgoing_sms_are_sent(self):
+        sent, outgoing = self._create_sms(['+254700000001', '+254700000002'])
+        sent.state = 'sent'
+        (sent | outgoing)._send_emalify(unlink_sent=False)
+        self.assertEqual([payload['mobile'] for payload in self._payloads()], ['254700000002'])
+        self.assertEqual(outgoing.state, 'sent')
+
+    def test_recipients_are_chunked_by_body(self):
+        self.env['ir.config_parameter'].sudo().set_param('sms_emalify.bulk_chunk_size', '2')
+        greetings = self._create_sms(['+254700000001', '+254700000002', '+254700000003'], body='Hello')
+        goodbye = self._create_sms(['+254700000004'], body='Bye')
+        (greetings | goodbye)._send_emalify(unlink_sent=False)
+        self.assertEqual(sorted((payload['message'], payload['mobile']) for payload in self._payloads()), [
+            ('Bye', '254700000004'),
+            ('Hello', '254700000001,254700000002'),
+            ('Hello', '254700000003'),
+        ])
+        self.assertEqual(set((greetings | goodbye).mapped('state')), {'sent'})
+        numbers = ['254700000001', '254700000002', '254700000003', '254700000004']
+        deliveries = self._deliveries(numbers)
+        self.assertEqual({number: delivery.emalify_message_id for number, delivery in deliveries.items()},
+                         {number: f'MSG-{number}' for number in numbers})
+
+    def test_repeated_number_gets_its_own_request(self):
+        sms = self._create_sms(['+254700000001', '0700000001'])
+        sms._send_emalify(unlink_sent=False)
+        self.assertEqual([payload['mobile'] for payload in self._payloads()], ['254700000001', '254700000001'])
+        self.assertEqual(sms.mapped('state'), ['sent', 'sent'])
+
+    def test_recipient_missing_from_response_fails(self):
+        self.missing = {'254700000002'}
+        answered, missing = self._create_sms(['+254700000001', '+254700000002'])
+        (answered | missing)._send_emalify(unlink_sent=False, unlink_failed=False)
+        self.assertEqual(len(self._payloads()), 1)
+        self.assertEqual(answered.state, 'sent')
+        self.assertEqual(missing.state, 'error')
+        self.assertEqual(missing.failure_type, 'sms_server')
+        delivery = self._deliveries(['254700000002'])['254700000002']
+        self.assertEqual(delivery.status, 'failed')
+        self.assertEqual(delivery.error_message, 'No response from Emalify for this recipient')